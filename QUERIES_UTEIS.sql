@@ -455,6 +455,32 @@ GROUP BY
     END
 ORDER BY decada;
 
+-- =====================================================
+-- 19. FOREIGN KEYS DEFERRABLE (BANCOS JÁ CRIADOS)
+-- =====================================================
+
+-- Necessário para a carga atômica (inserir_dados_banco.py --atomico):
+-- com FKs DEFERRABLE, SET CONSTRAINTS ALL DEFERRED adia a verificação para o COMMIT.
+-- O SCRIPT_SQL_COMPLETO.sql já cria as FKs assim; use apenas em bancos antigos.
+ALTER TABLE cidade ALTER CONSTRAINT fk_cidade_estado DEFERRABLE INITIALLY IMMEDIATE;
+ALTER TABLE bairro ALTER CONSTRAINT fk_bairro_cidade DEFERRABLE INITIALLY IMMEDIATE;
+ALTER TABLE endereco ALTER CONSTRAINT fk_endereco_tipo_logradouro DEFERRABLE INITIALLY IMMEDIATE;
+ALTER TABLE endereco ALTER CONSTRAINT fk_endereco_bairro DEFERRABLE INITIALLY IMMEDIATE;
+ALTER TABLE contato ALTER CONSTRAINT fk_contato_telefone DEFERRABLE INITIALLY IMMEDIATE;
+ALTER TABLE contato_telefone ALTER CONSTRAINT fk_contato_telefone_contato DEFERRABLE INITIALLY IMMEDIATE;
+ALTER TABLE contato_telefone ALTER CONSTRAINT fk_contato_telefone_telefone DEFERRABLE INITIALLY IMMEDIATE;
+ALTER TABLE centros_inovacao ALTER CONSTRAINT fk_centros_inovacao_contato DEFERRABLE INITIALLY IMMEDIATE;
+ALTER TABLE endereco_centro ALTER CONSTRAINT fk_endereco_centro_endereco DEFERRABLE INITIALLY IMMEDIATE;
+ALTER TABLE endereco_centro ALTER CONSTRAINT fk_endereco_centro_centro DEFERRABLE INITIALLY IMMEDIATE;
+ALTER TABLE ator ALTER CONSTRAINT fk_ator_centro DEFERRABLE INITIALLY IMMEDIATE;
+ALTER TABLE programa ALTER CONSTRAINT fk_programa_ator DEFERRABLE INITIALLY IMMEDIATE;
+
+-- Conferir (condeferrable deve ser true em todas)
+SELECT conrelid::regclass AS tabela, conname, condeferrable, condeferred
+FROM pg_constraint
+WHERE contype = 'f'
+ORDER BY 1, 2;
+
 -- =====================================================
 -- FIM DAS QUERIES
 -- =====================================================
@@ -45,6 +45,7 @@ CREATE TABLE cidade (
         REFERENCES estado(id_estado) 
         ON DELETE RESTRICT 
         ON UPDATE CASCADE
+        DEFERRABLE INITIALLY IMMEDIATE
 );
 
 COMMENT ON TABLE cidade IS 'Tabela com todas as cidades brasileiras';
@@ -67,6 +68,7 @@ CREATE TABLE bairro (
         REFERENCES cidade(id_cidade) 
         ON DELETE RESTRICT 
         ON UPDATE CASCADE
+        DEFERRABLE INITIALLY IMMEDIATE
 );
 
 COMMENT ON TABLE bairro IS 'Bairros das cidades';
@@ -105,11 +107,13 @@ CREATE TABLE endereco (
     CONSTRAINT fk_endereco_tipo_logradouro FOREIGN KEY (id_tipo_logradouro) 
         REFERENCES tipo_logradouro(id_tipo_de_logradouro) 
         ON DELETE RESTRICT 
-        ON UPDATE CASCADE,
+        ON UPDATE CASCADE
+        DEFERRABLE INITIALLY IMMEDIATE,
     CONSTRAINT fk_endereco_bairro FOREIGN KEY (id_bairro) 
         REFERENCES bairro(id_bairro) 
         ON DELETE RESTRICT 
         ON UPDATE CASCADE
+        DEFERRABLE INITIALLY IMMEDIATE
 );
 
 COMMENT ON TABLE endereco IS 'Endereços completos';
@@ -151,6 +155,7 @@ CREATE TABLE contato (
         REFERENCES telefone(id_telefone) 
         ON DELETE RESTRICT 
         ON UPDATE CASCADE
+        DEFERRABLE INITIALLY IMMEDIATE
 );
 
 COMMENT ON TABLE contato IS 'Contatos (emails e telefones)';
@@ -175,11 +180,13 @@ CREATE TABLE contato_telefone (
     CONSTRAINT fk_contato_telefone_contato FOREIGN KEY (id_contato) 
         REFERENCES contato(id_contato) 
         ON DELETE CASCADE 
-        ON UPDATE CASCADE,
+        ON UPDATE CASCADE
+        DEFERRABLE INITIALLY IMMEDIATE,
     CONSTRAINT fk_contato_telefone_telefone FOREIGN KEY (id_telefone) 
         REFERENCES telefone(id_telefone) 
         ON DELETE CASCADE 
-        ON UPDATE CASCADE,
+        ON UPDATE CASCADE
+        DEFERRABLE INITIALLY IMMEDIATE,
     CONSTRAINT uk_contato_telefone UNIQUE (id_contato, id_telefone)
 );
 
@@ -204,6 +211,7 @@ CREATE TABLE centros_inovacao (
         REFERENCES contato(id_contato) 
         ON DELETE RESTRICT 
         ON UPDATE CASCADE
+        DEFERRABLE INITIALLY IMMEDIATE
 );
 
 COMMENT ON TABLE centros_inovacao IS 'Centros de inovação e seus dados principais';
@@ -229,11 +237,13 @@ CREATE TABLE endereco_centro (
     CONSTRAINT fk_endereco_centro_endereco FOREIGN KEY (id_endereco) 
         REFERENCES endereco(id_endereco) 
         ON DELETE CASCADE 
-        ON UPDATE CASCADE,
+        ON UPDATE CASCADE
+        DEFERRABLE INITIALLY IMMEDIATE,
     CONSTRAINT fk_endereco_centro_centro FOREIGN KEY (id_centro) 
         REFERENCES centros_inovacao(id_centro) 
         ON DELETE CASCADE 
-        ON UPDATE CASCADE,
+        ON UPDATE CASCADE
+        DEFERRABLE INITIALLY IMMEDIATE,
     CONSTRAINT uk_endereco_centro UNIQUE (id_endereco, id_centro)
 );
 
@@ -261,6 +271,7 @@ CREATE TABLE ator (
         REFERENCES centros_inovacao(id_centro) 
         ON DELETE RESTRICT 
         ON UPDATE CASCADE
+        DEFERRABLE INITIALLY IMMEDIATE
 );
 
 COMMENT ON TABLE ator IS 'Atores que participam dos centros de inovação';
@@ -290,6 +301,7 @@ CREATE TABLE programa (
         REFERENCES ator(id_ator) 
         ON DELETE RESTRICT 
         ON UPDATE CASCADE
+        DEFERRABLE INITIALLY IMMEDIATE
 );
 
 COMMENT ON TABLE programa IS 'Programas oferecidos pelos atores';
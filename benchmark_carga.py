@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK DOS MODOS DE CARGA
+Compara execute_values e COPY na função inserir_dados_tabela
+
+Para cada tabela escolhida cria uma tabela temporária bench_<tabela> com a
+mesma estrutura (PK e índices, sem FKs), gera dados sintéticos e mede o
+tempo de carga em cada modo. Nada é gravado nas tabelas reais.
+
+Uso:
+    python benchmark_carga.py --linhas 200000 --tabelas endereco contato ator
+"""
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from conexao_banco import adicionar_argumentos_conexao, configurar_sessao, fechar_pool, obter_pool
+from inserir_dados_banco import (
+    MODOS_CARGA,
+    ORDEM_INSERCAO,
+    inserir_dados_tabela,
+    obter_colunas_tabela,
+    obter_pk_tabela,
+)
+
+TABELAS_PADRAO = ['endereco', 'contato', 'ator']
+
+def gerar_valores_coluna(tipo, linhas):
+    """Gera uma lista de valores sintéticos compatível com o tipo do banco"""
+    tipo_upper = tipo.upper()
+    if 'DATE' in tipo_upper:
+        inicio = date(2000, 1, 1)
+        return [(inicio + timedelta(days=i % 9000)).strftime('%d/%m/%Y') for i in range(linhas)]
+    if 'INT' in tipo_upper:
+        return [i % 100000 + 1 for i in range(linhas)]
+    if 'CHAR' in tipo_upper and '(' in tipo:
+        tamanho = int(tipo.split('(')[1].split(')')[0])
+        return [str(i).zfill(tamanho)[-tamanho:] for i in range(linhas)]
+    return [f"Valor {i}" for i in range(linhas)]
+
+def gerar_dataframe(colunas, pk_coluna, linhas, fracao_duplicadas):
+    """Gera DataFrame sintético com as colunas da tabela (nomes iguais aos do banco)"""
+    dados = {}
+    for col in colunas:
+        if col['nome'] == pk_coluna:
+            # Parte das PKs se repete para exercitar o ON CONFLICT
+            unicas = max(1, int(linhas * (1 - fracao_duplicadas)))
+            dados[col['nome']] = [i % unicas + 1 for i in range(linhas)]
+        else:
+            dados[col['nome']] = gerar_valores_coluna(col['tipo'], linhas)
+    return pd.DataFrame(dados)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark execute_values × COPY")
+    parser.add_argument('--linhas', type=int, default=100000, help="linhas sintéticas por tabela")
+    parser.add_argument('--tabelas', nargs='+', default=TABELAS_PADRAO, choices=ORDEM_INSERCAO)
+    parser.add_argument('--duplicadas', type=float, default=0.05,
+                        help="fração de linhas com PK repetida (padrão: 0.05)")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    adicionar_argumentos_conexao(parser)
+    args = parser.parse_args()
+
+    configurar_sessao(args)
+    pool = obter_pool()
+    conn = pool.getconn()
+
+    print("=" * 100)
+    print("BENCHMARK: execute_values × COPY")
+    print("=" * 100)
+    print(f"Linhas por tabela: {args.linhas:,} | PKs repetidas: {args.duplicadas:.0%} | Repetições: {args.repeticoes}")
+    print()
+
+    resultados = []
+    try:
+        for tabela in args.tabelas:
+            tabela_bench = f"bench_{tabela}"
+            cursor = conn.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS {tabela_bench}")
+            cursor.execute(f"CREATE TEMP TABLE {tabela_bench} (LIKE {tabela} INCLUDING ALL)")
+            conn.commit()
+
+            colunas = obter_colunas_tabela(conn, tabela_bench)
+            pk_coluna = obter_pk_tabela(conn, tabela_bench)
+            df = gerar_dataframe(colunas, pk_coluna, args.linhas, args.duplicadas)
+            mapeamento = {c['nome']: c['nome'] for c in colunas}
+
+            for modo in MODOS_CARGA:
+                tempos = []
+                inseridas = None
+                for _ in range(args.repeticoes):
+                    cursor.execute(f"TRUNCATE {tabela_bench}")
+                    conn.commit()
+                    inicio = time.perf_counter()
+                    inseridas = inserir_dados_tabela(conn, tabela_bench, df, dict(mapeamento), modo_carga=modo)
+                    tempos.append(time.perf_counter() - inicio)
+                melhor = min(tempos)
+                resultados.append((tabela, modo, inseridas, melhor, args.linhas / melhor if melhor else 0))
+
+            cursor.execute(f"DROP TABLE IF EXISTS {tabela_bench}")
+            conn.commit()
+            cursor.close()
+    finally:
+        pool.putconn(conn)
+        fechar_pool()
+
+    print()
+    print(f"{'TABELA':20s} {'MODO':16s} {'INSERIDAS':>10s} {'SEGUNDOS':>10s} {'LINHAS/S':>12s}")
+    print("-" * 72)
+    for tabela, modo, inseridas, segundos, taxa in resultados:
+        print(f"{tabela:20s} {modo:16s} {inseridas:10d} {segundos:10.3f} {taxa:12,.0f}")
+
+    # Os dois modos precisam devolver a mesma contagem
+    divergentes = []
+    for tabela in args.tabelas:
+        contagens = {r[2] for r in resultados if r[0] == tabela}
+        if len(contagens) > 1:
+            divergentes.append(tabela)
+    print()
+    if divergentes:
+        print(f"❌ Contagens divergentes entre os modos: {', '.join(divergentes)}")
+        sys.exit(1)
+    print("✅ Contagens de registros inseridos iguais em todos os modos")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK DO ETL COM PLANILHAS SINTÉTICAS
+Mede extração, mapeamento de colunas, limpeza e carga em várias escalas,
+com planilhas geradas por gerar_planilha_sintetica.py
+
+Para cada escala (total de linhas da planilha):
+  extração    pd.read_excel de todas as abas do XLSX gerado (e categorizar_colunas,
+              a menos que --sem-categorias)
+  mapeamento  resolver_mapeamento de cada aba (sem o cache de mapeamentos)
+  limpeza     preparar_insercao de cada tabela, na ORDEM_INSERCAO
+  carga       executar_insercao em cada modo de carga (--modos); o modo asyncpg
+              é o motor asyncpg (carga_asyncpg), se instalado, só no destino postgres
+
+Destinos da carga (--destino):
+  postgres  esquema descartável benchmark_<pid> no banco do config_banco.py,
+            criado com o SCRIPT_SQL_COMPLETO.sql e removido no fim
+  nulo      nada é enviado: o SQL e o CSV são montados como no psycopg2
+            (mede só o custo no cliente, sem precisar de banco)
+
+Cada etapa roda --repeticoes vezes e vale o menor tempo. Os resultados vão
+para benchmarks/benchmark_<data_hora>.json; com --comparar, a tabela mostra a
+variação em relação a um resultado anterior e o script termina com erro se
+alguma etapa ficou mais lenta que a --tolerancia.
+
+Acima de 1.048.575 linhas em uma aba o XLSX não é gerado (limite do Excel):
+a extração não é medida e as demais etapas usam os DataFrames gerados.
+
+Uso:
+    python benchmark_etl.py --escalas 10000 100000 1000000
+    python benchmark_etl.py --escalas 10000 --destino nulo
+    python benchmark_etl.py --comparar benchmarks/benchmark_20250101_120000.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import psycopg2.extensions
+
+import inserir_dados_banco
+from carga_asyncpg import asyncpg, asyncpg_disponivel, encerrar_motor_asyncpg, iniciar_motor_asyncpg
+from catalogo_banco import carregar_catalogo
+from conexao_banco import adicionar_argumentos_conexao, conectar, configurar_sessao, descrever_sessao
+from gerar_planilha_sintetica import (
+    SEMENTE_PADRAO,
+    cabe_em_xlsx,
+    catalogo_sintetico,
+    gerar_abas,
+    salvar_planilha,
+)
+from inserir_dados_banco import (
+    MODOS_CARGA,
+    ORDEM_INSERCAO,
+    carregar_chaves_das_fks,
+    categorizar_colunas,
+    encontrar_aba,
+    executar_insercao,
+    preparar_insercao,
+    resolver_mapeamento,
+    semear_chaves_referenciadas,
+    zerar_deduplicacao,
+)
+from metricas_etl import ConexaoMedida, contar_ida_ao_banco, medir_etapa
+
+ESCALAS_PADRAO = [10000, 100000]
+DESTINOS = ['postgres', 'nulo']
+DIRETORIO_PLANILHAS = 'sinteticas'
+DIRETORIO_RESULTADOS = 'benchmarks'
+TOLERANCIA_PADRAO = 0.10
+
+# Etapas abaixo deste tempo nas duas execuções não contam como regressão (ruído)
+MINIMO_SEGUNDOS_COMPARACAO = 0.01
+
+# ============================================
+# DESTINO NULO (SEM BANCO)
+# ============================================
+
+def adaptar(valor):
+    """Literal SQL de um valor, como o psycopg2 geraria (UTF-8)"""
+    adaptado = psycopg2.extensions.adapt(valor)
+    if hasattr(adaptado, 'encoding'):
+        adaptado.encoding = 'UTF8'
+    return adaptado.getquoted()
+
+class CursorNulo:
+    """Cursor que monta os comandos como o psycopg2, mas não envia nada
+
+    rowcount do INSERT é o número de linhas montadas (ou copiadas no COPY),
+    como se nenhuma PK já existisse.
+    """
+
+    def __init__(self, conexao):
+        self.connection = conexao
+        self.rowcount = -1
+        self.pendentes = 0
+
+    def mogrify(self, template, args):
+        self.pendentes += 1
+        return template % tuple(adaptar(valor) for valor in args)
+
+    def execute(self, query, vars=None):
+        if vars is not None:
+            query = self.mogrify(query.encode('utf-8'), vars)
+        contar_ida_ao_banco(len(query))
+        self.rowcount, self.pendentes = self.pendentes, 0
+
+    def copy_expert(self, sql, file, size=8192):
+        conteudo = file.read()
+        self.pendentes = conteudo.count('\n')
+        contar_ida_ao_banco(len(sql) + len(conteudo))
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+class ConexaoNula:
+    """Conexão do destino nulo (ver CursorNulo)"""
+    encoding = 'UTF8'
+
+    def cursor(self):
+        return CursorNulo(self)
+
+    def commit(self):
+        contar_ida_ao_banco()
+
+    def rollback(self):
+        contar_ida_ao_banco()
+
+    def close(self):
+        pass
+
+# ============================================
+# DESTINO POSTGRES (ESQUEMA DESCARTÁVEL)
+# ============================================
+
+def criar_esquema_descartavel(esquema):
+    """Conecta com search_path no esquema novo e cria as tabelas do SCRIPT_SQL_COMPLETO.sql"""
+    conn = conectar({'search_path': esquema})
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE SCHEMA {esquema}")
+    with open('SCRIPT_SQL_COMPLETO.sql', 'r', encoding='utf-8') as f:
+        cursor.execute(f.read())
+    conn.commit()
+    cursor.close()
+    return conn
+
+def remover_esquema_descartavel(conn, esquema):
+    conn.rollback()
+    cursor = conn.cursor()
+    cursor.execute(f"DROP SCHEMA IF EXISTS {esquema} CASCADE")
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+def esvaziar_tabelas(conn, destino):
+    """Volta o destino ao estado vazio antes de cada repetição"""
+    if destino == 'postgres':
+        cursor = conn.cursor()
+        cursor.execute(f"TRUNCATE {', '.join(ORDEM_INSERCAO)} CASCADE")
+        conn.commit()
+        cursor.close()
+
+# ============================================
+# MEDIÇÕES
+# ============================================
+
+def obter_planilha(escala, semente, repeticoes, categorizar=True):
+    """Gera (ou reaproveita) a planilha da escala e mede a extração
+
+    Retorna (abas, segundos_extracao); segundos_extracao é None quando a
+    escala não cabe em XLSX e as abas são os DataFrames gerados.
+    """
+    inicio = time.perf_counter()
+    abas = gerar_abas(escala, semente)
+    print(f"   🧪 Planilha sintética gerada ({sum(len(df) for df in abas.values()):,} linhas, "
+          f"{time.perf_counter() - inicio:.1f}s)")
+    if not cabe_em_xlsx(abas):
+        print("   ℹ️  Aba maior que o limite do XLSX: extração não medida")
+        if categorizar:
+            abas = {aba: categorizar_colunas(df) for aba, df in abas.items()}
+        return abas, None
+
+    caminho = os.path.join(DIRETORIO_PLANILHAS, f"planilha_{escala}_s{semente}.xlsx")
+    if not os.path.exists(caminho):
+        inicio = time.perf_counter()
+        salvar_planilha(abas, caminho)
+        print(f"   💾 {caminho} ({time.perf_counter() - inicio:.1f}s)")
+
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        abas = pd.read_excel(caminho, sheet_name=None, engine='openpyxl')
+        if categorizar:
+            abas = {aba: categorizar_colunas(df) for aba, df in abas.items()}
+        tempos.append(time.perf_counter() - inicio)
+    return abas, min(tempos)
+
+def medir_mapeamento(abas, catalogo, repeticoes):
+    """Resolve o mapeamento de todas as abas; retorna ({tabela: (aba, mapeamento)}, segundos)"""
+    tempos = []
+    for _ in range(repeticoes):
+        mapeamentos = {}
+        inicio = time.perf_counter()
+        for tabela in ORDEM_INSERCAO:
+            aba = encontrar_aba(tabela, list(abas.keys()))
+            if aba is not None:
+                colunas_banco = [c['nome'] for c in catalogo[tabela]['colunas']]
+                mapeamentos[tabela] = (aba, resolver_mapeamento(list(abas[aba].columns), colunas_banco))
+        tempos.append(time.perf_counter() - inicio)
+    return mapeamentos, min(tempos)
+
+def medir_limpeza_e_carga(conn, destino, abas, mapeamentos, catalogo, modo, repeticoes):
+    """Limpa e carrega todas as tabelas; retorna o melhor tempo de cada etapa e as contagens"""
+    melhor = None
+    for _ in range(repeticoes):
+        esvaziar_tabelas(conn, destino)
+        with contextlib.redirect_stdout(io.StringIO()):
+            semear_chaves_referenciadas(conn, catalogo)
+        zerar_deduplicacao()
+        rodada = {'limpeza': 0.0, 'carga': 0.0, 'linhas_limpas': 0, 'inseridas': 0, 'idas_ao_banco': 0}
+        for tabela in ORDEM_INSERCAO:
+            if tabela not in mapeamentos:
+                continue
+            aba, mapeamento = mapeamentos[tabela]
+            # Os avisos da limpeza e da bisseção não interessam aqui
+            with contextlib.redirect_stdout(io.StringIO()):
+                carregar_chaves_das_fks(conn, catalogo[tabela])
+                inicio = time.perf_counter()
+                lote = preparar_insercao(conn, tabela, abas[aba], dict(mapeamento), catalogo[tabela])
+                rodada['limpeza'] += time.perf_counter() - inicio
+                if lote is None:
+                    continue
+                rodada['linhas_limpas'] += len(lote['dados'])
+                with medir_etapa(tabela, 'carga') as medicao:
+                    if modo == 'asyncpg':
+                        rodada['inseridas'] += executar_insercao(conn, lote, motor='asyncpg')
+                    else:
+                        rodada['inseridas'] += executar_insercao(conn, lote, modo)
+                rodada['carga'] += medicao['segundos']
+                rodada['idas_ao_banco'] += medicao['idas_ao_banco']
+        if melhor is None:
+            melhor = rodada
+        else:
+            melhor['limpeza'] = min(melhor['limpeza'], rodada['limpeza'])
+            melhor['carga'] = min(melhor['carga'], rodada['carga'])
+    return melhor
+
+def resultado(escala, etapa, modo, linhas, segundos, idas_ao_banco=None):
+    return {
+        'escala': escala,
+        'etapa': etapa,
+        'modo': modo,
+        'linhas': linhas,
+        'segundos': round(segundos, 6),
+        'linhas_por_segundo': round(linhas / segundos, 1) if segundos and linhas else None,
+        'idas_ao_banco': idas_ao_banco,
+    }
+
+# ============================================
+# RELATÓRIO
+# ============================================
+
+def chave_resultado(item):
+    return (item['escala'], item['etapa'], item['modo'])
+
+def imprimir_resultados(resultados, anteriores, tolerancia):
+    """Tabela de resultados; com anteriores, a variação de tempo e as regressões"""
+    referencia = {chave_resultado(item): item for item in anteriores}
+    cabecalho = (f"{'ESCALA':>10s} {'ETAPA':12s} {'MODO':15s} {'LINHAS':>10s} {'SEGUNDOS':>10s} "
+                 f"{'LINHAS/S':>12s} {'IDAS':>7s}")
+    if referencia:
+        cabecalho += f" {'ANTES':>10s} {'VARIAÇÃO':>9s}"
+    print(cabecalho)
+    print("-" * len(cabecalho))
+    regressoes = []
+    for item in resultados:
+        taxa = f"{item['linhas_por_segundo']:12,.0f}" if item['linhas_por_segundo'] else f"{'-':>12s}"
+        idas = f"{item['idas_ao_banco']:7d}" if item['idas_ao_banco'] is not None else f"{'-':>7s}"
+        linha = (f"{item['escala']:10,d} {item['etapa']:12s} {item['modo']:15s} {item['linhas']:10,d} "
+                 f"{item['segundos']:10.3f} {taxa} {idas}")
+        anterior = referencia.get(chave_resultado(item))
+        if anterior is not None and anterior['segundos']:
+            variacao = item['segundos'] / anterior['segundos'] - 1
+            linha += f" {anterior['segundos']:10.3f} {variacao:+8.1%}"
+            if variacao > tolerancia and item['segundos'] >= MINIMO_SEGUNDOS_COMPARACAO:
+                linha += "  ⚠️"
+                regressoes.append(item)
+        print(linha)
+    return regressoes
+
+def versao_servidor(conn):
+    if not isinstance(conn, ConexaoMedida):
+        return None
+    cursor = conn.cursor()
+    cursor.execute("SHOW server_version")
+    versao = cursor.fetchone()[0]
+    cursor.close()
+    conn.commit()
+    return versao
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extração, mapeamento, limpeza e carga")
+    parser.add_argument('--escalas', type=int, nargs='+', default=ESCALAS_PADRAO,
+                        help="total de linhas de cada planilha sintética (padrão: 10000 100000)")
+    parser.add_argument('--destino', choices=DESTINOS, default='postgres',
+                        help="postgres (esquema descartável) ou nulo (sem banco)")
+    parser.add_argument('--modos', nargs='+', choices=MODOS_CARGA + ['asyncpg'],
+                        help="modos de carga comparados (padrão: todos os disponíveis no destino)")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--semente', type=int, default=SEMENTE_PADRAO)
+    parser.add_argument('--sem-categorias', action='store_true',
+                        help="mantém as colunas de baixa cardinalidade como texto (sem Categorical)")
+    parser.add_argument('--comparar', metavar='ARQUIVO', help="resultado anterior (JSON) para comparação")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO,
+                        help=f"aumento de tempo aceito antes de acusar regressão (padrão: {TOLERANCIA_PADRAO:.0%})")
+    adicionar_argumentos_conexao(parser)
+    args = parser.parse_args()
+    configurar_sessao(args)
+    if args.modos is None:
+        args.modos = MODOS_CARGA + (['asyncpg'] if asyncpg_disponivel() and args.destino == 'postgres' else [])
+    elif 'asyncpg' in args.modos and (not asyncpg_disponivel() or args.destino != 'postgres'):
+        print("ℹ️  Modo asyncpg ignorado (exige o asyncpg instalado e o destino postgres)")
+        args.modos = [modo for modo in args.modos if modo != 'asyncpg']
+
+    # Caminhos relativos ao script (SCRIPT_SQL_COMPLETO.sql, sinteticas/, benchmarks/)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    # Rejeitados da bisseção ficam junto dos resultados, não com os das cargas reais
+    inserir_dados_banco.DIRETORIO_REJEITADOS = os.path.join(DIRETORIO_RESULTADOS, 'rejeitados')
+
+    anteriores = []
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            anteriores = json.load(f)['resultados']
+
+    print("=" * 100)
+    print("BENCHMARK DO ETL (PLANILHAS SINTÉTICAS)")
+    print("=" * 100)
+    print(f"Escalas: {', '.join(f'{e:,}' for e in args.escalas)} | Destino: {args.destino} | "
+          f"Modos: {', '.join(args.modos)} | Repetições: {args.repeticoes} | Semente: {args.semente} | "
+          f"Categorias: {'não' if args.sem_categorias else 'sim'}")
+    print()
+
+    esquema = f"benchmark_{os.getpid()}"
+    if args.destino == 'postgres':
+        conn = criar_esquema_descartavel(esquema)
+        catalogo, _ = carregar_catalogo(conn, ORDEM_INSERCAO, usar_cache=False)
+        conn.commit()
+        if 'asyncpg' in args.modos:
+            iniciar_motor_asyncpg(1, {'search_path': esquema})
+        print(f"🐘 Esquema descartável: {esquema}")
+    else:
+        conn = ConexaoNula()
+        catalogo = catalogo_sintetico()
+        print("🚫 Destino nulo: nada é enviado ao banco")
+
+    resultados = []
+    divergentes = []
+    try:
+        servidor = versao_servidor(conn)
+        for escala in args.escalas:
+            print(f"\n📏 Escala {escala:,}")
+            abas, segundos_extracao = obter_planilha(escala, args.semente, args.repeticoes,
+                                                     categorizar=not args.sem_categorias)
+            linhas_planilha = sum(len(df) for df in abas.values())
+            if segundos_extracao is not None:
+                resultados.append(resultado(escala, 'extração', '-', linhas_planilha, segundos_extracao))
+
+            mapeamentos, segundos_mapeamento = medir_mapeamento(abas, catalogo, args.repeticoes)
+            resultados.append(resultado(escala, 'mapeamento', '-', 0, segundos_mapeamento))
+
+            contagens = {}
+            limpeza = None
+            for modo in args.modos:
+                print(f"   ⏱️  Limpeza e carga ({modo})...")
+                medida = medir_limpeza_e_carga(conn, args.destino, abas, mapeamentos, catalogo, modo,
+                                               args.repeticoes)
+                # A limpeza não depende do modo: vale o menor tempo entre os modos
+                limpeza = medida['limpeza'] if limpeza is None else min(limpeza, medida['limpeza'])
+                contagens[modo] = medida['inseridas']
+                resultados.append(resultado(escala, 'carga', modo, medida['inseridas'], medida['carga'],
+                                            medida['idas_ao_banco']))
+            resultados.insert(len(resultados) - len(args.modos),
+                              resultado(escala, 'limpeza', '-', medida['linhas_limpas'], limpeza))
+            if len(set(contagens.values())) > 1:
+                divergentes.append(escala)
+    finally:
+        encerrar_motor_asyncpg()
+        if args.destino == 'postgres':
+            remover_esquema_descartavel(conn, esquema)
+
+    print()
+    regressoes = imprimir_resultados(resultados, anteriores, args.tolerancia)
+
+    os.makedirs(DIRETORIO_RESULTADOS, exist_ok=True)
+    arquivo = os.path.join(DIRETORIO_RESULTADOS, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(arquivo, 'w', encoding='utf-8') as f:
+        json.dump({
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+            'destino': args.destino,
+            'repeticoes': args.repeticoes,
+            'semente': args.semente,
+            'categorias': not args.sem_categorias,
+            'ambiente': {
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'numpy': np.__version__,
+                'psycopg2': psycopg2.__version__.split()[0],
+                'asyncpg': asyncpg.__version__ if asyncpg is not None else None,
+                'postgres': servidor,
+                'sessao': descrever_sessao() if args.destino == 'postgres' else None,
+                'maquina': platform.platform(),
+            },
+            'resultados': resultados,
+        }, f, ensure_ascii=False, indent=2)
+    print()
+    print(f"📝 Resultados: {arquivo}")
+
+    if divergentes:
+        print(f"❌ Contagens de registros inseridos divergentes entre os modos (escalas: {divergentes})")
+        sys.exit(1)
+    if regressoes:
+        print(f"❌ {len(regressoes)} etapas mais lentas que a tolerância ({args.tolerancia:.0%})")
+        sys.exit(1)
+    print("✅ Contagens iguais em todos os modos" + (" e nenhuma regressão" if anteriores else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+CACHE DAS PLANILHAS EM ARROW (FEATHER)
+Guarda cada aba já lida pelo pandas em um arquivo Arrow IPC sem compressão,
+identificado pelo hash do conteúdo do XLSX + nome da aba
+
+Nas execuções seguintes (inclusive novas tentativas depois de erro no banco)
+as abas são lidas do Arrow em vez de reprocessar o XLSX no openpyxl: o
+arquivo é mapeado em memória e convertido para pandas (uma cópia das
+colunas, sem o parse do XML). O diretório tem um limite de tamanho: as
+planilhas usadas há mais tempo são removidas primeiro (LRU pela data de
+modificação do manifesto).
+
+Colunas com valores de tipos diferentes (ex: números e textos, ou datas e
+textos) não cabem em um array Arrow: são gravadas como texto, com o tipo de
+cada valor em uma coluna ao lado, e voltam com os tipos originais.
+
+O pyarrow é opcional: sem ele o cache fica desligado e nada muda.
+"""
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+DIRETORIO_CACHE = os.path.join('.cache_etl', 'planilhas')
+LIMITE_CACHE_MB = 512
+
+# Tipos aceitos nas colunas misturadas: nome do tipo -> (valor -> texto, texto -> valor)
+CONVERSOES_MISTURADAS = {
+    'str': (str, str),
+    'int': (str, int),
+    'float': (repr, float),
+    'bool': (str, lambda texto: texto == 'True'),
+    'datetime': (datetime.datetime.isoformat, datetime.datetime.fromisoformat),
+    'date': (datetime.date.isoformat, datetime.date.fromisoformat),
+    'time': (datetime.time.isoformat, datetime.time.fromisoformat),
+    'Timestamp': (pd.Timestamp.isoformat, pd.Timestamp),
+}
+# Metadado do Arrow com as posições das colunas misturadas
+CHAVE_MISTURADAS = b'etl_colunas_misturadas'
+
+def cache_disponivel():
+    """O cache só funciona com o pyarrow instalado"""
+    return pa is not None
+
+def calcular_hash_arquivo(caminho):
+    """SHA-256 do conteúdo do arquivo (lido em blocos de 1 MB)"""
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def caminho_manifesto(hash_arquivo, diretorio=DIRETORIO_CACHE):
+    """Manifesto com a ordem das abas e o arquivo Arrow de cada uma"""
+    return os.path.join(diretorio, f"{hash_arquivo}.json")
+
+def caminho_aba(hash_arquivo, nome_aba, diretorio=DIRETORIO_CACHE):
+    """Arquivo Arrow de uma aba (nome da aba em hash para evitar caracteres inválidos)"""
+    sufixo = hashlib.md5(nome_aba.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(diretorio, f"{hash_arquivo}_{sufixo}.arrow")
+
+def codificar_coluna_misturada(nome, valores):
+    """(textos, tipos) de uma coluna com tipos misturados; None fica nulo nos dois"""
+    textos, tipos = [], []
+    for valor in valores:
+        tipo = None if valor is None else type(valor).__name__
+        if tipo is not None and tipo not in CONVERSOES_MISTURADAS:
+            raise TypeError(f"coluna {nome!r}: valor {valor!r} do tipo {tipo}")
+        textos.append(None if tipo is None else CONVERSOES_MISTURADAS[tipo][0](valor))
+        tipos.append(tipo)
+    return textos, pa.array(tipos, type=pa.string()).dictionary_encode()
+
+def tabela_da_aba(df):
+    """Tabela Arrow da aba, com as colunas de tipos misturados codificadas como texto"""
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        pass
+    misturadas = []
+    for posicao in range(df.shape[1]):
+        if df.iloc[:, posicao].dtype == object:
+            try:
+                pa.array(df.iloc[:, posicao], from_pandas=True)
+            except (pa.ArrowTypeError, pa.ArrowInvalid):
+                misturadas.append(posicao)
+    codificadas = {posicao: codificar_coluna_misturada(df.columns[posicao], df.iloc[:, posicao])
+                   for posicao in misturadas}
+    copia = df.copy(deep=False)
+    for posicao, (textos, _) in codificadas.items():
+        copia.isetitem(posicao, pd.Series(textos, index=df.index, dtype=object))
+    tabela = pa.Table.from_pandas(copia, preserve_index=False)
+    for posicao, (_, tipos) in codificadas.items():
+        tabela = tabela.append_column(f"_tipos_{posicao}", tipos)
+    metadados = dict(tabela.schema.metadata or {})
+    metadados[CHAVE_MISTURADAS] = json.dumps(misturadas).encode('utf-8')
+    return tabela.replace_schema_metadata(metadados)
+
+def aba_da_tabela(tabela):
+    """DataFrame de uma tabela gravada por tabela_da_aba, com os tipos originais"""
+    misturadas = json.loads((tabela.schema.metadata or {}).get(CHAVE_MISTURADAS, b'[]'))
+    if not misturadas:
+        return tabela.to_pandas()
+    colunas = tabela.num_columns - len(misturadas)
+    df = tabela.select(list(range(colunas))).to_pandas()
+    for numero, posicao in enumerate(misturadas):
+        textos = tabela.column(posicao).to_pylist()
+        tipos = tabela.column(colunas + numero).to_pylist()
+        valores = [None if tipo is None else CONVERSOES_MISTURADAS[tipo][1](texto)
+                   for texto, tipo in zip(textos, tipos)]
+        df.isetitem(posicao, pd.Series(valores, index=df.index, dtype=object))
+    return df
+
+def ler_abas_do_cache(hash_arquivo, diretorio=DIRETORIO_CACHE):
+    """Devolve {aba: DataFrame} do cache, ou None se a planilha não estiver em cache"""
+    manifesto = caminho_manifesto(hash_arquivo, diretorio)
+    try:
+        with open(manifesto, 'r', encoding='utf-8') as f:
+            abas = json.load(f)['abas']
+        abas_excel = {}
+        for nome_aba in abas:
+            tabela = feather.read_table(caminho_aba(hash_arquivo, nome_aba, diretorio), memory_map=True)
+            abas_excel[nome_aba] = aba_da_tabela(tabela)
+    except (OSError, ValueError, KeyError, pa.ArrowException):
+        return None
+    # Marcar como usada recentemente (ordem do LRU)
+    os.utime(manifesto)
+    return abas_excel
+
+def gravar_abas_no_cache(hash_arquivo, abas_excel, diretorio=DIRETORIO_CACHE, limite_mb=LIMITE_CACHE_MB):
+    """Grava as abas em Arrow e aplica o limite de tamanho do diretório
+
+    Retorna None, ou o motivo se alguma aba não puder ser convertida (ex:
+    valor de um tipo fora de CONVERSOES_MISTURADAS); nesse caso a planilha
+    não fica em cache.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    try:
+        for nome_aba, df in abas_excel.items():
+            # Sem compressão: a leitura mapeia o arquivo sem descompactar
+            feather.write_feather(tabela_da_aba(df), caminho_aba(hash_arquivo, nome_aba, diretorio),
+                                  compression='uncompressed')
+    except (pa.ArrowException, TypeError, ValueError) as e:
+        remover_entrada(hash_arquivo, diretorio)
+        return f"aba {nome_aba!r}: {e}"
+
+    # O manifesto é gravado por último: só existe se todas as abas foram gravadas.
+    # Temporário com nome único (processos do lote podem gravar a mesma planilha);
+    # o prefixo do hash faz remover_entrada levar junto um que tenha sobrado
+    manifesto = caminho_manifesto(hash_arquivo, diretorio)
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=diretorio, prefix=f"{hash_arquivo}.",
+                                     suffix='.tmp', delete=False) as f:
+        json.dump({'abas': list(abas_excel.keys())}, f, ensure_ascii=False)
+    os.replace(f.name, manifesto)
+
+    aplicar_limite_cache(diretorio, limite_mb, manter=hash_arquivo)
+    return None
+
+def remover_entrada(hash_arquivo, diretorio=DIRETORIO_CACHE):
+    """Remove o manifesto e todas as abas de uma planilha do cache"""
+    for nome in os.listdir(diretorio):
+        if nome.startswith(hash_arquivo):
+            # Outro processo (carga em lote) pode ter removido antes
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(diretorio, nome))
+
+def aplicar_limite_cache(diretorio=DIRETORIO_CACHE, limite_mb=LIMITE_CACHE_MB, manter=None):
+    """Remove as planilhas usadas há mais tempo até o diretório caber no limite
+
+    A planilha 'manter' (a que acabou de ser gravada) nunca é removida.
+    """
+    entradas = {}
+    for nome in os.listdir(diretorio):
+        caminho = os.path.join(diretorio, nome)
+        hash_arquivo = nome[:64]
+        entrada = entradas.setdefault(hash_arquivo, {'bytes': 0, 'uso': 0.0})
+        try:
+            entrada['bytes'] += os.path.getsize(caminho)
+            if nome.endswith('.json'):
+                entrada['uso'] = os.path.getmtime(caminho)
+        except FileNotFoundError:
+            continue
+
+    total = sum(e['bytes'] for e in entradas.values())
+    limite = limite_mb * 1024 * 1024
+    removidas = []
+    # Entradas sem manifesto (gravação interrompida) têm uso 0 e saem primeiro
+    for hash_arquivo, entrada in sorted(entradas.items(), key=lambda item: item[1]['uso']):
+        if total <= limite:
+            break
+        if hash_arquivo == manter:
+            continue
+        remover_entrada(hash_arquivo, diretorio)
+        total -= entrada['bytes']
+        removidas.append(hash_arquivo)
+    return removidas
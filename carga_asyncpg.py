@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+MOTOR DE CARGA ASYNCPG (--motor asyncpg)
+Alternativa ao psycopg2 só na etapa de carga: leitura, mapeamento de
+colunas, limpeza, pré-validação de FKs, deduplicação, checkpoints e
+quarentena continuam os mesmos, e as contagens devolvidas também
+
+Cada lote vai com copy_records_to_table (COPY no protocolo binário: as
+tuplas da limpeza são codificadas pelo asyncpg em Cython, sem montar SQL
+nem CSV em Python) para uma tabela temporária, e é mesclado na tabela final
+com o mesmo INSERT ... SELECT ... ON CONFLICT do modo copy.
+
+As conexões ficam em um asyncpg.Pool, atendido por um único event loop em
+uma thread própria. As threads de carga de cada tabela (--workers) só
+entregam os lotes ao loop e esperam o resultado, sem disputar o GIL entre
+si enquanto o banco trabalha.
+
+Linhas que o banco recusa são isoladas por bisseção, cada metade em uma
+transação aninhada (SAVEPOINT), como em inserir_com_bissecao. Aqui só há
+E/S: quem chama (inserir_dados_banco) imprime o log, grava a quarentena e
+atualiza chaves e estado incremental na própria thread.
+
+O asyncpg é opcional (pip install asyncpg), como o pyarrow do cache_planilha.
+"""
+import asyncio
+import threading
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+from conexao_banco import CONFIG_SESSAO, obter_parametros_conexao, parametros_de_sessao
+from quarentena import codigo_do_erro
+
+class ErroDeCodificacao(Exception):
+    """Valor que o asyncpg não consegue codificar no tipo da coluna (ex: inteiro fora do INTEGER)
+
+    O COPY binário codifica as tuplas no cliente e os codecs levantam
+    OverflowError/TypeError/ValueError comuns; só os que saem do
+    copy_records_to_table viram este erro (o original fica em __cause__).
+    """
+
+# Erros que a bisseção isola linha a linha: restrições e valores recusados
+# pelo servidor e valores que não puderam ser codificados. Qualquer outro
+# erro é falha do programa e sobe para quem chamou
+ERROS_DE_DADOS = (ErroDeCodificacao,)
+if asyncpg is not None:
+    ERROS_DE_DADOS += (asyncpg.IntegrityConstraintViolationError, asyncpg.DataError)
+
+# Assinatura, flags e extensão no início do COPY binário e o -1 do fim
+BYTES_MOLDURA_COPY = 21
+
+# Event loop, thread e pool do motor (iniciar_motor_asyncpg / encerrar_motor_asyncpg)
+MOTOR = {'loop': None, 'thread': None, 'pool': None, 'parametros_extras': None}
+TRAVA_MOTOR = threading.Lock()
+
+def asyncpg_disponivel():
+    return asyncpg is not None
+
+async def criar_pool(conexoes, parametros_extras=None):
+    """asyncpg.Pool com as configurações de sessão de conexao_banco (ver conectar)"""
+    parametros = obter_parametros_conexao()
+    # O asyncpg sempre conversa em UTF8 (client_encoding não é parâmetro dele)
+    parametros.pop('client_encoding', None)
+    if CONFIG_SESSAO['pgbouncer']:
+        # Sem parâmetros de inicialização nem comandos preparados com nome
+        return await asyncpg.create_pool(**parametros, min_size=1, max_size=conexoes,
+                                         statement_cache_size=0)
+    return await asyncpg.create_pool(**parametros, min_size=1, max_size=conexoes,
+                                     server_settings=parametros_de_sessao(parametros_extras))
+
+def iniciar_motor_asyncpg(conexoes=1, parametros_extras=None):
+    """Sobe o event loop em uma thread e abre o pool com até 'conexoes' conexões
+
+    parametros_extras: outros parâmetros do servidor, ex. {'search_path': 'esquema'}
+    """
+    with TRAVA_MOTOR:
+        if MOTOR['pool'] is not None:
+            return
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name='asyncpg', daemon=True)
+        thread.start()
+        try:
+            pool = asyncio.run_coroutine_threadsafe(criar_pool(conexoes, parametros_extras), loop).result()
+        except Exception:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+            raise
+        MOTOR.update(loop=loop, thread=thread, pool=pool, parametros_extras=parametros_extras)
+
+def encerrar_motor_asyncpg():
+    """Fecha o pool e para o event loop"""
+    with TRAVA_MOTOR:
+        if MOTOR['loop'] is None:
+            return
+        loop, thread, pool = MOTOR['loop'], MOTOR['thread'], MOTOR['pool']
+        try:
+            asyncio.run_coroutine_threadsafe(pool.close(), loop).result()
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+            MOTOR.update(loop=None, thread=None, pool=None, parametros_extras=None)
+
+def executar(corrotina):
+    """Roda a corrotina no event loop do motor e espera o resultado (thread atual bloqueada)"""
+    return asyncio.run_coroutine_threadsafe(corrotina, MOTOR['loop']).result()
+
+def descrever_erro(erro):
+    """(código de quarentena, restrição, mensagem) de um erro do asyncpg ou da codificação"""
+    if isinstance(erro, ErroDeCodificacao):
+        # Recusado antes de chegar ao banco: valor incompatível com o tipo da coluna
+        return 'valor_invalido', type(erro.__cause__).__name__, str(erro)
+    restricao = getattr(erro, 'constraint_name', None)
+    if not restricao and getattr(erro, 'column_name', None):
+        restricao = f"coluna:{erro.column_name}"
+    mensagem = getattr(erro, 'message', None) or str(erro).strip()
+    if getattr(erro, 'detail', None):
+        mensagem = f"{mensagem} ({erro.detail})"
+    return codigo_do_erro(erro), restricao or type(erro).__name__, mensagem
+
+def bytes_do_copy_binario(colunas):
+    """Tamanho aproximado do COPY binário das colunas (arrays da limpeza), sem codificá-las
+
+    Cada linha tem 2 bytes (número de campos) e cada campo 4 (tamanho), mais
+    o valor: texto em UTF-8, NULL nada e os demais tipos 8 bytes (o maior
+    entre inteiros, float, data e timestamp). Só para as métricas.
+    """
+    if not colunas:
+        return 0
+    linhas = len(colunas[0])
+    total = BYTES_MOLDURA_COPY + linhas * (2 + 4 * len(colunas))
+    for valores in colunas:
+        textos = [valor for valor in valores if valor.__class__ is str]
+        nulos = sum(1 for valor in valores if valor is None)
+        total += len(''.join(textos).encode('utf-8')) + 8 * (linhas - len(textos) - nulos)
+    return total
+
+# ============================================
+# CARGA DE UM LOTE
+# ============================================
+
+async def aplicar_configuracoes_locais(conexao, contador):
+    """No modo PgBouncer, abre a transação com SET LOCAL (set_config) das configurações"""
+    parametros = parametros_de_sessao(MOTOR['parametros_extras']) if CONFIG_SESSAO['pgbouncer'] else {}
+    if parametros:
+        chamadas = ', '.join(f"set_config(${2 * i + 1}, ${2 * i + 2}, true)" for i in range(len(parametros)))
+        await conexao.execute(f"SELECT {chamadas}", *[item for par in parametros.items() for item in par])
+        contador['idas'] += 1
+
+async def inserir_registros(conexao, nome_tabela, colunas, dados, clausula_conflito, contador):
+    """COPY binário para a staging e INSERT ... SELECT na tabela final; retorna as linhas inseridas
+
+    A staging é criada dentro da transação atual (ON COMMIT DROP): se a
+    transação ou o SAVEPOINT for desfeito, ela some junto.
+    """
+    colunas_str = ', '.join(f'"{col}"' for col in colunas)
+    tabela_staging = f"_staging_{nome_tabela}"
+    # Três comandos em uma ida só (protocolo simples, sem parâmetros)
+    await conexao.execute(f"""
+        DROP TABLE IF EXISTS {tabela_staging};
+        CREATE TEMP TABLE {tabela_staging} ON COMMIT DROP AS
+        SELECT {colunas_str} FROM {nome_tabela} WITH NO DATA;
+        ALTER TABLE {tabela_staging} ADD COLUMN _ordem BIGSERIAL
+    """)
+    try:
+        await conexao.copy_records_to_table(tabela_staging, records=dados, columns=list(colunas))
+    except (OverflowError, TypeError, ValueError) as e:
+        raise ErroDeCodificacao(str(e)) from e
+    # _ordem preserva a ordem da planilha: em PK repetida vence a primeira linha
+    status = await conexao.execute(f"""
+        INSERT INTO {nome_tabela} ({colunas_str})
+        SELECT {colunas_str} FROM {tabela_staging} ORDER BY _ordem
+        {clausula_conflito}
+    """)
+    contador['idas'] += 3
+    return int(status.split()[-1])
+
+async def inserir_com_bissecao(conexao, nome_tabela, colunas, dados, clausula_conflito, contador):
+    """Insere um lote que falhou dividindo-o ao meio até isolar as linhas recusadas
+
+    Retorna (linhas inseridas, [(posição no lote, código, restrição, mensagem)]).
+    """
+    rejeitados = []
+
+    async def inserir_intervalo(inicio, fim):
+        try:
+            async with conexao.transaction():
+                return await inserir_registros(conexao, nome_tabela, colunas, dados[inicio:fim],
+                                               clausula_conflito, contador)
+        except ERROS_DE_DADOS as e:
+            if fim - inicio == 1:
+                rejeitados.append((inicio, *descrever_erro(e)))
+                return 0
+            meio = (inicio + fim) // 2
+            return await inserir_intervalo(inicio, meio) + await inserir_intervalo(meio, fim)
+
+    async with conexao.transaction():
+        await aplicar_configuracoes_locais(conexao, contador)
+        # O lote inteiro já falhou: começar direto pelas metades
+        total = len(dados)
+        if total > 1:
+            meio = total // 2
+            linhas_inseridas = await inserir_intervalo(0, meio) + await inserir_intervalo(meio, total)
+        else:
+            linhas_inseridas = await inserir_intervalo(0, total)
+    return linhas_inseridas, rejeitados
+
+async def inserir_lote(nome_tabela, colunas, dados, clausula_conflito):
+    """Carrega um lote em uma transação; se o banco recusar, refaz por bisseção
+
+    Retorna {'inseridas', 'idas', 'erro', 'rejeitados'}: erro é a mensagem da
+    primeira falha (None se o lote passou inteiro) e rejeitados como em
+    inserir_com_bissecao.
+    """
+    contador = {'idas': 0}
+    async with MOTOR['pool'].acquire() as conexao:
+        try:
+            async with conexao.transaction():
+                await aplicar_configuracoes_locais(conexao, contador)
+                inseridas = await inserir_registros(conexao, nome_tabela, colunas, dados,
+                                                    clausula_conflito, contador)
+            return {'inseridas': inseridas, 'idas': contador['idas'], 'erro': None, 'rejeitados': []}
+        except ERROS_DE_DADOS as e:
+            erro = str(e)
+        inseridas, rejeitados = await inserir_com_bissecao(conexao, nome_tabela, colunas, dados,
+                                                           clausula_conflito, contador)
+    return {'inseridas': inseridas, 'idas': contador['idas'], 'erro': erro, 'rejeitados': rejeitados}
+
+def carregar_lote_asyncpg(nome_tabela, colunas, dados, clausula_conflito):
+    """inserir_lote para quem não é corrotina: roda no motor e espera (ver iniciar_motor_asyncpg)"""
+    return executar(inserir_lote(nome_tabela, colunas, dados, clausula_conflito))
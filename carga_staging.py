@@ -0,0 +1,418 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+CARGA EM STAGING NO SERVIDOR (--staging)
+Para as tabelas que chegam a dezenas de milhões de linhas (endereco,
+contato_telefone, ator): os blocos da planilha não vão direto para a tabela
+final, e sim para uma tabela UNLOGGED no esquema etl_staging, e só entram na
+tabela final no fim, de uma vez, com SQL de conjunto
+
+1. copiar_para_staging: COPY (CSV) de cada bloco já limpo para
+   etl_staging.<tabela>, sem WAL, índices nem restrições. Inteiros vão em
+   NUMERIC e textos em TEXT, então o COPY de um bloco nunca é recusado.
+2. validar_staging: UPDATEs de conjunto marcam as linhas recusadas, cada
+   uma com código, restrição e mensagem como na quarentena:
+   - valores fora do tipo da coluna final (faixa do INTEGER, tamanho do VARCHAR)
+   - FKs sem linha na tabela pai (anti-join NOT EXISTS, um por FK)
+   - UNIQUE já usada por outra linha da tabela final
+3. mesclar_staging: INSERT ... SELECT ... ON CONFLICT das linhas válidas em
+   faixas da PK (ntile), cada faixa em uma sessão do pool e em sua própria
+   transação, várias ao mesmo tempo. Antes, um índice parcial na chave das
+   faixas (só as linhas válidas) evita que cada faixa leia a staging inteira. As faixas não se sobrepõem, então as
+   sessões não disputam as mesmas chaves, e cada uma grava em ordem de PK.
+   Uma faixa recusada pelo banco é refeita por bisseção (SAVEPOINT), e as
+   linhas isoladas ficam marcadas na staging.
+4. rejeitados_da_staging: as linhas marcadas, para a quarentena.
+
+As tabelas pai precisam estar completas antes da validação da filha: a carga
+por níveis de dependência já garante isso (a tabela pai é mesclada antes).
+As staging são tabelas comuns (não TEMP) para que as sessões da mesclagem as
+enxerguem, então só uma carga com --staging por banco de cada vez:
+criar_esquema_staging toma uma trava consultiva (pg_try_advisory_lock) na
+sessão da conexão principal e uma segunda carga termina com StagingEmUso
+em vez de apagar as staging da primeira.
+
+Aqui só há E/S: quem chama (inserir_dados_banco) imprime o log e grava a
+quarentena.
+"""
+import csv
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+from conexao_banco import conexao_do_pool
+from metricas_etl import medir_etapa
+from quarentena import codigo_do_erro
+
+ESQUEMA_STAGING = 'etl_staging'
+# Chave da trava consultiva das cargas com --staging ('etl_stg' em ASCII);
+# as travas consultivas já são por banco, então basta uma chave fixa
+CHAVE_TRAVA_STAGING = 0x65746C5F737467
+
+# Sessões simultâneas na mesclagem de uma tabela (--sessoes-staging)
+SESSOES_STAGING_PADRAO = 4
+# Linhas por faixa da PK: cada faixa é uma transação; uma tabela pequena fica
+# em uma faixa só, e as grandes se dividem em até --sessoes-staging faixas
+LINHAS_POR_FAIXA = 250000
+
+# Faixa de valores dos inteiros do PostgreSQL (na staging eles são NUMERIC)
+LIMITES_INTEIROS = {
+    'smallint': (-32768, 32767),
+    'integer': (-2147483648, 2147483647),
+    'bigint': (-9223372036854775808, 9223372036854775807),
+}
+RE_TAMANHO = re.compile(r'^(character varying|character)\((\d+)\)$')
+# Tipos do information_schema que não podem ser escritos em um cast (::tipo)
+TIPOS_SEM_CONVERSAO = {'USER-DEFINED', 'ARRAY'}
+
+def tipo_na_staging(tipo):
+    """Tipo largo da coluna na staging: o COPY não recusa nenhum valor que a limpeza devolve"""
+    if tipo in LIMITES_INTEIROS:
+        return 'numeric'
+    if tipo == 'date':
+        return 'date'
+    return 'text'
+
+def verificacao_de_tipo(coluna, tipo):
+    """(condição SQL de valor inválido, descrição) da coluna, ou None se o tipo não é verificado"""
+    if tipo in LIMITES_INTEIROS:
+        minimo, maximo = LIMITES_INTEIROS[tipo]
+        return (f's."{coluna}" NOT BETWEEN {minimo} AND {maximo} OR s."{coluna}" <> trunc(s."{coluna}")',
+                "fora da faixa")
+    tamanho = RE_TAMANHO.match(tipo)
+    if tamanho:
+        return f'length(s."{coluna}") > {tamanho.group(2)}', f"com mais de {tamanho.group(2)} caracteres"
+    return None
+
+def expressao_final(coluna, tipo):
+    """Valor da coluna da staging convertido para o tipo da tabela final"""
+    if tipo in TIPOS_SEM_CONVERSAO:
+        return f's."{coluna}"'
+    return f's."{coluna}"::{tipo}'
+
+def descrever_erro(erro):
+    """(código de quarentena, restrição, mensagem) de um erro do psycopg2"""
+    diag = getattr(erro, 'diag', None)
+    restricao = getattr(diag, 'constraint_name', None)
+    if not restricao and getattr(diag, 'column_name', None):
+        restricao = f"coluna:{diag.column_name}"
+    mensagem = getattr(diag, 'message_primary', None) or str(erro).strip()
+    detalhe = getattr(diag, 'message_detail', None)
+    if detalhe:
+        mensagem = f"{mensagem} ({detalhe})"
+    return codigo_do_erro(erro), restricao or type(erro).__name__, mensagem
+
+# ============================================
+# STAGING DE UMA TABELA
+# ============================================
+
+class StagingEmUso(Exception):
+    """Outra carga com --staging está usando o esquema etl_staging do banco"""
+
+def criar_esquema_staging(conn):
+    """Reserva o esquema etl_staging para esta carga e o cria, uma vez no início
+
+    A trava consultiva é da sessão de conn: vale até a conexão ser fechada no
+    fim da carga (fechar_pool), atravessando COMMITs e ROLLBACKs. Se outra
+    carga já a tem, levanta StagingEmUso sem tocar no esquema. Fica fora de
+    criar_staging: CREATE SCHEMA IF NOT EXISTS em várias sessões ao mesmo
+    tempo (--workers) pode falhar com chave duplicada.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_try_advisory_lock(%s)", (CHAVE_TRAVA_STAGING,))
+    if not cursor.fetchone()[0]:
+        cursor.close()
+        conn.rollback()
+        raise StagingEmUso(f"outra carga com --staging está em andamento neste banco ({conn.info.dbname}); "
+                           f"espere ela terminar ou carregue sem --staging")
+    cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {ESQUEMA_STAGING}")
+    conn.commit()
+    cursor.close()
+
+def nova_staging(nome_tabela, info_tabela):
+    """Descrição da staging de uma tabela; a tabela é criada no primeiro COPY"""
+    return {
+        'tabela': nome_tabela,
+        'nome': f'{ESQUEMA_STAGING}."{nome_tabela}"',
+        'info': info_tabela,
+        'colunas': None,
+        'linhas': 0,
+    }
+
+def criar_staging(conn, staging, colunas):
+    """(Re)cria etl_staging.<tabela> UNLOGGED com as colunas carregadas e as de controle
+
+    _linha é a linha da planilha (como na quarentena); _codigo, _restricao e
+    _mensagem ficam NULL nas linhas válidas. O esquema já existe (ver
+    criar_esquema_staging).
+    """
+    tipos = {c['nome']: c['tipo'] for c in staging['info']['colunas']}
+    definicoes = ', '.join(f'"{col}" {tipo_na_staging(tipos[col])}' for col in colunas)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {staging['nome']}")
+    cursor.execute(f"""
+        CREATE UNLOGGED TABLE {staging['nome']} (
+            _linha BIGINT, {definicoes}, _codigo TEXT, _restricao TEXT, _mensagem TEXT
+        )
+    """)
+    conn.commit()
+    cursor.close()
+    staging['colunas'] = list(colunas)
+
+def copiar_para_staging(conn, staging, colunas, dados, linhas):
+    """COPY de um bloco (tuplas da limpeza e linhas da planilha) para a staging, com COMMIT
+
+    Retorna as linhas copiadas.
+    """
+    if staging['colunas'] is None:
+        criar_staging(conn, staging, colunas)
+    colunas_str = ', '.join(f'"{col}"' for col in staging['colunas'])
+
+    # Em CSV, campo vazio sem aspas vira NULL (a limpeza nunca devolve '')
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerows((linha, *valores) for linha, valores in zip(linhas, dados))
+    buffer.seek(0)
+
+    cursor = conn.cursor()
+    cursor.copy_expert(f"COPY {staging['nome']} (_linha, {colunas_str}) FROM STDIN WITH (FORMAT csv)", buffer)
+    conn.commit()
+    cursor.close()
+    staging['linhas'] += len(dados)
+    return len(dados)
+
+def marcar_recusadas(cursor, staging, codigo, restricao, mensagem, condicao, parametros=()):
+    """UPDATE de conjunto: marca as linhas ainda válidas que atendem à condição; retorna quantas"""
+    cursor.execute(f"""
+        UPDATE {staging['nome']} s
+        SET _codigo = %s, _restricao = {restricao}, _mensagem = {mensagem}
+        WHERE s._codigo IS NULL AND ({condicao})
+    """, (codigo, *parametros))
+    return cursor.rowcount
+
+def validar_staging(conn, staging):
+    """Marca na staging as linhas que a tabela final recusaria (tipos, FKs e UNIQUEs)
+
+    Retorna {código: linhas marcadas}.
+    """
+    nome_tabela, info = staging['tabela'], staging['info']
+    colunas = staging['colunas']
+    tipos = {c['nome']: c['tipo'] for c in info['colunas']}
+    recusadas = {}
+
+    def somar(codigo, linhas):
+        if linhas:
+            recusadas[codigo] = recusadas.get(codigo, 0) + linhas
+
+    cursor = conn.cursor()
+    # Estatísticas da staging recém-copiada: o planejador escolhe hash anti-join
+    cursor.execute(f"ANALYZE {staging['nome']}")
+
+    # Tipos: uma passada só, com a primeira coluna inválida de cada linha
+    verificacoes = [(col, tipos[col], verificacao) for col in colunas
+                    if (verificacao := verificacao_de_tipo(col, tipos[col])) is not None]
+    if verificacoes:
+        restricao = 'CASE ' + ' '.join(f"WHEN {condicao} THEN 'coluna:{col}'"
+                                       for col, _, (condicao, _) in verificacoes) + ' END'
+        mensagem = 'CASE ' + ' '.join(
+            f"""WHEN {condicao} THEN 'valor ' || left(s."{col}"::text, 50) || ' {descricao} ({tipo})'"""
+            for col, tipo, (condicao, descricao) in verificacoes) + ' END'
+        condicao = ' OR '.join(f"({condicao})" for _, _, (condicao, _) in verificacoes)
+        somar('valor_invalido', marcar_recusadas(cursor, staging, 'valor_invalido', restricao, mensagem, condicao))
+
+    # FKs: anti-join com a tabela pai (NULL não é verificado, como no banco)
+    for fk in info['fks']:
+        if not all(col in colunas for col in fk['colunas']):
+            continue
+        pares = list(zip(fk['colunas'], fk['colunas_ref']))
+        existe = ' AND '.join(f'p."{ref}" = s."{col}"' for col, ref in pares)
+        condicao = ' AND '.join(f's."{col}" IS NOT NULL' for col, _ in pares)
+        condicao += f" AND NOT EXISTS (SELECT 1 FROM {fk['tabela_ref']} p WHERE {existe})"
+        if fk['tabela_ref'] == nome_tabela:
+            # Auto-referência: a linha pai pode estar chegando na mesma carga
+            condicao += f" AND NOT EXISTS (SELECT 1 FROM {staging['nome']} p WHERE {existe} AND p._codigo IS NULL)"
+        valores = ' || \', \' || '.join(f's."{col}"::text' for col, _ in pares)
+        mensagem = f"%s || {valores} || %s"
+        prefixo = f"chave ({', '.join(fk['colunas'])})=("
+        sufixo = f") não existe em {fk['tabela_ref']}.{', '.join(fk['colunas_ref'])} (validação na staging)"
+        somar('fk_inexistente', marcar_recusadas(cursor, staging, 'fk_inexistente', '%s', mensagem, condicao,
+                                                 (fk['nome'], prefixo, sufixo)))
+
+    # UNIQUEs já usadas na tabela final por outra PK (a repetição dentro da
+    # planilha já foi tirada pela deduplicação no cliente)
+    pk = info['pk']
+    if pk in colunas:
+        for unica in info['unicas']:
+            if not all(col in colunas for col in unica['colunas']) or pk in unica['colunas']:
+                continue
+            existe = ' AND '.join(f't."{col}" = s."{col}"' for col in unica['colunas'])
+            condicao = ' AND '.join(f's."{col}" IS NOT NULL' for col in unica['colunas'])
+            condicao += f' AND EXISTS (SELECT 1 FROM {nome_tabela} t WHERE {existe} AND t."{pk}" <> s."{pk}")'
+            valores = ' || \', \' || '.join(f's."{col}"::text' for col in unica['colunas'])
+            mensagem = f"%s || {valores} || %s"
+            prefixo = f"chave ({', '.join(unica['colunas'])})=("
+            sufixo = f") já existe em {nome_tabela} com outra {pk} (validação na staging)"
+            somar('duplicada', marcar_recusadas(cursor, staging, 'duplicada', '%s', mensagem, condicao,
+                                                (unica['nome'], prefixo, sufixo)))
+
+    conn.commit()
+    cursor.close()
+    return recusadas
+
+# ============================================
+# MESCLAGEM EM FAIXAS DA PK
+# ============================================
+
+def chave_das_faixas(staging):
+    """Coluna que divide a staging em faixas: a PK carregada ou, sem ela, a linha da planilha"""
+    pk = staging['info']['pk']
+    return f'"{pk}"' if pk in staging['colunas'] and len(staging['info']['pk_colunas']) == 1 else '_linha'
+
+def indexar_staging(conn, staging):
+    """Índice parcial na chave das faixas, só das linhas válidas
+
+    Criado depois da validação (que não precisa dele) e antes da divisão: o
+    ntile, o INSERT ... SELECT de cada faixa e a bisseção leem só o trecho da
+    faixa, em vez da staging inteira a cada consulta.
+    """
+    chave = chave_das_faixas(staging)
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE INDEX ON {staging['nome']} ({chave}) WHERE _codigo IS NULL")
+    conn.commit()
+    cursor.close()
+
+def dividir_em_faixas(conn, staging, sessoes):
+    """[(início, fim, linhas)] das linhas válidas, em faixas contíguas da chave com tamanhos iguais
+
+    Uma faixa a cada LINHAS_POR_FAIXA linhas válidas, no máximo uma por sessão.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT count(*) FROM {staging['nome']} WHERE _codigo IS NULL")
+    validas = cursor.fetchone()[0]
+    if not validas:
+        cursor.close()
+        return []
+    faixas = min(sessoes, max(1, -(-validas // LINHAS_POR_FAIXA)))
+    if any(fk['tabela_ref'] == staging['tabela'] for fk in staging['info']['fks']):
+        # Auto-referência: pai e filha precisam entrar no mesmo INSERT
+        faixas = 1
+    chave = chave_das_faixas(staging)
+    cursor.execute(f"""
+        SELECT min(chave), max(chave), count(*)
+        FROM (
+            SELECT {chave} AS chave, ntile(%s) OVER (ORDER BY {chave}) AS faixa
+            FROM {staging['nome']} WHERE _codigo IS NULL
+        ) f
+        GROUP BY faixa ORDER BY faixa
+    """, (min(faixas, validas),))
+    resultado = cursor.fetchall()
+    conn.commit()
+    cursor.close()
+    return resultado
+
+def mesclar_faixa(staging, clausula_conflito, inicio, fim):
+    """INSERT ... SELECT de uma faixa em uma sessão do pool, com COMMIT próprio
+
+    Se o banco recusar a faixa, ela é refeita por bisseção sobre as chaves,
+    cada metade em um SAVEPOINT; as linhas isoladas são marcadas na staging
+    na mesma transação. Retorna {'inseridas', 'erro', 'rejeitadas'}.
+    """
+    chave = chave_das_faixas(staging)
+    tipos = {c['nome']: c['tipo'] for c in staging['info']['colunas']}
+    colunas_str = ', '.join(f'"{col}"' for col in staging['colunas'])
+    valores_str = ', '.join(expressao_final(col, tipos[col]) for col in staging['colunas'])
+    comando = f"""
+        INSERT INTO {staging['tabela']} ({colunas_str})
+        SELECT {valores_str} FROM {staging['nome']} s
+        WHERE s._codigo IS NULL AND s.{chave} BETWEEN %s AND %s
+        ORDER BY s.{chave}, s._linha
+        {clausula_conflito}
+    """
+    with medir_etapa(staging['tabela'], 'mesclagem') as medicao, conexao_do_pool() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(comando, (inicio, fim))
+            resultado = {'inseridas': cursor.rowcount, 'erro': None, 'rejeitadas': 0}
+            conn.commit()
+        except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+            conn.rollback()
+            resultado = {'inseridas': 0, 'erro': str(e), 'rejeitadas': 0}
+            cursor.execute(f"""
+                SELECT {chave} FROM {staging['nome']}
+                WHERE _codigo IS NULL AND {chave} BETWEEN %s AND %s ORDER BY {chave}
+            """, (inicio, fim))
+            chaves = [linha[0] for linha in cursor.fetchall()]
+
+            def mesclar_intervalo(primeira, ultima):
+                cursor.execute("SAVEPOINT mesclagem")
+                try:
+                    cursor.execute(comando, (chaves[primeira], chaves[ultima - 1]))
+                    inseridas = cursor.rowcount
+                    cursor.execute("RELEASE SAVEPOINT mesclagem")
+                    return inseridas
+                except (psycopg2.IntegrityError, psycopg2.DataError) as erro:
+                    cursor.execute("ROLLBACK TO SAVEPOINT mesclagem")
+                    cursor.execute("RELEASE SAVEPOINT mesclagem")
+                    if ultima - primeira == 1:
+                        codigo, restricao, mensagem = descrever_erro(erro)
+                        marcar_recusadas(cursor, staging, codigo, '%s', '%s', f"s.{chave} = %s",
+                                         (restricao, mensagem, chaves[primeira]))
+                        resultado['rejeitadas'] += 1
+                        return 0
+                    meio = (primeira + ultima) // 2
+                    return mesclar_intervalo(primeira, meio) + mesclar_intervalo(meio, ultima)
+
+            resultado['inseridas'] = mesclar_intervalo(0, len(chaves))
+            conn.commit()
+        finally:
+            cursor.close()
+        medicao['linhas'] = resultado['inseridas']
+    return resultado
+
+def mesclar_staging(conn, staging, clausula_conflito, sessoes=SESSOES_STAGING_PADRAO):
+    """Mescla as linhas válidas da staging na tabela final, faixas da PK em paralelo
+
+    Retorna {'faixas', 'inseridas', 'rejeitadas', 'erros'}, com erros = a
+    primeira mensagem de cada faixa que precisou de bisseção.
+    """
+    with medir_etapa(staging['tabela'], 'mesclagem', blocos=0):
+        indexar_staging(conn, staging)
+        faixas = dividir_em_faixas(conn, staging, sessoes)
+    total = {'faixas': len(faixas), 'inseridas': 0, 'rejeitadas': 0, 'erros': []}
+    if not faixas:
+        return total
+    with ThreadPoolExecutor(max_workers=min(sessoes, len(faixas))) as executor:
+        futuros = [executor.submit(mesclar_faixa, staging, clausula_conflito, inicio, fim)
+                   for inicio, fim, _ in faixas]
+        for futuro in futuros:
+            resultado = futuro.result()
+            total['inseridas'] += resultado['inseridas']
+            total['rejeitadas'] += resultado['rejeitadas']
+            if resultado['erro'] is not None:
+                total['erros'].append(resultado['erro'])
+    return total
+
+def rejeitados_da_staging(conn, staging):
+    """[(linha, código, restrição, mensagem, valores)] das linhas marcadas, na ordem da planilha"""
+    colunas_str = ', '.join(f'"{col}"' for col in staging['colunas'])
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT _linha, _codigo, _restricao, _mensagem, {colunas_str}
+        FROM {staging['nome']} WHERE _codigo IS NOT NULL ORDER BY _linha
+    """)
+    rejeitados = [(linha[0], linha[1], linha[2], linha[3], list(linha[4:])) for linha in cursor.fetchall()]
+    conn.commit()
+    cursor.close()
+    return rejeitados
+
+def descartar_staging(conn, staging):
+    """Remove a staging da tabela (fim da carga dela)"""
+    if staging['colunas'] is None:
+        return
+    conn.rollback()
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {staging['nome']}")
+    conn.commit()
+    cursor.close()
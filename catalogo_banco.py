@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+CATÁLOGO DO BANCO (METADADOS DAS TABELAS)
+Carrega em uma única consulta colunas, tipos, NOT NULL, PK, UNIQUEs e FKs
+de todas as tabelas da carga, e guarda o resultado em disco
+
+O cache é um arquivo por banco (catalogo_<banco>.json) com uma impressão
+digital do esquema (OIDs e xmin das linhas de pg_class, pg_attribute e
+pg_constraint das tabelas). Qualquer DDL nas tabelas muda a impressão
+digital e o catálogo é consultado de novo e regravado no mesmo arquivo.
+
+Somente tabelas visíveis no search_path são consideradas (pg_table_is_visible),
+então tabelas de mesmo nome em outros esquemas não se misturam.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+DIRETORIO_CACHE = '.cache_etl'
+
+SQL_IMPRESSAO_DIGITAL = """
+    WITH tabelas AS (
+        SELECT c.oid, c.xmin
+        FROM pg_class c
+        WHERE c.relkind IN ('r', 'p')
+        AND pg_table_is_visible(c.oid)
+        AND c.relname = ANY(%s)
+    )
+    SELECT current_database() || ':' || coalesce(md5(string_agg(item, ',' ORDER BY item)), '')
+    FROM (
+        SELECT 'c' || t.oid || ':' || t.xmin::text AS item FROM tabelas t
+        UNION ALL
+        SELECT 'a' || a.attrelid || ':' || a.attnum || ':' || a.xmin::text
+        FROM pg_attribute a JOIN tabelas t ON t.oid = a.attrelid
+        WHERE a.attnum > 0
+        UNION ALL
+        SELECT 'k' || con.oid || ':' || con.xmin::text
+        FROM pg_constraint con JOIN tabelas t ON t.oid = con.conrelid
+    ) itens
+"""
+
+SQL_CATALOGO = """
+    WITH tabelas AS (
+        SELECT c.oid, c.relname, n.nspname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind IN ('r', 'p')
+        AND pg_table_is_visible(c.oid)
+        AND c.relname = ANY(%s)
+    ),
+    colunas AS (
+        SELECT t.relname,
+               json_agg(json_build_object(
+                   'nome', col.column_name,
+                   'tipo', CASE WHEN col.character_maximum_length IS NOT NULL
+                                THEN col.data_type || '(' || col.character_maximum_length || ')'
+                                ELSE col.data_type END,
+                   'not_null', col.is_nullable = 'NO'
+               ) ORDER BY col.ordinal_position) AS colunas
+        FROM tabelas t
+        JOIN information_schema.columns col
+            ON col.table_schema = t.nspname AND col.table_name = t.relname
+        GROUP BY t.relname
+    ),
+    restricoes AS (
+        SELECT t.relname,
+               json_agg(json_build_object(
+                   'nome', con.conname,
+                   'tipo', con.contype,
+                   'colunas', (SELECT json_agg(a.attname ORDER BY k.ordem)
+                               FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ordem)
+                               JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum),
+                   'tabela_ref', ref.relname,
+                   'colunas_ref', (SELECT json_agg(a.attname ORDER BY k.ordem)
+                                   FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ordem)
+                                   JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum),
+                   'deferrable', con.condeferrable
+               ) ORDER BY con.conname) AS restricoes
+        FROM tabelas t
+        JOIN pg_constraint con ON con.conrelid = t.oid
+        LEFT JOIN pg_class ref ON ref.oid = con.confrelid
+        WHERE con.contype IN ('p', 'u', 'f')
+        GROUP BY t.relname
+    )
+    SELECT t.relname, t.nspname, c.colunas, r.restricoes
+    FROM tabelas t
+    LEFT JOIN colunas c ON c.relname = t.relname
+    LEFT JOIN restricoes r ON r.relname = t.relname
+"""
+
+def calcular_impressao_digital(conn, tabelas):
+    """Impressão digital do esquema das tabelas (muda a cada DDL)"""
+    cursor = conn.cursor()
+    cursor.execute(SQL_IMPRESSAO_DIGITAL, (list(tabelas),))
+    impressao = cursor.fetchone()[0]
+    cursor.close()
+    # Incluir a lista de tabelas pedida: outra lista gera outro catálogo
+    chave = impressao + '|' + ','.join(sorted(tabelas))
+    return hashlib.md5(chave.encode('utf-8')).hexdigest()
+
+def consultar_catalogo(conn, tabelas):
+    """Lê o catálogo de todas as tabelas em uma única consulta
+
+    Retorna {tabela: {'esquema', 'colunas', 'pk', 'pk_nome', 'pk_colunas', 'unicas', 'fks'}}
+    com 'colunas' no mesmo formato de obter_colunas_tabela.
+    """
+    cursor = conn.cursor()
+    cursor.execute(SQL_CATALOGO, (list(tabelas),))
+    catalogo = {}
+    for nome, esquema, colunas, restricoes in cursor.fetchall():
+        restricoes = restricoes or []
+        restricao_pk = next((r for r in restricoes if r['tipo'] == 'p'), None)
+        pk = restricao_pk['colunas'] if restricao_pk else []
+        catalogo[nome] = {
+            'esquema': esquema,
+            'colunas': colunas or [],
+            'pk': pk[0] if pk else None,
+            'pk_nome': restricao_pk['nome'] if restricao_pk else None,
+            'pk_colunas': pk,
+            'unicas': [{'nome': r['nome'], 'colunas': r['colunas']}
+                       for r in restricoes if r['tipo'] == 'u'],
+            'fks': [{'nome': r['nome'], 'colunas': r['colunas'],
+                     'tabela_ref': r['tabela_ref'], 'colunas_ref': r['colunas_ref'],
+                     'deferrable': r['deferrable']}
+                    for r in restricoes if r['tipo'] == 'f'],
+        }
+    cursor.close()
+    return catalogo
+
+def carregar_catalogo(conn, tabelas, usar_cache=True, diretorio_cache=DIRETORIO_CACHE):
+    """Devolve o catálogo das tabelas, do cache em disco quando o esquema não mudou
+
+    Retorna (catalogo, veio_do_cache).
+    """
+    impressao = calcular_impressao_digital(conn, tabelas)
+    arquivo_cache = os.path.join(diretorio_cache, f"catalogo_{conn.info.dbname}.json")
+
+    if usar_cache and os.path.exists(arquivo_cache):
+        try:
+            with open(arquivo_cache, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            if cache.get('impressao') == impressao:
+                return cache['catalogo'], True
+        except (OSError, ValueError, KeyError, AttributeError):
+            # Cache corrompido: consultar de novo e regravar
+            pass
+
+    catalogo = consultar_catalogo(conn, tabelas)
+
+    if usar_cache:
+        # Temporário com nome único + os.replace: quem lê ao mesmo tempo (carga em
+        # lote, outra execução) vê o arquivo antigo ou o novo, nunca um pela metade.
+        # Sem cache gravado a carga segue normalmente
+        try:
+            os.makedirs(diretorio_cache, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=diretorio_cache, suffix='.tmp',
+                                             delete=False) as f:
+                json.dump({'impressao': impressao, 'catalogo': catalogo}, f, ensure_ascii=False, indent=2)
+            os.replace(f.name, arquivo_cache)
+        except OSError as e:
+            print(f"⚠️  Não foi possível gravar o cache do catálogo: {e}")
+
+    return catalogo, False
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+CHECKPOINT DA CARGA
+Guarda em um SQLite local, por planilha (hash do conteúdo) e tabela, até
+que linha da aba a carga já foi confirmada no banco, para que --resume
+retome uma carga interrompida sem reenviar o que já foi gravado
+
+O arquivo fica em .cache_etl/checkpoint_<banco>.sqlite. Cada bloco
+confirmado (COMMIT) avança a posição da tabela; a tabela é marcada como
+concluída quando o último bloco é confirmado. Alterar a planilha muda o
+hash, e a carga recomeça do zero.
+"""
+import os
+import sqlite3
+from datetime import datetime
+
+DIRETORIO_CHECKPOINT = '.cache_etl'
+
+SQL_CRIAR_TABELA = """
+    CREATE TABLE IF NOT EXISTS checkpoints (
+        planilha TEXT NOT NULL,
+        tabela TEXT NOT NULL,
+        blocos INTEGER NOT NULL,
+        linhas INTEGER NOT NULL,
+        concluida INTEGER NOT NULL,
+        atualizado_em TEXT NOT NULL,
+        PRIMARY KEY (planilha, tabela)
+    ) WITHOUT ROWID
+"""
+
+def caminho_checkpoint(nome_banco, diretorio=DIRETORIO_CHECKPOINT):
+    """Arquivo SQLite dos checkpoints de um banco"""
+    return os.path.join(diretorio, f"checkpoint_{nome_banco}.sqlite")
+
+def abrir_checkpoint(caminho):
+    """Abre (criando se preciso) o SQLite dos checkpoints"""
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    conexao = sqlite3.connect(caminho, timeout=30)
+    conexao.execute(SQL_CRIAR_TABELA)
+    return conexao
+
+def ler_checkpoints(caminho, hash_planilha):
+    """Devolve {tabela: {'blocos', 'linhas', 'concluida'}} da planilha"""
+    conexao = abrir_checkpoint(caminho)
+    try:
+        cursor = conexao.execute(
+            "SELECT tabela, blocos, linhas, concluida FROM checkpoints WHERE planilha = ?",
+            (hash_planilha,)
+        )
+        return {tabela: {'blocos': blocos, 'linhas': linhas, 'concluida': bool(concluida)}
+                for tabela, blocos, linhas, concluida in cursor.fetchall()}
+    finally:
+        conexao.close()
+
+def gravar_checkpoint(caminho, hash_planilha, tabela, blocos, linhas, concluida=False):
+    """Registra a posição confirmada da tabela (linhas = próxima linha da aba a enviar)"""
+    conexao = abrir_checkpoint(caminho)
+    try:
+        with conexao:
+            conexao.execute(
+                "INSERT OR REPLACE INTO checkpoints (planilha, tabela, blocos, linhas, concluida, atualizado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (hash_planilha, tabela, blocos, linhas, int(concluida), datetime.now().isoformat(timespec='seconds'))
+            )
+    finally:
+        conexao.close()
+
+def apagar_checkpoints(caminho, hash_planilha):
+    """Remove os checkpoints da planilha (a próxima carga começa do zero)"""
+    conexao = abrir_checkpoint(caminho)
+    try:
+        with conexao:
+            conexao.execute("DELETE FROM checkpoints WHERE planilha = ?", (hash_planilha,))
+    finally:
+        conexao.close()
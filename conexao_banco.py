@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+CONEXÃO COM O BANCO POSTGRESQL
+Acesso ao banco compartilhado por todos os scripts (carga, carga em lote,
+verificação e benchmarks)
+
+- CONFIG_BANCO lido uma única vez de config_banco.py
+- Pool de conexões do processo (obter_pool / conexao_do_pool): a conexão
+  principal, os workers da carga paralela e a verificação reaproveitam as
+  mesmas conexões já abertas, com os comandos preparados de cada uma
+- Comandos preparados (PREPARE/EXECUTE) para os INSERTs que se repetem com
+  o mesmo formato (mesma tabela, colunas e número de linhas por página)
+- statement_timeout no servidor e, como opção para cargas grandes,
+  synchronous_commit=off (o COMMIT não espera o WAL ir para o disco: em uma
+  queda do servidor as últimas transações confirmadas podem se perder,
+  mas o banco continua consistente)
+- Modo PgBouncer (pool_mode = transaction): nenhum parâmetro de
+  inicialização nem comando preparado, que não sobrevivem à troca de
+  conexão do servidor; as configurações vão em SET LOCAL no início de cada
+  transação
+
+Chaves opcionais em CONFIG_BANCO (as opções de linha de comando têm
+precedência): 'statement_timeout' (ms), 'commit_assincrono', 'pgbouncer'
+e 'comandos_preparados'.
+"""
+import collections
+import contextlib
+import importlib.machinery
+import importlib.util
+import multiprocessing
+import os
+import threading
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+from metricas_etl import ConexaoMedida, CursorMedido
+
+# ============================================
+# CONFIGURAÇÕES DE CONEXÃO
+# ============================================
+# Usados quando config_banco.py não existe ou não carrega
+CONFIG_BANCO_PADRAO = {
+    'host': 'localhost',
+    'port': 5432,
+    'database': 'centros_inovacao',
+    'user': 'postgres',
+    'password': ''  # ⚠️ CONFIGURE SUA SENHA AQUI ou crie config_banco.py
+}
+
+# Motivo de CONFIG_BANCO ter vindo de CONFIG_BANCO_PADRAO (None: veio de config_banco.py)
+ERRO_CONFIG_BANCO = None
+
+try:
+    # Carregar config_banco.py de forma mais segura com encoding explícito
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config_banco.py')
+    if os.path.exists(config_path):
+        # Carregar com encoding UTF-8 explícito
+        loader = importlib.machinery.SourceFileLoader("config_banco", config_path)
+        spec = importlib.util.spec_from_loader("config_banco", loader)
+        config_module = importlib.util.module_from_spec(spec)
+        loader.exec_module(config_module)
+        CONFIG_BANCO = config_module.CONFIG_BANCO
+    else:
+        raise ImportError("config_banco.py não encontrado")
+except (ImportError, AttributeError):
+    ERRO_CONFIG_BANCO = "config_banco.py não encontrado"
+except Exception as e:
+    ERRO_CONFIG_BANCO = f"Erro ao carregar config_banco.py: {e}"
+
+if ERRO_CONFIG_BANCO is not None:
+    CONFIG_BANCO = dict(CONFIG_BANCO_PADRAO)
+
+# Só no processo principal: os processos de limpeza da carga em lote
+# importam o módulo de novo (spawn/forkserver)
+if multiprocessing.parent_process() is None:
+    if ERRO_CONFIG_BANCO is None:
+        print("✅ Configurações carregadas de config_banco.py")
+    else:
+        print(f"⚠️  {ERRO_CONFIG_BANCO}")
+        print(f"   Usando valores padrão: {CONFIG_BANCO['user']}@{CONFIG_BANCO['host']}:"
+              f"{CONFIG_BANCO['port']}/{CONFIG_BANCO['database']}, sem senha "
+              f"(modelo: config_banco.py.example)")
+
+# Configurações de sessão das conexões abertas por este módulo (ver configurar_sessao)
+CONFIG_SESSAO = {
+    'statement_timeout': CONFIG_BANCO.get('statement_timeout'),
+    'commit_assincrono': bool(CONFIG_BANCO.get('commit_assincrono', False)),
+    'pgbouncer': bool(CONFIG_BANCO.get('pgbouncer', False)),
+    'comandos_preparados': bool(CONFIG_BANCO.get('comandos_preparados', True)),
+}
+
+# Um formato de INSERT é preparado na segunda vez que aparece na conexão
+# (formatos que aparecem uma vez só, como os da bisseção, não compensam)
+USOS_PARA_PREPARAR = 2
+# Comandos preparados por conexão (cada um ocupa memória no servidor)
+LIMITE_COMANDOS_PREPARADOS = 64
+# Limite de parâmetros ($1...$n) de um comando no protocolo do PostgreSQL
+LIMITE_PARAMETROS = 65535
+
+def garantir_string_segura(valor):
+    """Converte valor para string segura para conexão"""
+    if valor is None:
+        return ''
+    if isinstance(valor, (int, float)):
+        return str(valor)
+    if isinstance(valor, bytes):
+        try:
+            return valor.decode('utf-8', errors='replace')
+        except:
+            return valor.decode('latin-1', errors='replace')
+    if isinstance(valor, str):
+        # Tentar garantir que é UTF-8 válido
+        try:
+            # Testar se pode codificar em UTF-8
+            valor.encode('utf-8')
+            return valor
+        except UnicodeEncodeError:
+            # Se não conseguir, usar replace para substituir caracteres problemáticos
+            return valor.encode('utf-8', errors='replace').decode('utf-8', errors='replace')
+    return str(valor)
+
+def obter_parametros_conexao():
+    """Parâmetros nomeados de conexão a partir de CONFIG_BANCO"""
+    # Converter todos os valores para strings seguras (ASCII quando possível)
+    return {
+        'host': garantir_string_segura(CONFIG_BANCO['host']),
+        'port': int(CONFIG_BANCO['port']),
+        'database': garantir_string_segura(CONFIG_BANCO['database']),
+        'user': garantir_string_segura(CONFIG_BANCO['user']),
+        'password': garantir_string_segura(CONFIG_BANCO['password']),
+        'client_encoding': 'UTF8'
+    }
+
+def adicionar_argumentos_conexao(parser):
+    """Opções de sessão comuns a todos os scripts que usam o banco"""
+    parser.add_argument('--statement-timeout', type=int, metavar='MS',
+                        help="cancela no servidor comandos que passarem de MS milissegundos")
+    parser.add_argument('--commit-assincrono', action='store_true',
+                        help="synchronous_commit=off: COMMIT sem esperar o WAL no disco (cargas grandes)")
+    parser.add_argument('--pgbouncer', action='store_true',
+                        help="conexão via PgBouncer em pool_mode=transaction (SET LOCAL, sem PREPARE)")
+    parser.add_argument('--sem-comandos-preparados', action='store_true',
+                        help="não usar PREPARE/EXECUTE nos INSERTs repetidos")
+
+def configurar_sessao(opcoes=None, **configuracoes):
+    """Atualiza CONFIG_SESSAO a partir das opções de linha de comando
+
+    Vale para as conexões abertas depois da chamada; opções não informadas
+    mantêm o valor de config_banco.py.
+    """
+    if opcoes is not None:
+        if getattr(opcoes, 'statement_timeout', None) is not None:
+            configuracoes['statement_timeout'] = opcoes.statement_timeout
+        if getattr(opcoes, 'commit_assincrono', False):
+            configuracoes['commit_assincrono'] = True
+        if getattr(opcoes, 'pgbouncer', False):
+            configuracoes['pgbouncer'] = True
+        if getattr(opcoes, 'sem_comandos_preparados', False):
+            configuracoes['comandos_preparados'] = False
+    CONFIG_SESSAO.update(configuracoes)
+
+def parametros_de_sessao(parametros_extras=None):
+    """{parâmetro do servidor: valor} conforme CONFIG_SESSAO"""
+    parametros = {}
+    if CONFIG_SESSAO['statement_timeout']:
+        parametros['statement_timeout'] = str(int(CONFIG_SESSAO['statement_timeout']))
+    if CONFIG_SESSAO['commit_assincrono']:
+        parametros['synchronous_commit'] = 'off'
+    parametros.update(parametros_extras or {})
+    return parametros
+
+def descrever_sessao():
+    """Resumo de uma linha das configurações de sessão (para o log)"""
+    partes = [f"{nome}={valor}" for nome, valor in parametros_de_sessao().items()]
+    if CONFIG_SESSAO['pgbouncer']:
+        partes.append("PgBouncer (SET LOCAL)")
+    elif CONFIG_SESSAO['comandos_preparados']:
+        partes.append("comandos preparados")
+    return ', '.join(partes) or "padrão do servidor"
+
+# ============================================
+# CONEXÃO E CURSOR
+# ============================================
+
+class CursorBanco(CursorMedido):
+    """Cursor que, no modo PgBouncer, abre cada transação com SET LOCAL"""
+
+    def aplicar_configuracoes_locais(self):
+        conn = self.connection
+        if (conn.configuracoes_locais and not conn.autocommit
+                and conn.status == psycopg2.extensions.STATUS_READY):
+            # Um único SELECT com todas as configurações (BEGIN vai junto)
+            chamadas = ', '.join(['set_config(%s, %s, true)'] * len(conn.configuracoes_locais))
+            valores = [item for par in conn.configuracoes_locais.items() for item in par]
+            super().execute(f"SELECT {chamadas}", valores)
+
+    def execute(self, query, vars=None):
+        self.aplicar_configuracoes_locais()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        self.aplicar_configuracoes_locais()
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        self.aplicar_configuracoes_locais()
+        return super().copy_expert(sql, file, size)
+
+class ConexaoBanco(ConexaoMedida):
+    """Conexão medida (metricas_etl) com comandos preparados e configurações locais"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = CursorBanco
+        # Só no modo PgBouncer: {parâmetro: valor} aplicado em cada transação
+        self.configuracoes_locais = {}
+        self.preparar_comandos = False
+        # {(query, linhas): nome} e quantas vezes cada formato apareceu
+        self.comandos_preparados = {}
+        self.formatos_vistos = collections.Counter()
+
+def conectar(parametros_extras=None):
+    """Nova conexão com as configurações de CONFIG_SESSAO
+
+    parametros_extras: outros parâmetros do servidor, ex. {'search_path': 'esquema'}
+    """
+    parametros = parametros_de_sessao(parametros_extras)
+    argumentos = dict(obter_parametros_conexao(), connection_factory=ConexaoBanco)
+    if parametros and not CONFIG_SESSAO['pgbouncer']:
+        argumentos['options'] = ' '.join(f"-c {nome}={valor}" for nome, valor in parametros.items())
+    conn = psycopg2.connect(**argumentos)
+    if CONFIG_SESSAO['pgbouncer']:
+        # O PgBouncer recusa 'options' e troca a conexão do servidor a cada transação
+        conn.configuracoes_locais = parametros
+    else:
+        conn.preparar_comandos = CONFIG_SESSAO['comandos_preparados']
+    return conn
+
+# ============================================
+# POOL DE CONEXÕES
+# ============================================
+
+class PoolBanco(ThreadedConnectionPool):
+    """ThreadedConnectionPool que abre as conexões com conectar()
+
+    Nenhuma conexão é aberta na criação: cada uma só é aberta no primeiro
+    getconn que não encontra outra livre, então um pool dimensionado para
+    muitos workers custa só as conexões de fato usadas. As devolvidas são
+    todas guardadas (_putconn) em vez de fechadas ao passar do mínimo: quem
+    pegar a conexão de novo a encontra aberta e aquecida.
+
+    _connect e _putconn substituem os internos do psycopg2 2.9 (_pool,
+    _used, _rused); requirements.txt fixa essa série.
+    """
+
+    def __init__(self, maximo, parametros_extras=None):
+        self.parametros_extras = parametros_extras
+        super().__init__(0, maximo)
+
+    def _connect(self, key=None):
+        conn = conectar(self.parametros_extras)
+        if key is not None:
+            self._used[key] = conn
+            self._rused[id(conn)] = key
+        else:
+            self._pool.append(conn)
+        return conn
+
+    def _putconn(self, conn, key=None, close=False):
+        """Devolve a conexão ao pool e a mantém aberta, seja qual for o minconn
+
+        Como no psycopg2: uma transação aberta ou com erro é desfeita, e a
+        conexão perdida (ou devolvida com close=True) é fechada e descartada.
+        O pool nunca passa do máximo: só voltam conexões que saíram dele.
+        """
+        if self.closed:
+            raise PoolError("connection pool is closed")
+        if key is None:
+            key = self._rused.get(id(conn))
+            if key is None:
+                raise PoolError("trying to put unkeyed connection")
+
+        if not conn.closed:
+            status = conn.info.transaction_status
+            if close or status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                conn.close()
+            else:
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                self._pool.append(conn)
+
+        # Outra thread pode ter fechado o pool (closeall) enquanto a conexão estava fora
+        if not self.closed or key in self._used:
+            del self._used[key]
+            del self._rused[id(conn)]
+
+# Pool único do processo, criado na primeira chamada de obter_pool
+POOL = None
+TRAVA_POOL = threading.Lock()
+
+def obter_pool(maximo=1):
+    """Pool de conexões do processo, com pelo menos 'maximo' conexões
+
+    Se o pool existente for menor e estiver ocioso, é recriado maior; com
+    conexões em uso ele é mantido como está.
+    """
+    global POOL
+    with TRAVA_POOL:
+        if POOL is not None and not POOL.closed and POOL.maxconn < maximo and not POOL._used:
+            POOL.closeall()
+            POOL = None
+        if POOL is None or POOL.closed:
+            POOL = PoolBanco(maximo)
+        return POOL
+
+@contextlib.contextmanager
+def conexao_do_pool(pool=None):
+    """Empresta uma conexão do pool e a devolve no fim do bloco 'with'
+
+    Uma transação deixada aberta é desfeita na devolução (ThreadedConnectionPool).
+    """
+    pool = pool or obter_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+def fechar_pool():
+    """Fecha todas as conexões do pool do processo"""
+    global POOL
+    with TRAVA_POOL:
+        if POOL is not None and not POOL.closed:
+            POOL.closeall()
+        POOL = None
+
+# ============================================
+# INSERT COM COMANDOS PREPARADOS
+# ============================================
+
+def executar_valores(cursor, query, pagina):
+    """Envia uma página de tuplas em um INSERT ... VALUES e retorna cursor.rowcount
+
+    query tem um único %s no lugar da lista de VALUES, como no execute_values.
+    Na conexão com comandos preparados, um formato (query, linhas da página)
+    que se repete é preparado uma vez (PREPARE) e daí em diante enviado só
+    com os valores (EXECUTE): o servidor deixa de analisar e planejar o
+    mesmo INSERT a cada página.
+    """
+    conn = cursor.connection
+    if not pagina or not getattr(conn, 'preparar_comandos', False):
+        execute_values(cursor, query, pagina, template=None, page_size=max(len(pagina), 1))
+        return cursor.rowcount
+
+    colunas = len(pagina[0])
+    chave = (query, len(pagina))
+    nome = conn.comandos_preparados.get(chave)
+    if nome is None:
+        conn.formatos_vistos[chave] += 1
+        if (conn.formatos_vistos[chave] < USOS_PARA_PREPARAR
+                or len(pagina) * colunas > LIMITE_PARAMETROS
+                or len(conn.comandos_preparados) >= LIMITE_COMANDOS_PREPARADOS):
+            execute_values(cursor, query, pagina, template=None, page_size=len(pagina))
+            return cursor.rowcount
+        nome = f"etl_insert_{len(conn.comandos_preparados) + 1}"
+        marcadores = ', '.join(
+            '(' + ', '.join(f"${linha * colunas + coluna + 1}" for coluna in range(colunas)) + ')'
+            for linha in range(len(pagina))
+        )
+        # O comando preparado não é desfeito por ROLLBACK: vale até a conexão fechar
+        cursor.execute(f"PREPARE {nome} AS {query.replace('%s', marcadores, 1)}")
+        conn.comandos_preparados[chave] = nome
+
+    valores = [valor for linha in pagina for valor in linha]
+    cursor.execute(f"EXECUTE {nome} ({', '.join(['%s'] * len(valores))})", valores)
+    return cursor.rowcount
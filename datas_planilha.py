@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+CONVERSÃO DE DATAS
+converter_data (uma célula) e converter_coluna_datas (uma coluna inteira),
+com exatamente o mesmo resultado
+
+Uma coluna de datas costuma ter um formato dominante e poucos valores
+distintos repetidos em muitas linhas. Na coluna inteira:
+  1. os valores distintos já convertidos (em blocos ou planilhas anteriores)
+     vêm do cache em memória
+  2. o formato dominante é inferido de uma amostra dos valores novos, e os
+     que seguem esse formato na forma estrita (dia e mês com 2 dígitos, ano
+     com 4) são convertidos de uma vez com pd.to_datetime(format=...)
+  3. o resto (outros formatos, datas inválidas, fora da faixa do pandas)
+     passa por converter_data, um valor distinto por vez
+
+A forma estrita garante o mesmo resultado de converter_data: strptime aceita
+'%Y' com 1 a 4 dígitos, então '10-11-12' casa com '%Y-%m-%d' antes de chegar
+a '%d-%m-%Y'; com 2 dígitos no dia e 4 no ano nenhum valor casa com um
+formato anterior da lista.
+"""
+import re
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Ordem em que converter_data tenta os formatos
+FORMATOS_DATA = ['%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d', '%d-%m-%Y', '%d.%m.%Y']
+
+PADROES_ESTRITOS = {
+    '%Y-%m-%d': re.compile(r'\d{4}-\d{2}-\d{2}'),
+    '%d/%m/%Y': re.compile(r'\d{2}/\d{2}/\d{4}'),
+    '%Y/%m/%d': re.compile(r'\d{4}/\d{2}/\d{2}'),
+    '%d-%m-%Y': re.compile(r'\d{2}-\d{2}-\d{4}'),
+    '%d.%m.%Y': re.compile(r'\d{2}\.\d{2}\.\d{4}'),
+}
+
+# Valores distintos usados para inferir o formato dominante
+TAMANHO_AMOSTRA_DATAS = 500
+
+# {texto: date ou None} de todas as colunas; zerado ao passar do limite
+CACHE_DATAS = {}
+LIMITE_CACHE_DATAS = 200000
+# Marca de "não está no cache" (None é um valor cacheado: data inválida)
+AUSENTE = object()
+TRAVA_CACHE_DATAS = threading.Lock()
+
+# {(tabela, coluna): linhas com data não reconhecida} da execução
+FALHAS_DATAS = {}
+TRAVA_FALHAS_DATAS = threading.Lock()
+
+def converter_data(valor):
+    """Converte valor para data (DATE)"""
+    if pd.isna(valor) or valor is None or valor == '':
+        return None
+
+    # Se já é datetime
+    if isinstance(valor, (datetime, pd.Timestamp)):
+        return valor.date() if hasattr(valor, 'date') else valor
+
+    # Se é string, tentar parsear
+    if isinstance(valor, str):
+        try:
+            # Tentar vários formatos
+            for fmt in FORMATOS_DATA:
+                try:
+                    return datetime.strptime(valor, fmt).date()
+                except ValueError:
+                    continue
+            # Se falhar, tentar parse automático do pandas ('NaT' vira NaT, não data)
+            data = pd.to_datetime(valor)
+            return None if pd.isna(data) else data.date()
+        except Exception:
+            return None
+
+    return None
+
+def inferir_formato_data(textos):
+    """Formato de FORMATOS_DATA (forma estrita) mais comum na amostra, ou None"""
+    passo = max(1, len(textos) // TAMANHO_AMOSTRA_DATAS)
+    amostra = textos[::passo][:TAMANHO_AMOSTRA_DATAS]
+    contagem = {fmt: sum(1 for texto in amostra if padrao.fullmatch(texto))
+                for fmt, padrao in PADROES_ESTRITOS.items()}
+    formato = max(FORMATOS_DATA, key=lambda fmt: contagem[fmt])
+    return formato if contagem[formato] else None
+
+def converter_textos_data(textos):
+    """Converte textos distintos: formato dominante em lote, o resto por converter_data"""
+    convertidos = np.full(len(textos), None, dtype=object)
+    pendentes = np.ones(len(textos), dtype=bool)
+    formato = inferir_formato_data(textos)
+    if formato is not None:
+        serie = pd.Series(textos, dtype=object)
+        no_formato = serie.str.fullmatch(PADROES_ESTRITOS[formato].pattern).to_numpy(dtype=bool)
+        if no_formato.any():
+            datas = pd.to_datetime(serie[no_formato], format=formato, errors='coerce')
+            # Ano 0 existe para o pandas mas não para datetime.date
+            validas = (datas.notna() & (datas.dt.year >= 1)).to_numpy()
+            posicoes = np.flatnonzero(no_formato)[validas]
+            convertidos[posicoes] = datas[validas].dt.date.to_numpy(dtype=object)
+            pendentes[posicoes] = False
+    # Datas inválidas no formato (ex: 31/02) e demais formatos
+    for posicao in np.flatnonzero(pendentes):
+        convertidos[posicao] = converter_data(textos[posicao])
+    return convertidos
+
+def converter_coluna_datas(valores):
+    """Versão vetorizada de converter_data para uma coluna (Series sem nulos)
+
+    Devolve um array numpy de objetos com datetime.date ou None.
+    """
+    if valores.dtype.kind == 'M':
+        return valores.dt.date.to_numpy(dtype=object)
+
+    codigos, distintos = pd.factorize(valores.to_numpy(dtype=object))
+    convertidos = np.full(len(distintos) + 1, None, dtype=object)
+    novos = []
+    for posicao, valor in enumerate(distintos):
+        if not isinstance(valor, str):
+            # datetime, Timestamp, números: converter_data resolve direto
+            convertidos[posicao] = converter_data(valor)
+            continue
+        # Uma leitura só: outra thread pode zerar o cache entre um 'in' e o [ ]
+        data = CACHE_DATAS.get(valor, AUSENTE)
+        if data is AUSENTE:
+            novos.append(posicao)
+        else:
+            convertidos[posicao] = data
+
+    if novos:
+        textos = distintos[novos]
+        resultado = converter_textos_data(textos)
+        convertidos[novos] = resultado
+        with TRAVA_CACHE_DATAS:
+            if len(CACHE_DATAS) + len(novos) > LIMITE_CACHE_DATAS:
+                CACHE_DATAS.clear()
+            CACHE_DATAS.update(zip(textos.tolist(), resultado.tolist()))
+
+    # codigo -1 (não ocorre: a série não tem nulos) cai no None do fim
+    return convertidos[codigos]
+
+def registrar_falhas_datas(tabela, falhas_por_coluna):
+    """Soma as linhas com data não reconhecida de um bloco ao total da execução"""
+    with TRAVA_FALHAS_DATAS:
+        for coluna, falhas in falhas_por_coluna.items():
+            FALHAS_DATAS[(tabela, coluna)] = FALHAS_DATAS.get((tabela, coluna), 0) + falhas['linhas']
+
+def zerar_falhas_datas():
+    with TRAVA_FALHAS_DATAS:
+        FALHAS_DATAS.clear()
+
+def resumo_falhas_datas():
+    """[(tabela, coluna, linhas)] com data não reconhecida, na ordem em que apareceram"""
+    with TRAVA_FALHAS_DATAS:
+        return [(tabela, coluna, linhas) for (tabela, coluna), linhas in FALHAS_DATAS.items()]
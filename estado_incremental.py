@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ESTADO DA CARGA INCREMENTAL
+Guarda em um SQLite local o hash do conteúdo de cada linha já carregada,
+por tabela e PK, para que a próxima execução envie só o que mudou
+
+O arquivo fica em .cache_etl/estado_incremental_<banco>.sqlite, um por banco
+de destino: trocar de banco (ou recriá-lo) exige apagar o arquivo, senão as
+linhas já conhecidas não são reenviadas.
+"""
+import os
+import sqlite3
+
+DIRETORIO_ESTADO = '.cache_etl'
+
+SQL_CRIAR_TABELA = """
+    CREATE TABLE IF NOT EXISTS hashes_linhas (
+        tabela TEXT NOT NULL,
+        pk TEXT NOT NULL,
+        hash INTEGER NOT NULL,
+        PRIMARY KEY (tabela, pk)
+    ) WITHOUT ROWID
+"""
+
+def caminho_estado(nome_banco, diretorio=DIRETORIO_ESTADO):
+    """Arquivo SQLite do estado incremental de um banco"""
+    return os.path.join(diretorio, f"estado_incremental_{nome_banco}.sqlite")
+
+def abrir_estado(caminho):
+    """Abre (criando se preciso) o SQLite do estado incremental"""
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    conexao = sqlite3.connect(caminho, timeout=30)
+    conexao.execute(SQL_CRIAR_TABELA)
+    return conexao
+
+def ler_hashes(caminho, tabela):
+    """Devolve {pk: hash} de todas as linhas já carregadas da tabela"""
+    conexao = abrir_estado(caminho)
+    try:
+        cursor = conexao.execute("SELECT pk, hash FROM hashes_linhas WHERE tabela = ?", (tabela,))
+        return dict(cursor.fetchall())
+    finally:
+        conexao.close()
+
+def gravar_hashes(caminho, tabela, pares):
+    """Grava (pk, hash) das linhas carregadas, substituindo os hashes anteriores"""
+    conexao = abrir_estado(caminho)
+    try:
+        with conexao:
+            conexao.executemany(
+                "INSERT OR REPLACE INTO hashes_linhas (tabela, pk, hash) VALUES (?, ?, ?)",
+                ((tabela, pk, valor_hash) for pk, valor_hash in pares)
+            )
+    finally:
+        conexao.close()
@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+GERADOR DE PLANILHAS SINTÉTICAS
+Gera um XLSX com as mesmas abas e cabeçalhos da planilha real (acentos,
+espaço no fim de 'Nome ', '(FK)' etc.), no tamanho que for preciso
+
+- As chaves são consistentes: toda FK aponta para uma PK gerada na aba pai
+  e as chaves naturais (uk_contato_telefone, uk_endereco_centro) não se repetem
+- Uma fração das células vem "suja": números como texto com espaços ou como
+  float, marcadores de NULL ('NULL', 'nan', ''), datas em vários formatos e
+  campos obrigatórios vazios (linhas que a limpeza ignora)
+- Uma fração das linhas é repetida (mesma PK), para exercitar o ON CONFLICT
+- Uma fração pequena tem nome maior que VARCHAR(100): o banco rejeita e a
+  carga cai na bisseção
+
+A geração é determinística: a mesma semente gera a mesma planilha.
+
+Uso:
+    python gerar_planilha_sintetica.py --linhas 100000 --saida sinteticas/planilha_100k.xlsx
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import openpyxl
+
+SEMENTE_PADRAO = 42
+FRACAO_SUJEIRA_PADRAO = 0.05
+FRACAO_DUPLICADAS_PADRAO = 0.02
+FRACAO_INVALIDAS_PADRAO = 0.001
+
+# Linhas de dados por aba aceitas pelo Excel (1.048.576 menos o cabeçalho)
+LIMITE_LINHAS_XLSX = 1048575
+
+# Aba → (tabela, [(cabeçalho na planilha, coluna no banco, tipo, NOT NULL)], PK, FKs)
+# Cabeçalhos e tipos iguais aos de projeto_aplicado_final.xlsx e SCRIPT_SQL_COMPLETO.sql
+LAYOUT_ABAS = {
+    'ATOR': ('ator', [
+        ('Id_Ator', 'id_ator', 'integer', True),
+        ('Nome', 'nome', 'character varying(100)', True),
+        ('Tipo_Ator', 'tipo_ator', 'character varying(50)', False),
+        ('Participa_Programas', 'participa_programa', 'character varying(50)', False),
+        ('Tamanho_Ator', 'tamanho_ator', 'character varying(50)', False),
+        ('CNPJ', 'cnpj', 'character(14)', False),
+        ('Id_Centro (FK)', 'id_centro', 'integer', True),
+    ], 'id_ator', [('id_centro', 'centros_inovacao', 'id_centro')]),
+    'PROGRAMA': ('programa', [
+        ('id_Programa', 'id_programa', 'integer', True),
+        ('Nome', 'nome', 'character varying(100)', True),
+        ('Ano_inicio', 'ano_inicio', 'date', False),
+        ('Descricao', 'descricao', 'text', False),
+        ('Id_AtorFK', 'id_ator', 'integer', True),
+    ], 'id_programa', [('id_ator', 'ator', 'id_ator')]),
+    'ENDERECO': ('endereco', [
+        ('Id_Endereço', 'id_endereco', 'integer', True),
+        ('Nome_Logradouro', 'nome_logradouro', 'character varying(100)', True),
+        ('Numero', 'numero', 'integer', False),
+        ('Id_Tipo_Logradouro(FK)', 'id_tipo_logradouro', 'integer', True),
+        ('Id_Bairro(FK)', 'id_bairro', 'integer', True),
+    ], 'id_endereco', [('id_tipo_logradouro', 'tipo_logradouro', 'id_tipo_de_logradouro'),
+                       ('id_bairro', 'bairro', 'id_bairro')]),
+    'ESTADO': ('estado', [
+        ('Id_Estado', 'id_estado', 'integer', True),
+        ('Nome', 'nome', 'character varying(100)', True),
+        ('Sigla', 'sigla', 'character(2)', True),
+    ], 'id_estado', []),
+    'CIDADE': ('cidade', [
+        ('Id_Cidade', 'id_cidade', 'integer', True),
+        ('Id_Estado (FK)', 'id_estado', 'integer', True),
+        ('Nome', 'nome', 'character varying(100)', True),
+    ], 'id_cidade', [('id_estado', 'estado', 'id_estado')]),
+    'BAIRRO': ('bairro', [
+        ('Id_Bairro (PK)', 'id_bairro', 'integer', True),
+        ('Nome', 'nome', 'character varying(100)', True),
+        ('Id_Cidade (FK)', 'id_cidade', 'integer', True),
+    ], 'id_bairro', [('id_cidade', 'cidade', 'id_cidade')]),
+    'TIPO_LOGRADOURO': ('tipo_logradouro', [
+        ('Id_Tipo_de_Logradouro', 'id_tipo_de_logradouro', 'integer', True),
+        ('Nome', 'nome', 'character varying(100)', True),
+    ], 'id_tipo_de_logradouro', []),
+    'TELEFONE': ('telefone', [
+        ('Id_Telefone', 'id_telefone', 'integer', True),
+        ('Código_Area', 'codigo_area', 'character(2)', False),
+        ('Numero', 'numero', 'character varying(30)', False),
+    ], 'id_telefone', []),
+    'CONTATO': ('contato', [
+        ('Id_Contato', 'id_contato', 'integer', True),
+        ('E-mail', 'email', 'character varying(100)', True),
+        ('Id_Telefone (FK)', 'id_telefone', 'integer', True),
+    ], 'id_contato', [('id_telefone', 'telefone', 'id_telefone')]),
+    'CENTROS_INOVACAO': ('centros_inovacao', [
+        ('Id_Centro', 'id_centro', 'integer', True),
+        ('Nome ', 'nome', 'character varying(100)', True),
+        ('Ano_Fundação', 'ano_fundacao', 'date', False),
+        ('Id_Contato(FK)', 'id_contato', 'integer', True),
+    ], 'id_centro', [('id_contato', 'contato', 'id_contato')]),
+    'ENDERECO_CENTRO': ('endereco_centro', [
+        ('Id_Endereco_Centro', 'id_endereco_centro', 'integer', True),
+        ('Id_Endereço(FK)', 'id_endereco', 'integer', True),
+        ('Id_Centro(FK)', 'id_centro', 'integer', True),
+    ], 'id_endereco_centro', [('id_endereco', 'endereco', 'id_endereco'),
+                              ('id_centro', 'centros_inovacao', 'id_centro')]),
+    'CONTATO_TELEFONE': ('contato_telefone', [
+        ('id_contato_telefone', 'id_contato_telefone', 'integer', True),
+        ('FK_Id_Telefone', 'id_telefone', 'integer', True),
+        ('FK_Id_Contato', 'id_contato', 'integer', True),
+    ], 'id_contato_telefone', [('id_contato', 'contato', 'id_contato'),
+                               ('id_telefone', 'telefone', 'id_telefone')]),
+}
+
+# Fração das linhas de cada tabela (estado e tipo_logradouro têm tamanho fixo)
+PESOS_TABELAS = {
+    'cidade': 0.03,
+    'bairro': 0.05,
+    'endereco': 0.10,
+    'telefone': 0.12,
+    'contato': 0.12,
+    'contato_telefone': 0.12,
+    'centros_inovacao': 0.08,
+    'endereco_centro': 0.08,
+    'ator': 0.20,
+    'programa': 0.10,
+}
+
+ESTADOS = [
+    ('Acre', 'AC'), ('Alagoas', 'AL'), ('Amapá', 'AP'), ('Amazonas', 'AM'), ('Bahia', 'BA'),
+    ('Ceará', 'CE'), ('Distrito Federal', 'DF'), ('Espírito Santo', 'ES'), ('Goiás', 'GO'),
+    ('Maranhão', 'MA'), ('Mato Grosso', 'MT'), ('Mato Grosso do Sul', 'MS'), ('Minas Gerais', 'MG'),
+    ('Pará', 'PA'), ('Paraíba', 'PB'), ('Paraná', 'PR'), ('Pernambuco', 'PE'), ('Piauí', 'PI'),
+    ('Rio de Janeiro', 'RJ'), ('Rio Grande do Norte', 'RN'), ('Rio Grande do Sul', 'RS'),
+    ('Rondônia', 'RO'), ('Roraima', 'RR'), ('Santa Catarina', 'SC'), ('São Paulo', 'SP'),
+    ('Sergipe', 'SE'), ('Tocantins', 'TO'),
+]
+
+TIPOS_LOGRADOURO = ['Rua', 'Avenida', 'Rodovia', 'Travessa', 'Alameda', 'Praça', 'Estrada',
+                    'Servidão', 'Largo', 'Via', 'Viela', 'Beco', 'Ladeira', 'Parque']
+
+PALAVRAS = ['São', 'José', 'Conceição', 'Inovação', 'Tecnologia', 'Itoupava', 'Águas', 'Jardim',
+            'Nova', 'Vila', 'Centro', 'Ação', 'Ponte', 'Lagoa', 'Araújo', 'Estação', 'Coração', 'Pôr']
+
+MARCADORES_NULL = ['NULL', 'nan', '', '   ', 'None']
+
+def distribuir_linhas(total):
+    """Linhas de cada tabela para um total aproximado de linhas na planilha"""
+    restante = max(total - len(ESTADOS) - len(TIPOS_LOGRADOURO), 0)
+    linhas = {'estado': len(ESTADOS), 'tipo_logradouro': len(TIPOS_LOGRADOURO)}
+    for tabela, peso in PESOS_TABELAS.items():
+        linhas[tabela] = max(1, int(restante * peso))
+    # Chaves naturais únicas: uma linha por contato / por centro
+    linhas['contato_telefone'] = min(linhas['contato_telefone'], linhas['contato'])
+    linhas['endereco_centro'] = min(linhas['endereco_centro'], linhas['centros_inovacao'])
+    return linhas
+
+# ============================================
+# VALORES SUJOS
+# ============================================
+
+def escolher(rng, n, fracao):
+    """Posições sorteadas (fração das n linhas)"""
+    quantidade = int(n * fracao)
+    if quantidade == 0:
+        return np.array([], dtype=int)
+    return rng.choice(n, size=quantidade, replace=False)
+
+def sujar_inteiros(valores, rng, fracao):
+    """Parte dos inteiros vira texto com espaços (' 12 ') ou float (12.0)"""
+    resultado = np.array(valores, dtype=object)
+    posicoes = escolher(rng, len(resultado), fracao)
+    metade = len(posicoes) // 2
+    for posicao in posicoes[:metade]:
+        resultado[posicao] = f" {resultado[posicao]} "
+    for posicao in posicoes[metade:]:
+        resultado[posicao] = float(resultado[posicao])
+    return resultado
+
+def sujar_textos(valores, rng, fracao, anulavel=True):
+    """Parte dos textos ganha espaços nas pontas ou vira marcador de NULL"""
+    resultado = np.array(valores, dtype=object)
+    posicoes = escolher(rng, len(resultado), fracao)
+    metade = len(posicoes) // 2 if anulavel else len(posicoes)
+    for posicao in posicoes[:metade]:
+        resultado[posicao] = f"  {resultado[posicao]} "
+    for posicao in posicoes[metade:]:
+        resultado[posicao] = MARCADORES_NULL[posicao % len(MARCADORES_NULL)]
+    return resultado
+
+def anular(valores, rng, fracao):
+    """Parte dos valores de um campo obrigatório fica vazia (linha ignorada na limpeza)"""
+    resultado = np.array(valores, dtype=object)
+    resultado[escolher(rng, len(resultado), fracao)] = None
+    return resultado
+
+def textos(rng, n, prefixo=''):
+    """Nomes com acentos: duas palavras sorteadas e um número"""
+    primeira = rng.choice(PALAVRAS, n)
+    segunda = rng.choice(PALAVRAS, n)
+    numeros = np.arange(1, n + 1).astype(str)
+    return (pd.Series(primeira, dtype=object) + ' ' + segunda + ' ' + prefixo + numeros).to_numpy(dtype=object)
+
+def nomes_longos(valores, rng, fracao):
+    """Parte dos nomes passa de 100 caracteres (o banco rejeita)"""
+    resultado = np.array(valores, dtype=object)
+    for posicao in escolher(rng, len(resultado), fracao):
+        resultado[posicao] = f"{resultado[posicao]} " + 'x' * 120
+    return resultado
+
+def datas(rng, n, fracao):
+    """Datas em vários formatos: ISO, dd/mm/aaaa, 'aaaa-mm-dd 00:00:00', datetime e inválidas"""
+    dias = rng.integers(0, 365 * 35, n)
+    base = pd.Series(pd.Timestamp('1990-01-01') + pd.to_timedelta(dias, unit='D'))
+    resultado = base.dt.strftime('%Y-%m-%d').to_numpy(dtype=object)
+    formatos = rng.integers(0, 4, n)
+    sujas = np.zeros(n, dtype=bool)
+    sujas[escolher(rng, n, fracao)] = True
+    resultado[formatos == 1] = base[formatos == 1].dt.strftime('%Y-%m-%d 00:00:00').to_numpy(dtype=object)
+    resultado[sujas & (formatos == 2)] = base[sujas & (formatos == 2)].dt.strftime('%d/%m/%Y').to_numpy(dtype=object)
+    resultado[sujas & (formatos == 3)] = base[sujas & (formatos == 3)].dt.to_pydatetime()
+    resultado[sujas & (formatos == 0)] = 'janeiro'
+    return resultado
+
+# ============================================
+# GERAÇÃO DAS TABELAS
+# ============================================
+
+def gerar_tabelas(linhas, rng, sujeira, invalidas):
+    """{tabela: DataFrame com os nomes de coluna do banco}"""
+    n = linhas
+    fk = lambda tabela, tamanho, inicio=1: rng.integers(inicio, inicio + n[tabela], tamanho)
+    tabelas = {}
+
+    tabelas['estado'] = pd.DataFrame({
+        'id_estado': np.arange(1, n['estado'] + 1),
+        'nome': [nome for nome, _ in ESTADOS],
+        'sigla': [sigla for _, sigla in ESTADOS],
+    })
+    tabelas['tipo_logradouro'] = pd.DataFrame({
+        'id_tipo_de_logradouro': np.arange(1, n['tipo_logradouro'] + 1),
+        'nome': TIPOS_LOGRADOURO,
+    })
+    tabelas['cidade'] = pd.DataFrame({
+        'id_cidade': np.arange(1, n['cidade'] + 1),
+        'id_estado': sujar_inteiros(fk('estado', n['cidade']), rng, sujeira),
+        'nome': sujar_textos(textos(rng, n['cidade'], 'Cidade '), rng, sujeira, anulavel=False),
+    })
+    tabelas['bairro'] = pd.DataFrame({
+        'id_bairro': np.arange(1, n['bairro'] + 1),
+        'nome': anular(sujar_textos(textos(rng, n['bairro'], 'Bairro '), rng, sujeira, anulavel=False),
+                       rng, sujeira / 5),
+        'id_cidade': sujar_inteiros(fk('cidade', n['bairro']), rng, sujeira),
+    })
+    numeros = sujar_inteiros(rng.integers(1, 5000, n['endereco']), rng, sujeira)
+    numeros[escolher(rng, n['endereco'], sujeira / 2)] = 'S/N'
+    tabelas['endereco'] = pd.DataFrame({
+        'id_endereco': np.arange(1, n['endereco'] + 1),
+        'nome_logradouro': nomes_longos(textos(rng, n['endereco']), rng, invalidas),
+        'numero': numeros,
+        'id_tipo_logradouro': fk('tipo_logradouro', n['endereco']),
+        'id_bairro': sujar_inteiros(fk('bairro', n['endereco']), rng, sujeira),
+    })
+    tabelas['telefone'] = pd.DataFrame({
+        'id_telefone': np.arange(1, n['telefone'] + 1),
+        'codigo_area': sujar_inteiros(rng.integers(11, 100, n['telefone']), rng, sujeira),
+        'numero': sujar_textos([f"{a}-{b:04d}" for a, b in zip(rng.integers(3000, 99999, n['telefone']),
+                                                                rng.integers(0, 10000, n['telefone']))],
+                               rng, sujeira),
+    })
+    ids_contato = np.arange(1, n['contato'] + 1)
+    tabelas['contato'] = pd.DataFrame({
+        'id_contato': ids_contato,
+        'email': anular((pd.Series(ids_contato).astype(str).radd('contato') + '@inovacao.org.br')
+                        .to_numpy(dtype=object), rng, sujeira / 5),
+        'id_telefone': sujar_inteiros(fk('telefone', n['contato']), rng, sujeira),
+    })
+    # Um telefone por contato: (id_contato, id_telefone) nunca se repete
+    tabelas['contato_telefone'] = pd.DataFrame({
+        'id_contato_telefone': np.arange(1, n['contato_telefone'] + 1),
+        'id_telefone': (np.arange(n['contato_telefone']) * 7919) % n['telefone'] + 1,
+        'id_contato': rng.permutation(n['contato'])[:n['contato_telefone']] + 1,
+    })
+    ids_centro = np.arange(2001, 2001 + n['centros_inovacao'])
+    tabelas['centros_inovacao'] = pd.DataFrame({
+        'id_centro': ids_centro,
+        'nome': nomes_longos(sujar_textos(textos(rng, n['centros_inovacao'], 'Centro '), rng, sujeira,
+                                          anulavel=False), rng, invalidas),
+        'ano_fundacao': datas(rng, n['centros_inovacao'], sujeira),
+        'id_contato': fk('contato', n['centros_inovacao']),
+    })
+    # Um endereço por centro: (id_endereco, id_centro) nunca se repete
+    tabelas['endereco_centro'] = pd.DataFrame({
+        'id_endereco_centro': np.arange(1, n['endereco_centro'] + 1),
+        'id_endereco': fk('endereco', n['endereco_centro']),
+        'id_centro': rng.permutation(ids_centro)[:n['endereco_centro']],
+    })
+    cnpjs = rng.integers(10 ** 13, 10 ** 14, n['ator']).astype(str)
+    tabelas['ator'] = pd.DataFrame({
+        'id_ator': np.arange(3001, 3001 + n['ator']),
+        'nome': nomes_longos(anular(textos(rng, n['ator'], 'Ator '), rng, sujeira / 5), rng, invalidas),
+        'tipo_ator': sujar_textos(rng.choice(['residente', 'associado', 'parceiro', 'Startup'], n['ator']),
+                                  rng, sujeira),
+        'participa_programa': rng.choice(['Sim', 'Nao', 'Não'], n['ator']),
+        'tamanho_ator': sujar_textos(rng.choice(['pequena', 'média', 'grande'], n['ator']), rng, sujeira),
+        # Metade no formato da planilha real (com pontuação)
+        'cnpj': [f"{c[:2]}.{c[2:5]}.{c[5:8]}/{c[8:12]}-{c[12:]}" if i % 2 else c
+                 for i, c in enumerate(cnpjs)],
+        'id_centro': sujar_inteiros(fk('centros_inovacao', n['ator'], 2001), rng, sujeira),
+    })
+    tabelas['programa'] = pd.DataFrame({
+        'id_programa': np.arange(4001, 4001 + n['programa']),
+        'nome': textos(rng, n['programa'], 'Programa '),
+        'ano_inicio': datas(rng, n['programa'], sujeira),
+        'descricao': sujar_textos(textos(rng, n['programa'], 'Descrição do programa de inovação '),
+                                  rng, sujeira),
+        'id_ator': fk('ator', n['programa'], 3001),
+    })
+    return tabelas
+
+def duplicar_linhas(df, rng, fracao):
+    """Repete uma fração das linhas (mesma PK) em posições aleatórias"""
+    repetidas = df.iloc[escolher(rng, len(df), fracao)]
+    if repetidas.empty:
+        return df
+    junto = pd.concat([df, repetidas], ignore_index=True)
+    return junto.iloc[rng.permutation(len(junto))].reset_index(drop=True)
+
+def gerar_abas(total_linhas, semente=SEMENTE_PADRAO, sujeira=FRACAO_SUJEIRA_PADRAO,
+               duplicadas=FRACAO_DUPLICADAS_PADRAO, invalidas=FRACAO_INVALIDAS_PADRAO):
+    """Gera {aba: DataFrame} com os cabeçalhos da planilha real e ~total_linhas linhas"""
+    rng = np.random.default_rng(semente)
+    tabelas = gerar_tabelas(distribuir_linhas(total_linhas), rng, sujeira, invalidas)
+    abas = {}
+    for aba, (tabela, colunas, _, _) in LAYOUT_ABAS.items():
+        df = tabelas[tabela][[coluna for _, coluna, _, _ in colunas]]
+        df = df.rename(columns={coluna: cabecalho for cabecalho, coluna, _, _ in colunas})
+        # Tabelas de domínio (estado, tipo_logradouro) não recebem duplicatas
+        if tabela not in ('estado', 'tipo_logradouro'):
+            df = duplicar_linhas(df, rng, duplicadas)
+        abas[aba] = df
+    return abas
+
+def catalogo_sintetico():
+    """Catálogo no formato de catalogo_banco, montado a partir de LAYOUT_ABAS (sem banco)"""
+    catalogo = {}
+    for tabela, colunas, pk, fks in LAYOUT_ABAS.values():
+        catalogo[tabela] = {
+            'esquema': None,
+            'colunas': [{'nome': coluna, 'tipo': tipo, 'not_null': not_null}
+                        for _, coluna, tipo, not_null in colunas],
+            'pk': pk,
+            'pk_colunas': [pk],
+            'unicas': [],
+            'fks': [{'nome': f"fk_{tabela}_{coluna}", 'colunas': [coluna], 'tabela_ref': tabela_ref,
+                     'colunas_ref': [coluna_ref], 'deferrable': True}
+                    for coluna, tabela_ref, coluna_ref in fks],
+        }
+    return catalogo
+
+def cabe_em_xlsx(abas):
+    """Nenhuma aba passa do limite de linhas do Excel"""
+    return all(len(df) <= LIMITE_LINHAS_XLSX for df in abas.values())
+
+def salvar_planilha(abas, caminho):
+    """Grava as abas em XLSX com openpyxl em modo write_only (uma linha por vez)"""
+    if not cabe_em_xlsx(abas):
+        maior = max(abas, key=lambda aba: len(abas[aba]))
+        raise ValueError(f"aba {maior} tem {len(abas[maior]):,} linhas; o XLSX aceita até {LIMITE_LINHAS_XLSX:,}")
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    workbook = openpyxl.Workbook(write_only=True)
+    for aba, df in abas.items():
+        planilha = workbook.create_sheet(aba)
+        planilha.append(list(df.columns))
+        # NaN vira célula vazia
+        valores = df.astype(object).where(df.notna(), None)
+        for linha in valores.itertuples(index=False, name=None):
+            planilha.append(linha)
+    workbook.save(caminho)
+    return caminho
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera uma planilha XLSX sintética no layout da planilha real")
+    parser.add_argument('--linhas', type=int, default=10000, help="total aproximado de linhas (todas as abas)")
+    parser.add_argument('--saida', help="arquivo XLSX (padrão: sinteticas/planilha_<linhas>.xlsx)")
+    parser.add_argument('--semente', type=int, default=SEMENTE_PADRAO)
+    parser.add_argument('--sujeira', type=float, default=FRACAO_SUJEIRA_PADRAO,
+                        help=f"fração de células sujas (padrão: {FRACAO_SUJEIRA_PADRAO})")
+    parser.add_argument('--duplicadas', type=float, default=FRACAO_DUPLICADAS_PADRAO,
+                        help=f"fração de linhas repetidas (padrão: {FRACAO_DUPLICADAS_PADRAO})")
+    parser.add_argument('--invalidas', type=float, default=FRACAO_INVALIDAS_PADRAO,
+                        help=f"fração de nomes longos demais, rejeitados pelo banco (padrão: {FRACAO_INVALIDAS_PADRAO})")
+    args = parser.parse_args()
+
+    saida = args.saida or os.path.join('sinteticas', f"planilha_{args.linhas}.xlsx")
+    abas = gerar_abas(args.linhas, args.semente, args.sujeira, args.duplicadas, args.invalidas)
+    for aba, df in abas.items():
+        print(f"   {aba:20s} {len(df):10,d} linhas")
+    try:
+        salvar_planilha(abas, saida)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ Planilha gerada: {saida} ({sum(len(df) for df in abas.values()):,} linhas)")
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,9 @@ Respeita a ordem de dependências (Foreign Keys)
 """
 
 try:
+    import numpy as np
     import pandas as pd
+    import openpyxl
 except ImportError as e:
     print("❌ Erro: pandas não está instalado!")
     print("   Execute: pip install pandas openpyxl")
@@ -16,7 +18,6 @@ except ImportError as e:
 try:
     import psycopg2
     from psycopg2 import sql
-    from psycopg2.extras import execute_values
 except ImportError as e:
     print("❌ Erro: psycopg2 não está instalado!")
     print("   Execute: pip install psycopg2-binary")
@@ -24,49 +25,96 @@ except ImportError as e:
 
 from pathlib import Path
 from datetime import datetime
+import argparse
+import contextlib
+import csv
+import functools
+import hashlib
+import io
+import itertools
+import json
+import queue
+import re
 import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 import os
 
-# ============================================
-# CONFIGURAÇÕES DE CONEXÃO
-# ============================================
-try:
-    # Carregar config_banco.py de forma mais segura com encoding explícito
-    import importlib.util
-    import importlib.machinery
-    
-    config_path = os.path.join(os.path.dirname(__file__), 'config_banco.py')
-    if os.path.exists(config_path):
-        # Carregar com encoding UTF-8 explícito
-        loader = importlib.machinery.SourceFileLoader("config_banco", config_path)
-        spec = importlib.util.spec_from_loader("config_banco", loader)
-        config_module = importlib.util.module_from_spec(spec)
-        loader.exec_module(config_module)
-        CONFIG_BANCO = config_module.CONFIG_BANCO
-        print("✅ Configurações carregadas de config_banco.py")
-    else:
-        raise ImportError("config_banco.py não encontrado")
-except (ImportError, AttributeError):
-    # Se config_banco.py não existir, usar valores padrão
-    print("⚠️  config_banco.py não encontrado, usando valores padrão")
-    CONFIG_BANCO = {
-        'host': 'localhost',
-        'port': 5432,
-        'database': 'centros_inovacao',
-        'user': 'postgres',
-        'password': ''  # ⚠️ CONFIGURE SUA SENHA AQUI ou crie config_banco.py
-    }
-except Exception as e:
-    print(f"⚠️  Erro ao carregar config_banco.py: {e}")
-    print("   Usando valores padrão...")
-    # Usar valores padrão mesmo com erro
-    CONFIG_BANCO = {
-        'host': 'localhost',
-        'port': 5432,
-        'database': 'centros_inovacao',
-        'user': 'postgres',
-        'password': ''
-    }
+from cache_planilha import (
+    LIMITE_CACHE_MB,
+    cache_disponivel,
+    calcular_hash_arquivo,
+    gravar_abas_no_cache,
+    ler_abas_do_cache,
+)
+from carga_asyncpg import (
+    asyncpg_disponivel,
+    bytes_do_copy_binario,
+    carregar_lote_asyncpg,
+    encerrar_motor_asyncpg,
+    iniciar_motor_asyncpg,
+)
+from carga_staging import (
+    SESSOES_STAGING_PADRAO,
+    StagingEmUso,
+    copiar_para_staging,
+    criar_esquema_staging,
+    descartar_staging,
+    mesclar_staging,
+    nova_staging,
+    rejeitados_da_staging,
+    validar_staging,
+)
+from catalogo_banco import carregar_catalogo
+from conexao_banco import (
+    CONFIG_BANCO,
+    adicionar_argumentos_conexao,
+    conexao_do_pool,
+    configurar_sessao,
+    descrever_sessao,
+    executar_valores,
+    fechar_pool,
+    obter_parametros_conexao,
+    obter_pool,
+)
+from metricas_etl import (
+    ARQUIVO_METRICAS_PADRAO,
+    bytes_do_bloco,
+    contar_ida_ao_banco,
+    gravar_jsonl,
+    gravar_prometheus,
+    imprimir_metricas,
+    medir_etapa,
+    registros_de_metricas,
+    zerar_metricas,
+)
+from perfil_planilha import (
+    MODO_PERFIL_PADRAO,
+    MODOS_PERFIL,
+    TAMANHO_AMOSTRA_PADRAO,
+    imprimir_resumo_perfil,
+    perfilar_planilha,
+    salvar_perfil,
+)
+from datas_planilha import (
+    converter_coluna_datas,
+    converter_data,
+    registrar_falhas_datas,
+    resumo_falhas_datas,
+    zerar_falhas_datas,
+)
+from estado_incremental import caminho_estado, gravar_hashes, ler_hashes
+from checkpoint_carga import apagar_checkpoints, caminho_checkpoint, gravar_checkpoint, ler_checkpoints
+from quarentena import (
+    FORMATO_QUARENTENA_PADRAO,
+    FORMATOS_QUARENTENA,
+    codigo_do_erro,
+    gravar_quarentena,
+    parquet_disponivel,
+)
 
 # ============================================
 # MAPEAMENTO: ABA EXCEL → TABELA BANCO
@@ -103,19 +151,54 @@ ORDEM_INSERCAO = [
     'programa'
 ]
 
+# Modos de carga disponíveis
+#   execute_values → INSERT ... VALUES em páginas (padrão)
+#   copy           → COPY FROM STDIN em tabela temporária + INSERT ... SELECT
+MODOS_CARGA = ['execute_values', 'copy']
+MODO_CARGA_PADRAO = 'execute_values'
+
+# Motor da etapa de carga: psycopg2 (síncrono) ou asyncpg (COPY binário, ver
+# carga_asyncpg); o padrão pode ser fixado por instalação no config_banco.py
+MOTORES = ['psycopg2', 'asyncpg']
+MOTOR_PADRAO = CONFIG_BANCO.get('motor', 'psycopg2')
+
+# Registros por página no modo execute_values
+TAMANHO_PAGINA = 1000
+
+# Quarentena dos registros rejeitados: rejeitados/<execução>/<tabela>.csv (ver quarentena)
+DIRETORIO_REJEITADOS = 'rejeitados'
+ID_EXECUCAO = datetime.now().strftime('%Y%m%d_%H%M%S')
+FORMATO_QUARENTENA = FORMATO_QUARENTENA_PADRAO
+# Planilha registrada na quarentena quando não há origem (carga de uma planilha só)
+PLANILHA_CARGA = None
+
+# Linhas por bloco na leitura em streaming (--streaming)
+TAMANHO_BLOCO_PADRAO = 50000
+
 # ============================================
 # FUNÇÕES AUXILIARES
 # ============================================
 
-def normalizar_nome_coluna(nome):
-    """Normaliza nome de coluna para comparação (remove acentos, espaços, etc)"""
-    import unicodedata
-    import re
-    
-    nome = str(nome).strip()
+# Expressões de normalização compiladas uma única vez
+RE_PARENTESES = re.compile(r'\([^)]*\)')
+RE_SEPARADORES = re.compile(r'[\s\-\.]+')
+RE_PREFIXO_SUFIXO_CHAVE = re.compile(r'^fk_|_fk$|^pk_|_pk$')
+RE_UNDERSCORES = re.compile(r'_+')
+
+# Palavras ignoradas na comparação por palavras principais
+PALAVRAS_COMUNS = {'id', 'fk', 'pk', 'de', 'da', 'do', 'em', 'no', 'na'}
+
+# Mapeamentos já resolvidos, por assinatura do cabeçalho (ver assinatura_cabecalho)
+ARQUIVO_MAPEAMENTOS = os.path.join('.cache_etl', 'mapeamentos_colunas.json')
+VERSAO_MAPEAMENTO = 1
+
+@functools.lru_cache(maxsize=4096)
+def normalizar_texto_coluna(nome):
+    """Normalização de normalizar_nome_coluna, memoizada por texto (LRU entre arquivos)"""
+    nome = nome.strip()
     
     # Remover parênteses e conteúdo dentro (FK), (PK), etc
-    nome = re.sub(r'\([^)]*\)', '', nome)
+    nome = RE_PARENTESES.sub('', nome)
     
     # Converter para minúsculas
     nome = nome.lower()
@@ -125,46 +208,68 @@ def normalizar_nome_coluna(nome):
     nome = ''.join(char for char in nome if unicodedata.category(char) != 'Mn')
     
     # Substituir espaços, hífens, pontos por underscore
-    nome = re.sub(r'[\s\-\.]+', '_', nome)
+    nome = RE_SEPARADORES.sub('_', nome)
     
     # Remover FK, PK se estiver no início ou fim
-    nome = re.sub(r'^fk_|_fk$|^pk_|_pk$', '', nome)
+    nome = RE_PREFIXO_SUFIXO_CHAVE.sub('', nome)
     nome = nome.replace('fk', '').replace('pk', '')
     
     # Remover underscores duplicados
-    nome = re.sub(r'_+', '_', nome)
+    nome = RE_UNDERSCORES.sub('_', nome)
     
     # Remover underscores no início e fim
     nome = nome.strip('_')
     
     return nome
 
-def encontrar_coluna(col_esperada, colunas_planilha):
-    """Encontra coluna na planilha com variações de nome"""
-    col_esperada_norm = normalizar_nome_coluna(col_esperada)
+def normalizar_nome_coluna(nome):
+    """Normaliza nome de coluna para comparação (remove acentos, espaços, etc)"""
+    return normalizar_texto_coluna(str(nome))
+
+@functools.lru_cache(maxsize=4096)
+def palavras_principais(nome_normalizado):
+    """Palavras de um nome normalizado, sem as palavras comuns"""
+    return frozenset(p for p in nome_normalizado.split('_') if p and p not in PALAVRAS_COMUNS)
+
+def criar_indice_colunas(colunas_planilha):
+    """Normaliza cada coluna da planilha uma única vez
     
-    # Primeiro: tentar match exato normalizado (mais confiável)
-    matches_exatos = []
+    Retorna lista de (coluna, normalizada, palavras) na ordem da planilha e
+    um dicionário normalizada → colunas para o match exato.
+    """
+    entradas = []
+    por_nome_normalizado = {}
     for col in colunas_planilha:
         col_norm = normalizar_nome_coluna(col)
-        if col_norm == col_esperada_norm:
-            matches_exatos.append(col)
+        entradas.append((col, col_norm, palavras_principais(col_norm)))
+        por_nome_normalizado.setdefault(col_norm, []).append(col)
+    return entradas, por_nome_normalizado
+
+def encontrar_coluna(col_esperada, colunas_planilha, indice=None):
+    """Encontra coluna na planilha com variações de nome
+    
+    indice: resultado de criar_indice_colunas(colunas_planilha), para não
+    normalizar o cabeçalho de novo a cada coluna procurada
+    """
+    if indice is None:
+        indice = criar_indice_colunas(colunas_planilha)
+    entradas, por_nome_normalizado = indice
+    col_esperada_norm = normalizar_nome_coluna(col_esperada)
+    
+    # Primeiro: tentar match exato normalizado (mais confiável)
+    matches_exatos = por_nome_normalizado.get(col_esperada_norm)
     
     if matches_exatos:
         # Se houver múltiplos matches exatos, preferir o mais curto (mais específico)
         return min(matches_exatos, key=len)
     
     # Segundo: tentar match por palavras principais (ignorar palavras comuns)
-    palavras_comuns = {'id', 'fk', 'pk', 'de', 'da', 'do', 'em', 'no', 'na'}
-    palavras_esperadas = set(p for p in col_esperada_norm.split('_') if p and p not in palavras_comuns)
+    palavras_esperadas = palavras_principais(col_esperada_norm)
     
     melhor_match = None
     melhor_score = 0
     
-    for col in colunas_planilha:
-        col_norm = normalizar_nome_coluna(col)
-        palavras_col = set(p for p in col_norm.split('_') if p and p not in palavras_comuns)
-        
+    for col, col_norm, palavras_col in entradas:
         # Calcular score de similaridade
         palavras_iguais = palavras_esperadas.intersection(palavras_col)
         if palavras_iguais:
@@ -185,8 +290,7 @@ def encontrar_coluna(col_esperada, colunas_planilha):
     
     # Terceiro: tentar match parcial (contém) - mas com cuidado para não pegar colunas muito diferentes
     matches_parciais = []
-    for col in colunas_planilha:
-        col_norm = normalizar_nome_coluna(col)
+    for col, col_norm, _ in entradas:
         # Verificar se uma contém a outra
         if col_esperada_norm in col_norm:
             # Se a coluna da planilha contém a esperada, verificar se não é muito maior
@@ -202,13 +306,86 @@ def encontrar_coluna(col_esperada, colunas_planilha):
     
     return None
 
-def mapear_colunas_planilha_para_banco(df, colunas_banco, mostrar_debug=False):
-    """Mapeia colunas da planilha para colunas do banco"""
+def assinatura_cabecalho(colunas_planilha, colunas_banco):
+    """Identifica um layout de aba: mesmas colunas na planilha e no banco → mesmo mapeamento"""
+    conteudo = json.dumps([VERSAO_MAPEAMENTO, [str(c) for c in colunas_planilha], list(colunas_banco)],
+                          ensure_ascii=False)
+    return hashlib.md5(conteudo.encode('utf-8')).hexdigest()
+
+MAPEAMENTOS_SALVOS = None
+TRAVA_MAPEAMENTOS = threading.Lock()
+# Trava entre processos (carga em lote, execuções simultâneas) do arquivo de
+# mapeamentos: existe enquanto um processo relê, junta e grava o arquivo
+ARQUIVO_TRAVA_MAPEAMENTOS = ARQUIVO_MAPEAMENTOS + '.lock'
+# Segundos até uma trava ser considerada abandonada (processo morto no meio)
+VALIDADE_TRAVA_MAPEAMENTOS = 10
+
+def ler_arquivo_mapeamentos():
+    """{assinatura: mapeamento} gravados em ARQUIVO_MAPEAMENTOS ({} se não houver)"""
+    try:
+        with open(ARQUIVO_MAPEAMENTOS, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+@contextlib.contextmanager
+def trava_arquivo_mapeamentos():
+    """Exclusão entre processos por um arquivo criado com O_EXCL (Windows e Linux)"""
+    while True:
+        try:
+            descritor = os.open(ARQUIVO_TRAVA_MAPEAMENTOS, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            with contextlib.suppress(FileNotFoundError):
+                if time.time() - os.path.getmtime(ARQUIVO_TRAVA_MAPEAMENTOS) > VALIDADE_TRAVA_MAPEAMENTOS:
+                    os.remove(ARQUIVO_TRAVA_MAPEAMENTOS)
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(descritor)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(ARQUIVO_TRAVA_MAPEAMENTOS)
+
+def buscar_mapeamento_salvo(assinatura):
+    """Mapeamento já resolvido para esta assinatura de cabeçalho (ou None)"""
+    global MAPEAMENTOS_SALVOS
+    with TRAVA_MAPEAMENTOS:
+        if MAPEAMENTOS_SALVOS is None:
+            MAPEAMENTOS_SALVOS = ler_arquivo_mapeamentos()
+        mapeamento = MAPEAMENTOS_SALVOS.get(assinatura)
+        return dict(mapeamento) if mapeamento is not None else None
+
+def salvar_mapeamento(assinatura, mapeamento):
+    """Guarda o mapeamento para que abas com o mesmo cabeçalho pulem o matching
+
+    Outros processos gravam o mesmo arquivo: sob a trava entre processos, o
+    que eles salvaram é relido e juntado ao dicionário do processo antes da
+    gravação, então nenhum mapeamento aprendido por um deles se perde.
+    """
+    with TRAVA_MAPEAMENTOS:
+        MAPEAMENTOS_SALVOS[assinatura] = dict(mapeamento)
+        try:
+            diretorio = os.path.dirname(ARQUIVO_MAPEAMENTOS)
+            os.makedirs(diretorio, exist_ok=True)
+            with trava_arquivo_mapeamentos():
+                for outra, salvo in ler_arquivo_mapeamentos().items():
+                    MAPEAMENTOS_SALVOS.setdefault(outra, salvo)
+                with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=diretorio, suffix='.tmp',
+                                                 delete=False) as f:
+                    json.dump(MAPEAMENTOS_SALVOS, f, ensure_ascii=False, indent=2)
+                os.replace(f.name, ARQUIVO_MAPEAMENTOS)
+        except OSError as e:
+            print(f"   ⚠️  Não foi possível salvar o mapeamento de colunas: {e}")
+
+def resolver_mapeamento(colunas_planilha, colunas_banco):
+    """Resolve todas as colunas do banco contra o cabeçalho, normalizando cada coluna uma vez"""
     mapeamento = {}
-    colunas_planilha = list(df.columns)
     
     # Criar dicionário de colunas normalizadas (sem espaços no final) para busca rápida
     colunas_planilha_normalizadas = {col.strip(): col for col in colunas_planilha}
+    conjunto_planilha = set(colunas_planilha)
+    indice = criar_indice_colunas(colunas_planilha)
     
     # Mapeamentos manuais para casos especiais
     mapeamentos_especiais = {
@@ -220,10 +397,6 @@ def mapear_colunas_planilha_para_banco(df, colunas_banco, mostrar_debug=False):
         'nome': ['Nome', 'Nome ', 'nome', 'NOME'],  # Tratar espaço no final
     }
     
-    if mostrar_debug:
-        print(f"   🔍 Colunas na planilha: {', '.join(colunas_planilha[:10])}{'...' if len(colunas_planilha) > 10 else ''}")
-        print(f"   🔍 Colunas esperadas no banco: {', '.join(colunas_banco[:10])}{'...' if len(colunas_banco) > 10 else ''}")
-    
     for col_banco in colunas_banco:
         col_planilha = None
         
@@ -231,7 +404,7 @@ def mapear_colunas_planilha_para_banco(df, colunas_banco, mostrar_debug=False):
         if col_banco in mapeamentos_especiais:
             for variacao in mapeamentos_especiais[col_banco]:
                 # Tentar match exato
-                if variacao in colunas_planilha:
+                if variacao in conjunto_planilha:
                     col_planilha = variacao
                     break
                 # Tentar match sem espaços no final
@@ -241,21 +414,44 @@ def mapear_colunas_planilha_para_banco(df, colunas_banco, mostrar_debug=False):
                     break
         
         # Segundo: tentar encontrar automaticamente (com normalização)
+        # (o match exato normalizado já é a primeira tentativa de encontrar_coluna)
         if not col_planilha:
-            col_planilha = encontrar_coluna(col_banco, colunas_planilha)
-        
-        # Terceiro: tentar match exato normalizado (sem espaços)
-        if not col_planilha:
-            col_banco_norm = normalizar_nome_coluna(col_banco)
-            for col in colunas_planilha:
-                if normalizar_nome_coluna(col) == col_banco_norm:
-                    col_planilha = col
-                    break
+            col_planilha = encontrar_coluna(col_banco, colunas_planilha, indice)
         
         if col_planilha:
             mapeamento[col_banco] = col_planilha
+    
+    return mapeamento
+
+def mapeamento_do_cabecalho(colunas_planilha, colunas_banco):
+    """(mapeamento, veio_do_cache) do cabeçalho, sem imprimir nada"""
+    assinatura = assinatura_cabecalho(colunas_planilha, colunas_banco)
+    mapeamento = buscar_mapeamento_salvo(assinatura)
+    if mapeamento is not None:
+        return mapeamento, True
+    mapeamento = resolver_mapeamento(colunas_planilha, colunas_banco)
+    salvar_mapeamento(assinatura, mapeamento)
+    return mapeamento, False
+
+def mapear_colunas_planilha_para_banco(df, colunas_banco, mostrar_debug=False):
+    """Mapeia colunas da planilha para colunas do banco
+    
+    O resultado fica salvo por assinatura do cabeçalho: arquivos seguintes com
+    o mesmo layout reaproveitam o mapeamento sem refazer o matching.
+    """
+    colunas_planilha = list(df.columns)
+    mapeamento, em_cache = mapeamento_do_cabecalho(colunas_planilha, colunas_banco)
+    
+    if mostrar_debug:
+        print(f"   🔍 Colunas na planilha: {', '.join(colunas_planilha[:10])}{'...' if len(colunas_planilha) > 10 else ''}")
+        print(f"   🔍 Colunas esperadas no banco: {', '.join(colunas_banco[:10])}{'...' if len(colunas_banco) > 10 else ''}")
+        if em_cache:
+            print(f"   ♻️  Mapeamento reaproveitado (mesmo cabeçalho de uma carga anterior)")
+    
+    for col_banco in colunas_banco:
+        if col_banco in mapeamento:
             if mostrar_debug:
-                print(f"   ✅ '{col_banco}' → '{col_planilha}'")
+                print(f"   ✅ '{col_banco}' → '{mapeamento[col_banco]}'")
         else:
             print(f"   ⚠️  Coluna '{col_banco}' não encontrada na planilha")
             if mostrar_debug:
@@ -269,31 +465,6 @@ def mapear_colunas_planilha_para_banco(df, colunas_banco, mostrar_debug=False):
     
     return mapeamento
 
-def converter_data(valor):
-    """Converte valor para data (DATE)"""
-    if pd.isna(valor) or valor is None or valor == '':
-        return None
-    
-    # Se já é datetime
-    if isinstance(valor, (datetime, pd.Timestamp)):
-        return valor.date() if hasattr(valor, 'date') else valor
-    
-    # Se é string, tentar parsear
-    if isinstance(valor, str):
-        try:
-            # Tentar vários formatos
-            for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d', '%d-%m-%Y']:
-                try:
-                    return datetime.strptime(valor, fmt).date()
-                except:
-                    continue
-            # Se falhar, tentar parse automático do pandas
-            return pd.to_datetime(valor).date()
-        except:
-            return None
-    
-    return None
-
 def limpar_valor(valor, tipo='VARCHAR'):
     """Limpa e converte valor conforme tipo do banco"""
     if pd.isna(valor) or valor is None:
@@ -319,6 +490,153 @@ def limpar_valor(valor, tipo='VARCHAR'):
     else:
         return valor_str
 
+def extrair_tamanho_char(tipo):
+    """Extrai n de CHAR(n); None se o tipo não tiver tamanho"""
+    return int(tipo.split('(')[1].split(')')[0]) if '(' in tipo else None
+
+# 'nan', 'none' e 'null' em qualquer combinação de maiúsculas/minúsculas,
+# mais a string vazia (evita um .str.lower() na coluna inteira)
+MARCADORES_NULL = [''] + [
+    ''.join(letras)
+    for palavra in ['nan', 'none', 'null']
+    for letras in itertools.product(*[(c, c.upper()) for c in palavra])
+]
+
+def texto_da_coluna(serie, nulos):
+    """Equivalente vetorizado de str(valor).strip() (células nulas viram '')"""
+    return serie.astype(object).where(~nulos, '').astype(str).str.strip().to_numpy(dtype=object)
+
+def limpar_coluna(serie, tipo='VARCHAR', falhas=None):
+    """Versão vetorizada de limpar_valor: limpa uma coluna inteira de uma vez
+    
+    Devolve um array numpy de objetos com exatamente o mesmo resultado de
+    limpar_valor aplicado célula a célula (None para NULL). O tipo é
+    interpretado uma única vez por coluna, e não a cada célula.
+    falhas: dict preenchido, nas colunas DATE, com 'linhas' (células não
+    vazias que não são data e viram NULL), suas 'posicoes' e até 3 'exemplos'.
+    """
+    n = len(serie) if serie is not None else 0
+    resultado = np.full(n, None, dtype=object)
+    if n == 0:
+        return resultado
+    
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Limpeza uma vez por valor distinto; as linhas recebem o resultado
+        # pelos códigos (código -1 = célula vazia = NULL)
+        falhas_categorias = {} if falhas is not None else None
+        categorias = limpar_coluna(pd.Series(serie.cat.categories), tipo, falhas_categorias)
+        codigos = serie.cat.codes.to_numpy()
+        resultado = np.append(categorias, None)[codigos]
+        if falhas_categorias:
+            linhas_por_categoria = np.bincount(codigos[codigos >= 0], minlength=len(categorias))
+            falhas['linhas'] = int(linhas_por_categoria[falhas_categorias['posicoes']].sum())
+            falhas['exemplos'] = falhas_categorias['exemplos']
+            falhas['posicoes'] = np.flatnonzero(np.isin(codigos, falhas_categorias['posicoes']))
+        return resultado
+    
+    tipo_upper = tipo.upper()
+    nulos = serie.isna().to_numpy()
+    
+    # Colunas numéricas/booleanas nunca geram 'nan'/'null' como texto,
+    # então só as demais precisam do str().strip() para detectar NULL
+    numerica = serie.dtype.kind in 'iufb'
+    texto = None
+    if not numerica:
+        texto = texto_da_coluna(serie, nulos)
+        nulos = nulos | pd.Series(texto).isin(MARCADORES_NULL).to_numpy()
+    validos = ~nulos
+    if not validos.any():
+        return resultado
+    
+    if 'DATE' in tipo_upper:
+        # Formato dominante em lote e cache dos valores distintos (recebe os valores originais)
+        originais = serie[validos]
+        convertidos = converter_coluna_datas(originais)
+        resultado[validos] = convertidos
+        if falhas is not None:
+            nao_reconhecidas = pd.isna(convertidos)
+            falhas['linhas'] = int(nao_reconhecidas.sum())
+            falhas['exemplos'] = list(pd.unique(originais.to_numpy(dtype=object)[nao_reconhecidas])[:3])
+            falhas['posicoes'] = np.flatnonzero(validos)[nao_reconhecidas]
+    
+    elif 'INTEGER' in tipo_upper or 'INT' in tipo_upper:
+        # int(float(valor_str)): primeiro para float64, depois trunca
+        numeros = np.full(n, np.nan)
+        nao_convertidos = np.zeros(n, dtype=bool)
+        if serie.dtype.kind in 'iuf':
+            numeros[validos] = serie.to_numpy(dtype='float64', na_value=np.nan)[validos]
+        elif serie.dtype.kind == 'b':
+            # str(True) = 'True' não é número
+            pass
+        else:
+            try:
+                # float() do Python em C para o array inteiro
+                numeros[validos] = texto[validos].astype('float64')
+            except (ValueError, TypeError):
+                numeros[validos] = pd.to_numeric(pd.Series(texto[validos]), errors='coerce').to_numpy(
+                    dtype='float64', na_value=np.nan)
+                # Valores que o pandas não converteu (ex: '1_000') passam pelo caminho original
+                nao_convertidos = validos & np.isnan(numeros)
+        
+        # Fora da faixa do int64 o int() do Python continua exato
+        fora_da_faixa = np.isfinite(numeros) & (np.abs(numeros) >= 2.0 ** 63)
+        inteiros = validos & np.isfinite(numeros) & ~fora_da_faixa
+        
+        resultado[inteiros] = np.trunc(numeros[inteiros]).astype('int64').astype(object)
+        for posicao in np.flatnonzero(nao_convertidos | fora_da_faixa):
+            resultado[posicao] = limpar_valor(serie.iat[posicao], tipo)
+    
+    else:
+        if texto is None:
+            texto = texto_da_coluna(serie, nulos)
+        if 'CHAR' in tipo_upper and 'VARCHAR' not in tipo_upper:
+            # CHAR fixo - truncar no tamanho da coluna
+            tamanho = extrair_tamanho_char(tipo)
+            if tamanho is not None:
+                texto = pd.Series(texto).str[:tamanho].to_numpy(dtype=object)
+        resultado[validos] = texto[validos]
+    
+    return resultado
+
+def preparar_dados_tabela(df, colunas_para_inserir, mapeamento_colunas, tipos_colunas, colunas_not_null,
+                          falhas_datas=None):
+    """Limpa as colunas mapeadas de uma vez e marca registros com NULL obrigatório
+    
+    Retorna (colunas_limpas, mascara_ignorados):
+      colunas_limpas    → {coluna_banco: array numpy com valores limpos}
+      mascara_ignorados → array booleano, True nas linhas com campo NOT NULL vazio
+    falhas_datas: dict preenchido com {coluna_banco: falhas} das colunas DATE
+    com datas não reconhecidas (ver limpar_coluna)
+    """
+    colunas_limpas = {}
+    for col_banco in colunas_para_inserir:
+        col_planilha = mapeamento_colunas[col_banco]
+        # Garantir que a coluna existe no DataFrame (pode ter espaços)
+        if col_planilha in df.columns:
+            serie = df[col_planilha]
+        elif col_planilha.strip() in df.columns:
+            # Tentar com strip se a coluna tiver espaços
+            col_planilha_stripped = col_planilha.strip()
+            mapeamento_colunas[col_banco] = col_planilha_stripped  # Atualizar mapeamento
+            serie = df[col_planilha_stripped]
+        else:
+            serie = None
+        
+        if serie is None:
+            colunas_limpas[col_banco] = np.full(len(df), None, dtype=object)
+        else:
+            falhas = {}
+            colunas_limpas[col_banco] = limpar_coluna(serie, tipos_colunas[col_banco], falhas)
+            if falhas_datas is not None and falhas.get('linhas'):
+                falhas_datas[col_banco] = falhas
+    
+    mascara_ignorados = np.zeros(len(df), dtype=bool)
+    for col_banco in colunas_not_null:
+        if col_banco in colunas_limpas:
+            mascara_ignorados |= pd.isna(colunas_limpas[col_banco])
+    
+    return colunas_limpas, mascara_ignorados
+
 def obter_colunas_tabela(conn, nome_tabela):
     """Obtém lista de colunas de uma tabela com informações de NOT NULL"""
     try:
@@ -327,8 +645,14 @@ def obter_colunas_tabela(conn, nome_tabela):
             SELECT column_name, data_type, character_maximum_length, is_nullable
             FROM information_schema.columns
             WHERE table_name = %s
+            AND table_schema = (
+                SELECT n.nspname
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE c.oid = %s::regclass
+            )
             ORDER BY ordinal_position
-        """, (nome_tabela,))
+        """, (nome_tabela, nome_tabela))
         
         colunas = []
         for row in cursor.fetchall():
@@ -350,6 +674,7 @@ def obter_colunas_tabela(conn, nome_tabela):
         cursor.close()
         return colunas
     except Exception as e:
+        conn.rollback()
         print(f"   ❌ Erro ao obter colunas: {e}")
         return []
 
@@ -370,17 +695,100 @@ def obter_pk_tabela(conn, nome_tabela):
     except:
         return None
 
-def inserir_dados_tabela(conn, nome_tabela, df, mapeamento_colunas):
-    """Insere dados de um DataFrame na tabela"""
+def montar_clausula_conflito(pk_coluna, colunas_para_inserir, atualizar=False):
+    """Monta a cláusula ON CONFLICT usada em todos os modos de carga
+    
+    atualizar=True (carga incremental) transforma a carga em upsert:
+    a linha existente recebe os valores novos em vez de ser ignorada.
+    """
+    # Se tem PK, usar ON CONFLICT na PK
+    if pk_coluna and pk_coluna in colunas_para_inserir:
+        demais_colunas = [col for col in colunas_para_inserir if col != pk_coluna]
+        if atualizar and demais_colunas:
+            atribuicoes = ', '.join([f'"{col}" = EXCLUDED."{col}"' for col in demais_colunas])
+            return f"ON CONFLICT ({pk_coluna}) DO UPDATE SET {atribuicoes}"
+        return f"ON CONFLICT ({pk_coluna}) DO NOTHING"
+    return "ON CONFLICT DO NOTHING"
+
+def inserir_via_execute_values(cursor, nome_tabela, colunas_para_inserir, dados, pk_coluna=None,
+                               atualizar=False):
+    """Insere tuplas com execute_values, página a página, e retorna o total inserido"""
+    colunas_str = ', '.join([f'"{col}"' for col in colunas_para_inserir])
+    query = f"""
+        INSERT INTO {nome_tabela} ({colunas_str})
+        VALUES %s
+        {montar_clausula_conflito(pk_coluna, colunas_para_inserir, atualizar)}
+    """
+    
+    # cursor.rowcount só reflete a última página do execute_values,
+    # então cada página é enviada separadamente e as contagens são somadas
+    # (páginas de formato repetido vão como comando preparado, ver conexao_banco)
+    linhas_inseridas = 0
+    for inicio in range(0, len(dados), TAMANHO_PAGINA):
+        linhas_inseridas += executar_valores(cursor, query, dados[inicio:inicio + TAMANHO_PAGINA])
+    
+    return linhas_inseridas
+
+def inserir_via_copy(cursor, nome_tabela, colunas_para_inserir, dados, pk_coluna=None, atualizar=False):
+    """Carrega tuplas via COPY em tabela temporária e mescla na tabela final
+    
+    Os dados vão para uma tabela de staging com COPY FROM STDIN (CSV) e depois
+    são mesclados com um único INSERT ... SELECT ... ON CONFLICT. A coluna _ordem
+    preserva a ordem da planilha, então em PKs repetidas vence a primeira linha,
+    como no execute_values.
+    """
+    colunas_str = ', '.join([f'"{col}"' for col in colunas_para_inserir])
+    tabela_staging = f"_staging_{nome_tabela}"
+    
+    # Staging só com as colunas carregadas (sem constraints nem índices)
+    cursor.execute(f"DROP TABLE IF EXISTS {tabela_staging}")
+    cursor.execute(f"""
+        CREATE TEMP TABLE {tabela_staging} ON COMMIT DROP AS
+        SELECT {colunas_str} FROM {nome_tabela} WITH NO DATA
+    """)
+    cursor.execute(f"ALTER TABLE {tabela_staging} ADD COLUMN _ordem BIGSERIAL")
+    
+    # Em CSV, campo vazio sem aspas vira NULL (limpar_valor nunca devolve '')
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerows(dados)
+    buffer.seek(0)
+    
+    cursor.copy_expert(
+        f"COPY {tabela_staging} ({colunas_str}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+    
+    cursor.execute(f"""
+        INSERT INTO {nome_tabela} ({colunas_str})
+        SELECT {colunas_str} FROM {tabela_staging} ORDER BY _ordem
+        {montar_clausula_conflito(pk_coluna, colunas_para_inserir, atualizar)}
+    """)
+    linhas_inseridas = cursor.rowcount
+    
+    cursor.execute(f"DROP TABLE {tabela_staging}")
+    return linhas_inseridas
+
+def preparar_insercao(conn, nome_tabela, df, mapeamento_colunas, info_tabela=None, arquivo_estado=None,
+                      origem=None, aba=None, deduplicar=True):
+    """Limpa e valida um bloco da planilha, sem gravar nada (etapa de limpeza)
+    
+    Retorna o lote pronto para executar_insercao, ou None se não houver
+    registros a enviar. Parâmetros como em inserir_dados_tabela; origem
+    (nome da planilha, na carga em lote) separa os arquivos de quarentena e
+    aba é registrada em cada linha rejeitada. deduplicar=False deixa a
+    deduplicação para quem carrega o lote (deduplicar_lote).
+    """
     try:
-        # Obter colunas do banco
-        colunas_banco = obter_colunas_tabela(conn, nome_tabela)
-        nomes_colunas_banco = [c['nome'] for c in colunas_banco]
+        # Obter colunas do banco e PK para verificar duplicatas
+        if info_tabela is not None:
+            colunas_banco = info_tabela['colunas']
+            pk_coluna = info_tabela['pk']
+        else:
+            colunas_banco = obter_colunas_tabela(conn, nome_tabela)
+            pk_coluna = obter_pk_tabela(conn, nome_tabela)
         tipos_colunas = {c['nome']: c['tipo'] for c in colunas_banco}
         
-        # Obter PK para verificar duplicatas
-        pk_coluna = obter_pk_tabela(conn, nome_tabela)
-        
         # Filtrar apenas colunas que existem no banco e foram mapeadas
         colunas_para_inserir = []
         colunas_not_null = []  # Colunas que são realmente NOT NULL no banco
@@ -395,261 +803,1350 @@ def inserir_dados_tabela(conn, nome_tabela, df, mapeamento_colunas):
         
         if not colunas_para_inserir:
             print(f"   ⚠️  Nenhuma coluna mapeada para inserir")
-            return 0
+            return None
         
         # Verificar se PK está mapeada
         if pk_coluna and pk_coluna not in mapeamento_colunas:
             print(f"   ⚠️  Coluna PK '{pk_coluna}' não encontrada na planilha!")
-            return 0
+            return None
         
-        # Preparar dados
-        dados_para_inserir = []
-        registros_ignorados = 0
+        # Preparar dados (limpeza coluna a coluna)
+        falhas_datas = {}
+        colunas_limpas, mascara_ignorados = preparar_dados_tabela(
+            df, colunas_para_inserir, mapeamento_colunas, tipos_colunas, colunas_not_null, falhas_datas
+        )
+        for coluna, falhas in falhas_datas.items():
+            exemplos = ', '.join(repr(valor) for valor in falhas['exemplos'])
+            print(f"   📅 {coluna}: {falhas['linhas']} datas não reconhecidas (viram NULL), ex: {exemplos}")
+        registrar_falhas_datas(nome_tabela, falhas_datas)
+        registros_ignorados = int(mascara_ignorados.sum())
         
-        for idx, row in df.iterrows():
-            valores = []
-            valores_dict = {}
-            tem_null_obrigatorio = False
-            
-            for col_banco in colunas_para_inserir:
-                col_planilha = mapeamento_colunas[col_banco]
-                # Garantir que a coluna existe no DataFrame (pode ter espaços)
-                if col_planilha in row:
-                    valor = row[col_planilha]
-                elif col_planilha.strip() in df.columns:
-                    # Tentar com strip se a coluna tiver espaços
-                    col_planilha_stripped = col_planilha.strip()
-                    mapeamento_colunas[col_banco] = col_planilha_stripped  # Atualizar mapeamento
-                    valor = row[col_planilha_stripped] if col_planilha_stripped in row else None
-                else:
-                    valor = None
-                tipo = tipos_colunas[col_banco]
-                valor_limpo = limpar_valor(valor, tipo)
-                
-                # Verificar se campo obrigatório está NULL
-                if col_banco in colunas_not_null and valor_limpo is None:
-                    tem_null_obrigatorio = True
-                
-                valores.append(valor_limpo)
-                valores_dict[col_banco] = valor_limpo
-            
-            # Ignorar registros com NULL em campos obrigatórios
-            if tem_null_obrigatorio:
-                registros_ignorados += 1
-                # Mostrar detalhes apenas dos primeiros 3 registros ignorados
-                if registros_ignorados <= 3:
-                    campos_null = [col for col in colunas_not_null 
-                                  if col in valores_dict and valores_dict[col] is None]
-                    if campos_null:
-                        print(f"      ⚠️  Linha {idx+1} ignorada: campos obrigatórios NULL: {', '.join(campos_null[:3])}")
-                continue
-            
-            dados_para_inserir.append(tuple(valores))
+        # Todos os registros ignorados vão para a quarentena; só os 3 primeiros no log
+        ignorados = []
+        for posicao in np.flatnonzero(mascara_ignorados):
+            campos_null = [col for col in colunas_not_null
+                           if col in colunas_limpas and pd.isna(colunas_limpas[col][posicao])]
+            if len(ignorados) < 3:
+                print(f"      ⚠️  Linha {df.index[posicao]+1} ignorada: campos obrigatórios NULL: {', '.join(campos_null[:3])}")
+            ignorados.append({
+                'linha': df.index[posicao] + 1,
+                'codigo': 'nulo_obrigatorio',
+                'restricao': f"coluna:{campos_null[0]}",
+                'mensagem': f"campos obrigatórios NULL: {', '.join(campos_null)}",
+                'valores': [colunas_limpas[col][posicao] for col in colunas_para_inserir],
+            })
+        arquivo_ignorados = None
+        if ignorados:
+            arquivo_ignorados = salvar_relatorio_rejeitados(nome_tabela, colunas_para_inserir, ignorados,
+                                                            origem, aba)
+        
+        # Ignorar registros com NULL em campos obrigatórios
+        validos = ~mascara_ignorados
+        
+        # Barrar linhas órfãs (FK inexistente) antes de enviar ao banco
+        if info_tabela is not None and info_tabela['fks']:
+            validos = barrar_linhas_orfas(nome_tabela, info_tabela, colunas_limpas,
+                                          colunas_para_inserir, validos, df.index, origem, aba)
+        
+        # Linhas com PK ou UNIQUE repetida na planilha: só a primeira segue
+        if info_tabela is not None and deduplicar:
+            validos = deduplicar_linhas(nome_tabela, info_tabela, colunas_limpas, colunas_para_inserir,
+                                        validos, df.index, origem, aba)
+        
+        # Carga incremental: enviar só o que mudou desde a última execução
+        incremental = arquivo_estado is not None and pk_coluna in colunas_para_inserir
+        pares_incrementais = []
+        if incremental:
+            validos, pares_incrementais, novas, alteradas, iguais = filtrar_linhas_incrementais(
+                arquivo_estado, nome_tabela, pk_coluna, colunas_limpas, colunas_para_inserir, validos
+            )
+            print(f"   🔄 Incremental: {novas} novos, {alteradas} alterados, {iguais} sem alteração")
+            if not validos.any():
+                return None
+        
+        dados_para_inserir = list(zip(*[colunas_limpas[col][validos] for col in colunas_para_inserir]))
         
         if registros_ignorados > 0:
             print(f"   ⚠️  {registros_ignorados} registros ignorados (campos obrigatórios NULL)")
+            print(f"   📝 Quarentena: {arquivo_ignorados}")
         
         if not dados_para_inserir:
             print(f"   ⚠️  Nenhum registro válido para inserir")
-            return 0
+            return None
         
-        # Inserir usando execute_values (mais eficiente)
-        cursor = conn.cursor()
+        return {
+            'nome_tabela': nome_tabela,
+            'colunas': colunas_para_inserir,
+            'colunas_limpas': colunas_limpas,
+            'validos': validos,
+            'dados': dados_para_inserir,
+            'indices': df.index[validos],
+            'indice_bloco': df.index,
+            'pk_coluna': pk_coluna,
+            'incremental': incremental,
+            'pares_incrementais': pares_incrementais,
+            'arquivo_estado': arquivo_estado,
+            'origem': origem,
+            'aba': aba,
+        }
         
-        # Construir query INSERT com ON CONFLICT para evitar duplicatas
-        colunas_str = ', '.join([f'"{col}"' for col in colunas_para_inserir])
+    except Exception as e:
+        print(f"   ❌ Erro ao preparar dados: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+def executar_insercao(conn, lote, modo_carga=MODO_CARGA_PADRAO, confirmar=True, motor='psycopg2'):
+    """Envia ao banco um lote de preparar_insercao e retorna as linhas inseridas (etapa de carga)
+    
+    motor='asyncpg' envia o lote pelo motor asyncpg (executar_insercao_asyncpg);
+    conn e modo_carga não são usados nesse caso.
+    """
+    if motor == 'asyncpg':
+        return executar_insercao_asyncpg(lote)
+    nome_tabela = lote['nome_tabela']
+    colunas_para_inserir = lote['colunas']
+    dados_para_inserir = lote['dados']
+    pk_coluna = lote['pk_coluna']
+    incremental = lote['incremental']
+    try:
+        cursor = conn.cursor()
+        if not confirmar:
+            # Carga atômica: um erro neste bloco desfaz só o bloco, não a transação
+            cursor.execute("SAVEPOINT carga_bloco")
         
-        # Se tem PK, usar ON CONFLICT na PK
-        if pk_coluna and pk_coluna in colunas_para_inserir:
-            query = f"""
-                INSERT INTO {nome_tabela} ({colunas_str})
-                VALUES %s
-                ON CONFLICT ({pk_coluna}) DO NOTHING
-            """
+        if modo_carga == 'copy':
+            linhas_inseridas = inserir_via_copy(cursor, nome_tabela, colunas_para_inserir,
+                                                dados_para_inserir, pk_coluna, atualizar=incremental)
         else:
-            query = f"""
-                INSERT INTO {nome_tabela} ({colunas_str})
-                VALUES %s
-                ON CONFLICT DO NOTHING
-            """
-        
-        execute_values(
-            cursor,
-            query,
-            dados_para_inserir,
-            template=None,
-            page_size=1000
-        )
+            linhas_inseridas = inserir_via_execute_values(cursor, nome_tabela, colunas_para_inserir,
+                                                          dados_para_inserir, pk_coluna, atualizar=incremental)
         
-        linhas_inseridas = cursor.rowcount
-        conn.commit()
+        if confirmar:
+            conn.commit()
+        else:
+            cursor.execute("RELEASE SAVEPOINT carga_bloco")
         cursor.close()
+        registrar_chaves_carregadas(nome_tabela, lote['colunas_limpas'], lote['validos'])
+        if incremental:
+            registrar_linhas_incrementais(lote['arquivo_estado'], nome_tabela, lote['pares_incrementais'],
+                                          adiar=not confirmar)
         
         return linhas_inseridas
         
-    except psycopg2.IntegrityError as e:
-        conn.rollback()
-        # Erro de integridade (FK, unique, etc)
+    except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+        if confirmar:
+            conn.rollback()
+        else:
+            desfazer = conn.cursor()
+            desfazer.execute("ROLLBACK TO SAVEPOINT carga_bloco")
+            desfazer.close()
+        # Erro de integridade (FK, unique, etc) ou valor inválido para o tipo
         error_msg = str(e)
         print(f"   ❌ Erro de integridade: {error_msg[:150]}")
-        # Tentar inserir linha por linha para identificar o problema
-        print(f"   🔍 Tentando inserir individualmente para identificar o problema...")
-        return inserir_individualmente(conn, nome_tabela, df, mapeamento_colunas, colunas_banco, pk_coluna)
+        # Dividir o lote até isolar as linhas com problema
+        print(f"   🔍 Isolando os registros com problema (bisseção com SAVEPOINT)...")
+        # Sem gravar o estado incremental: as linhas serão reenviadas na próxima execução
+        with medir_etapa(nome_tabela, 'bisseção') as medicao:
+            linhas_inseridas = inserir_com_bissecao(conn, nome_tabela, colunas_para_inserir, dados_para_inserir,
+                                                    lote['indices'], pk_coluna, atualizar=incremental,
+                                                    confirmar=confirmar, origem=lote['origem'],
+                                                    aba=lote['aba'])
+            medicao['linhas'] = linhas_inseridas
+        # Não se sabe quais chaves ficaram: reconsultar no banco quando necessário
+        descartar_chaves(nome_tabela)
+        return linhas_inseridas
     except Exception as e:
-        conn.rollback()
+        # Na carga atômica quem desfaz a transação é o main
+        if confirmar:
+            conn.rollback()
         print(f"   ❌ Erro ao inserir dados: {e}")
         import traceback
         traceback.print_exc()
         raise
 
-def inserir_individualmente(conn, nome_tabela, df, mapeamento_colunas, colunas_banco, pk_coluna=None):
-    """Insere dados linha por linha para identificar problemas"""
-    tipos_colunas = {c['nome']: c['tipo'] for c in colunas_banco}
-    nomes_colunas_banco = [c['nome'] for c in colunas_banco]
-    colunas_para_inserir = [col for col in nomes_colunas_banco if col in mapeamento_colunas]
+def inserir_dados_tabela(conn, nome_tabela, df, mapeamento_colunas, modo_carga=MODO_CARGA_PADRAO,
+                         info_tabela=None, arquivo_estado=None, confirmar=True):
+    """Insere dados de um DataFrame na tabela (preparar_insercao + executar_insercao)
     
-    linhas_inseridas = 0
-    linhas_erro = 0
-    linhas_duplicadas = 0
+    modo_carga: 'execute_values' (padrão) ou 'copy' (ver MODOS_CARGA)
+    info_tabela: entrada do catálogo (catalogo_banco); sem ela o catálogo é consultado aqui
+    arquivo_estado: SQLite da carga incremental (estado_incremental); com ele só
+                    linhas novas ou alteradas são enviadas, como upsert
+    confirmar: False na carga atômica (--atomico): sem COMMIT, cada bloco fica em um SAVEPOINT
+    """
+    lote = preparar_insercao(conn, nome_tabela, df, mapeamento_colunas, info_tabela, arquivo_estado)
+    if lote is None:
+        return 0
+    return executar_insercao(conn, lote, modo_carga, confirmar)
+
+def descrever_erro_banco(erro):
+    """Extrai (restrição, mensagem) de um erro do psycopg2"""
+    diag = getattr(erro, 'diag', None)
+    restricao = getattr(diag, 'constraint_name', None)
+    if not restricao and getattr(diag, 'column_name', None):
+        restricao = f"coluna:{diag.column_name}"
+    mensagem = getattr(diag, 'message_primary', None) or str(erro).strip()
+    detalhe = getattr(diag, 'message_detail', None)
+    if detalhe:
+        mensagem = f"{mensagem} ({detalhe})"
+    return restricao or type(erro).__name__, mensagem
+
+def salvar_relatorio_rejeitados(nome_tabela, colunas, rejeitados, origem=None, aba=None):
+    """Grava os registros rejeitados na quarentena da execução (ver quarentena)
     
-    colunas_str = ', '.join([f'"{col}"' for col in colunas_para_inserir])
+    Cada linha tem: planilha, aba, linha, código do motivo, restrição
+    violada, mensagem e valores. Com origem (carga em lote) cada planilha
+    tem seu próprio subdiretório.
+    """
+    diretorio = os.path.join(DIRETORIO_REJEITADOS, ID_EXECUCAO, *([origem] if origem else []))
+    return gravar_quarentena(diretorio, nome_tabela, colunas, rejeitados, planilha=origem or PLANILHA_CARGA,
+                             aba=aba, formato=FORMATO_QUARENTENA)
+
+def configurar_quarentena(formato=FORMATO_QUARENTENA_PADRAO, planilha=None, id_execucao=None):
+    """Formato dos arquivos de quarentena e planilha registrada nas linhas rejeitadas
+
+    id_execucao substitui o ID_EXECUCAO do processo: os processos de limpeza
+    da carga em lote recebem o do processo principal, porque no spawn
+    (padrão do Windows) cada um importa o módulo de novo e teria o seu.
+    Retorna o formato efetivo.
+    """
+    global FORMATO_QUARENTENA, PLANILHA_CARGA, ID_EXECUCAO
+    if formato == 'parquet' and not parquet_disponivel():
+        print("ℹ️  pyarrow não instalado: quarentena em CSV")
+        formato = 'csv'
+    FORMATO_QUARENTENA = formato
+    PLANILHA_CARGA = planilha
+    if id_execucao is not None:
+        ID_EXECUCAO = id_execucao
+    return formato
+
+def inserir_com_bissecao(conn, nome_tabela, colunas_para_inserir, dados, indices, pk_coluna=None,
+                         atualizar=False, confirmar=True, origem=None, aba=None):
+    """Insere um lote que falhou dividindo-o ao meio até isolar as linhas com erro
     
-    # Construir ON CONFLICT
-    if pk_coluna and pk_coluna in colunas_para_inserir:
-        conflict_clause = f"ON CONFLICT ({pk_coluna}) DO NOTHING"
+    Cada metade é tentada dentro de um SAVEPOINT: se passa, fica; se falha,
+    volta ao SAVEPOINT e é dividida de novo. Só as linhas ruins chegam ao
+    tamanho 1, então o custo é da ordem de linhas_ruins × log(n) comandos, com
+    um único COMMIT no final. Os rejeitados vão para o relatório CSV.
+    """
+    cursor = conn.cursor()
+    rejeitados = []
+    
+    def inserir_intervalo(inicio, fim):
+        cursor.execute("SAVEPOINT bissecao")
+        try:
+            inseridas = inserir_via_execute_values(cursor, nome_tabela, colunas_para_inserir,
+                                                   dados[inicio:fim], pk_coluna, atualizar)
+            cursor.execute("RELEASE SAVEPOINT bissecao")
+            return inseridas
+        except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT bissecao")
+            cursor.execute("RELEASE SAVEPOINT bissecao")
+            if fim - inicio == 1:
+                restricao, mensagem = descrever_erro_banco(e)
+                rejeitados.append({
+                    'linha': indices[inicio] + 1,
+                    'codigo': codigo_do_erro(e),
+                    'restricao': restricao,
+                    'mensagem': mensagem,
+                    'valores': dados[inicio],
+                })
+                return 0
+            meio = (inicio + fim) // 2
+            return inserir_intervalo(inicio, meio) + inserir_intervalo(meio, fim)
+    
+    try:
+        # O lote inteiro já falhou: começar direto pelas metades
+        total = len(dados)
+        if total > 1:
+            meio = total // 2
+            linhas_inseridas = inserir_intervalo(0, meio) + inserir_intervalo(meio, total)
+        else:
+            linhas_inseridas = inserir_intervalo(0, total)
+        if confirmar:
+            conn.commit()
+        else:
+            cursor.execute("RELEASE SAVEPOINT carga_bloco")
+    except Exception:
+        if confirmar:
+            conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    
+    relatar_bissecao(nome_tabela, colunas_para_inserir, total, linhas_inseridas, rejeitados, origem, aba)
+    return linhas_inseridas
+
+def relatar_bissecao(nome_tabela, colunas_para_inserir, total, linhas_inseridas, rejeitados, origem=None,
+                     aba=None):
+    """Log do resultado da bisseção e gravação dos rejeitados na quarentena"""
+    linhas_duplicadas = total - len(rejeitados) - linhas_inseridas
+    if linhas_duplicadas > 0:
+        print(f"   ℹ️  {linhas_duplicadas} registros já existiam (duplicatas ignoradas)")
+    if rejeitados:
+        for rejeitado in rejeitados[:5]:  # Mostrar apenas os 5 primeiros erros
+            print(f"      ⚠️  Linha {rejeitado['linha']}: [{rejeitado['restricao']}] {rejeitado['mensagem'][:120]}")
+        print(f"   ⚠️  {len(rejeitados)} registros com erro (FKs inválidas ou outros problemas)")
+        arquivo = salvar_relatorio_rejeitados(nome_tabela, colunas_para_inserir, rejeitados, origem, aba)
+        print(f"   📝 Quarentena: {arquivo}")
+
+def executar_insercao_asyncpg(lote):
+    """executar_insercao no motor asyncpg (carga_asyncpg): COPY binário, um COMMIT por lote
+    
+    O motor só faz a E/S; o log, a quarentena e o registro das chaves e do
+    estado incremental ficam aqui, na thread da tabela, como no psycopg2.
+    """
+    nome_tabela = lote['nome_tabela']
+    colunas_para_inserir = lote['colunas']
+    dados_para_inserir = lote['dados']
+    clausula = montar_clausula_conflito(lote['pk_coluna'], colunas_para_inserir, atualizar=lote['incremental'])
+    resultado = carregar_lote_asyncpg(nome_tabela, colunas_para_inserir, dados_para_inserir, clausula)
+    # Os bytes do COPY do lote inteiro entram na primeira ida (os reenvios da bisseção não)
+    contar_ida_ao_banco(bytes_do_copy_binario([lote['colunas_limpas'][col][lote['validos']]
+                                               for col in colunas_para_inserir]))
+    for _ in range(resultado['idas'] - 1):
+        contar_ida_ao_banco()
+    
+    if resultado['erro'] is None:
+        registrar_chaves_carregadas(nome_tabela, lote['colunas_limpas'], lote['validos'])
+        if lote['incremental']:
+            registrar_linhas_incrementais(lote['arquivo_estado'], nome_tabela, lote['pares_incrementais'])
+        return resultado['inseridas']
+    
+    print(f"   ❌ Erro de integridade: {resultado['erro'][:150]}")
+    print(f"   🔍 Isolando os registros com problema (bisseção com SAVEPOINT)...")
+    rejeitados = [{
+        'linha': lote['indices'][posicao] + 1,
+        'codigo': codigo,
+        'restricao': restricao,
+        'mensagem': mensagem,
+        'valores': dados_para_inserir[posicao],
+    } for posicao, codigo, restricao, mensagem in resultado['rejeitados']]
+    relatar_bissecao(nome_tabela, colunas_para_inserir, len(dados_para_inserir), resultado['inseridas'],
+                     rejeitados, lote['origem'], lote['aba'])
+    # Não se sabe quais chaves ficaram: reconsultar no banco quando necessário
+    descartar_chaves(nome_tabela)
+    return resultado['inseridas']
+
+def mesclar_tabela_staging(conn, staging, sessoes=SESSOES_STAGING_PADRAO, aba=None):
+    """Valida no servidor e mescla na tabela final o que foi copiado para a staging (--staging)
+
+    As linhas recusadas na validação (tipos, FKs, UNIQUEs) ou na mesclagem
+    vão para a quarentena, com a linha da planilha. A staging é removida no
+    fim. Retorna as linhas inseridas.
+    """
+    nome_tabela = staging['tabela']
+    if staging['colunas'] is None:
+        # Nenhum bloco chegou à staging
+        return 0
+    try:
+        with medir_etapa(nome_tabela, 'validação') as medicao:
+            inicio = time.perf_counter()
+            recusadas = validar_staging(conn, staging)
+            medicao['linhas'] = staging['linhas']
+        resumo = ', '.join(f"{linhas} {codigo}" for codigo, linhas in recusadas.items()) or "nenhuma recusada"
+        print(f"   🔎 Validação na staging: {staging['linhas']} linhas, {resumo} "
+              f"({time.perf_counter() - inicio:.2f}s)")
+
+        inicio = time.perf_counter()
+        clausula = montar_clausula_conflito(staging['info']['pk'], staging['colunas'])
+        resultado = mesclar_staging(conn, staging, clausula, sessoes)
+        print(f"   🔀 Mesclagem: {resultado['faixas']} faixas da PK em até {sessoes} sessões "
+              f"({time.perf_counter() - inicio:.2f}s)")
+        for erro in resultado['erros'][:3]:
+            print(f"   ❌ Faixa recusada: {erro[:150]}")
+        if resultado['erros']:
+            print(f"   🔍 {len(resultado['erros'])} faixas refeitas por bisseção (SAVEPOINT)")
+
+        rejeitados = [{
+            'linha': linha,
+            'codigo': codigo,
+            'restricao': restricao,
+            'mensagem': mensagem,
+            'valores': valores,
+        } for linha, codigo, restricao, mensagem, valores in rejeitados_da_staging(conn, staging)]
+        relatar_bissecao(nome_tabela, staging['colunas'], staging['linhas'], resultado['inseridas'],
+                         rejeitados, aba=aba)
+        return resultado['inseridas']
+    finally:
+        descartar_staging(conn, staging)
+
+# ============================================
+# PRÉ-VALIDAÇÃO DE FOREIGN KEYS
+# ============================================
+
+# Chaves existentes por (tabela, coluna) referenciada por alguma FK.
+# Semeadas com um único SELECT e atualizadas com o que cada carga insere,
+# para que linhas órfãs sejam barradas antes de chegar ao banco.
+# Só a thread dona da conexão consulta o banco (carregar_chaves_das_fks); a
+# limpeza, que no pipeline roda em outra thread, só lê os conjuntos.
+CHAVES_REFERENCIADAS = {}
+TRAVA_CHAVES = threading.Lock()
+
+def obter_chaves_referenciadas(conn, tabela, coluna):
+    """Conjunto de valores de tabela.coluna (consulta o banco só na primeira vez)"""
+    with TRAVA_CHAVES:
+        if (tabela, coluna) in CHAVES_REFERENCIADAS:
+            return CHAVES_REFERENCIADAS[(tabela, coluna)]
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT DISTINCT "{coluna}" FROM {tabela} WHERE "{coluna}" IS NOT NULL')
+    valores = {linha[0] for linha in cursor.fetchall()}
+    cursor.close()
+    with TRAVA_CHAVES:
+        return CHAVES_REFERENCIADAS.setdefault((tabela, coluna), valores)
+
+def semear_chaves_referenciadas(conn, catalogo):
+    """Carrega de uma vez as chaves referenciadas pelas FKs das tabelas do catálogo"""
+    with TRAVA_CHAVES:
+        CHAVES_REFERENCIADAS.clear()
+    for info in catalogo.values():
+        for fk in info['fks']:
+            if len(fk['colunas_ref']) == 1 and fk['tabela_ref'] in catalogo:
+                obter_chaves_referenciadas(conn, fk['tabela_ref'], fk['colunas_ref'][0])
+    conn.commit()
+
+def carregar_chaves_das_fks(conn, info_tabela):
+    """Consulta no banco os conjuntos das FKs da tabela que não estão em memória
+
+    Chamada na thread dona da conexão antes dos blocos da tabela e depois de
+    cada bloco gravado (uma bisseção descarta os conjuntos da tabela).
+    """
+    if info_tabela is None:
+        return
+    for fk in info_tabela['fks']:
+        if len(fk['colunas_ref']) == 1:
+            obter_chaves_referenciadas(conn, fk['tabela_ref'], fk['colunas_ref'][0])
+
+def registrar_chaves_carregadas(nome_tabela, colunas_limpas, mascara):
+    """Acrescenta aos conjuntos as chaves da tabela que acabaram de ser carregadas"""
+    with TRAVA_CHAVES:
+        for (tabela, coluna), valores in CHAVES_REFERENCIADAS.items():
+            if tabela == nome_tabela and coluna in colunas_limpas:
+                valores.update(v for v in colunas_limpas[coluna][mascara] if v is not None)
+
+def descartar_chaves(nome_tabela):
+    """Esquece as chaves da tabela (serão consultadas de novo no banco quando necessário)"""
+    with TRAVA_CHAVES:
+        for chave in [c for c in CHAVES_REFERENCIADAS if c[0] == nome_tabela]:
+            del CHAVES_REFERENCIADAS[chave]
+
+def validar_fks(info_tabela, colunas_limpas, validos):
+    """Marca as linhas cujas FKs apontam para chaves inexistentes
+
+    Cada coluna de FK é comparada com o conjunto de chaves da tabela pai com
+    um isin vetorizado. NULL não é verificado (o banco também aceita), nem
+    FK cujo conjunto não está em memória (fica para o banco, na carga).
+    Retorna (mascara_orfaos, motivos), com motivos[posição] = (restrição, mensagem).
+    """
+    mascara_orfaos = np.zeros(len(validos), dtype=bool)
+    motivos = {}
+    for fk in info_tabela['fks']:
+        if len(fk['colunas']) != 1 or fk['colunas'][0] not in colunas_limpas:
+            continue
+        coluna, coluna_ref = fk['colunas'][0], fk['colunas_ref'][0]
+        valores = pd.Series(colunas_limpas[coluna], dtype=object)
+        with TRAVA_CHAVES:
+            chaves = CHAVES_REFERENCIADAS.get((fk['tabela_ref'], coluna_ref))
+            if chaves is None:
+                continue
+            existentes = valores.isin(chaves).to_numpy()
+        orfaos = validos & ~mascara_orfaos & valores.notna().to_numpy() & ~existentes
+        for posicao in np.flatnonzero(orfaos):
+            motivos[posicao] = (fk['nome'], f"chave ({coluna})=({valores.iat[posicao]}) não existe em "
+                                            f"{fk['tabela_ref']}.{coluna_ref} (pré-validação)")
+        mascara_orfaos |= orfaos
+    return mascara_orfaos, motivos
+
+def barrar_linhas_orfas(nome_tabela, info_tabela, colunas_limpas, colunas_para_inserir, validos,
+                        indice_bloco, origem=None, aba=None):
+    """Tira de validos as linhas com FK inexistente, colocando-as em quarentena"""
+    mascara_orfaos, motivos = validar_fks(info_tabela, colunas_limpas, validos)
+    if not motivos:
+        return validos
+    rejeitados = [{
+        'linha': indice_bloco[posicao] + 1,
+        'codigo': 'fk_inexistente',
+        'restricao': restricao,
+        'mensagem': mensagem,
+        'valores': [colunas_limpas[col][posicao] for col in colunas_para_inserir],
+    } for posicao, (restricao, mensagem) in sorted(motivos.items())]
+    for rejeitado in rejeitados[:3]:
+        print(f"      ⚠️  Linha {rejeitado['linha']}: [{rejeitado['restricao']}] {rejeitado['mensagem'][:120]}")
+    print(f"   ⚠️  {len(rejeitados)} registros com FK inexistente (não enviados ao banco)")
+    arquivo = salvar_relatorio_rejeitados(nome_tabela, colunas_para_inserir, rejeitados, origem, aba)
+    print(f"   📝 Quarentena: {arquivo}")
+    return validos & ~mascara_orfaos
+
+def validar_fks_do_lote(conn, lote, info_tabela):
+    """Aplica a pré-validação de FKs a um lote preparado sem ela (carga em lote)
+    
+    Retorna o lote só com as linhas válidas, ou None se nenhuma sobrar.
+    """
+    if not info_tabela['fks']:
+        return lote
+    carregar_chaves_das_fks(conn, info_tabela)
+    validos = barrar_linhas_orfas(lote['nome_tabela'], info_tabela, lote['colunas_limpas'],
+                                  lote['colunas'], lote['validos'], lote['indice_bloco'], lote['origem'],
+                                  lote['aba'])
+    return restringir_lote(lote, validos)
+
+def restringir_lote(lote, validos):
+    """Lote só com as linhas de validos, ou None se nenhuma sobrar"""
+    if not validos.any():
+        return None
+    return dict(lote,
+                validos=validos,
+                dados=list(zip(*[lote['colunas_limpas'][col][validos] for col in lote['colunas']])),
+                indices=lote['indice_bloco'][validos])
+
+# ============================================
+# DEDUPLICAÇÃO NA PLANILHA
+# ============================================
+
+# Por tabela: hashes das chaves (PK e UNIQUEs) já vistas na carga, com o hash
+# do conteúdo da linha que ficou, e quantas duplicatas foram descartadas.
+# Cada chave ocupa dois inteiros de 64 bits em vez dos valores da linha.
+ESTADO_DEDUPLICACAO = {}
+TRAVA_DEDUPLICACAO = threading.Lock()
+
+def chaves_deduplicacao(nome_tabela, info_tabela, colunas_para_inserir):
+    """[(restrição, colunas)] da PK e das UNIQUEs com todas as colunas mapeadas"""
+    chaves = []
+    if info_tabela['pk_colunas']:
+        chaves.append((info_tabela.get('pk_nome') or f"{nome_tabela}_pkey", info_tabela['pk_colunas']))
+    chaves += [(unica['nome'], unica['colunas']) for unica in info_tabela['unicas']]
+    return [(restricao, colunas) for restricao, colunas in chaves
+            if all(col in colunas_para_inserir for col in colunas)]
+
+def deduplicar_linhas(nome_tabela, info_tabela, colunas_limpas, colunas_para_inserir, validos,
+                      indice_bloco, origem=None, aba=None, relatar=True):
+    """Tira de validos as linhas cuja PK ou UNIQUE já apareceu antes na planilha
+
+    Vale a primeira linha, como no ON CONFLICT DO NOTHING do banco. Uma
+    repetição com o mesmo conteúdo limpo é só descartada; com conteúdo
+    diferente vai para a quarentena como 'duplicada' (é o conflito que o
+    banco resolveria em silêncio, ou rejeitaria no caso de UNIQUE).
+
+    Chaves e conteúdo são comparados por hash de 64 bits (hash_pandas_object),
+    uma passada por chave: dentro do bloco com factorize e entre blocos com
+    um dict consultado uma vez por chave distinta. Chave com NULL não é
+    comparada (o banco também não compara). Só depois de todas as chaves
+    verificadas as chaves das linhas que restaram são registradas: uma linha
+    descartada por uma UNIQUE não reserva a sua PK.
+
+    relatar=False (semear_deduplicacao) só registra as chaves: sem log,
+    contagens nem quarentena.
+
+    Limitação: a chave é registrada antes de a linha chegar ao banco. Se o
+    banco recusar a linha (bisseção), uma repetição dela mais adiante na
+    planilha continua sendo tratada como duplicada, mesmo sem linha no banco.
+    """
+    chaves = chaves_deduplicacao(nome_tabela, info_tabela, colunas_para_inserir)
+    if not chaves or not validos.any():
+        return validos
+    with TRAVA_DEDUPLICACAO:
+        estado = ESTADO_DEDUPLICACAO.setdefault(nome_tabela, {'chaves': {}, 'exatas': 0, 'conflitos': 0})
+
+    conteudo = np.zeros(len(validos), dtype=np.int64)
+    conteudo[validos] = calcular_hashes_linhas(colunas_limpas, colunas_para_inserir, validos)
+    restantes = validos.copy()
+    exatas = 0
+    motivos = {}
+    candidatas = []
+    for restricao, colunas in chaves:
+        ativos = restantes.copy()
+        for col in colunas:
+            ativos &= pd.notna(colunas_limpas[col])
+        posicoes = np.flatnonzero(ativos)
+        if not len(posicoes):
+            continue
+        codigos, distintos = pd.factorize(calcular_hashes_linhas(colunas_limpas, colunas, ativos))
+        primeiras = np.unique(codigos, return_index=True)[1]
+        conteudo_primeiras = conteudo[posicoes[primeiras]]
+        with TRAVA_DEDUPLICACAO:
+            vistas = estado['chaves'].setdefault(restricao, {})
+            conteudo_mantido = np.array(list(map(vistas.get, distintos.tolist())), dtype=object)
+        novas = pd.isna(conteudo_mantido)
+        conteudo_mantido[novas] = conteudo_primeiras[novas]
+        conteudo_mantido = conteudo_mantido.astype(np.int64)
+        # Fica só a primeira ocorrência de cada chave ainda não vista
+        repetidas = ~(novas[codigos] & (np.arange(len(posicoes)) == primeiras[codigos]))
+        iguais = repetidas & (conteudo[posicoes] == conteudo_mantido[codigos])
+        exatas += int(iguais.sum())
+        for posicao in posicoes[repetidas & ~iguais]:
+            valores = ', '.join(str(colunas_limpas[col][posicao]) for col in colunas)
+            motivos[posicao] = (restricao, f"chave ({', '.join(colunas)})=({valores}) já usada por outra linha "
+                                           f"da carga, com conteúdo diferente (vale a primeira)")
+        restantes[posicoes[repetidas]] = False
+        # Chaves novas, a registrar se a linha passar também pelas chaves seguintes
+        candidatas.append((vistas, distintos[novas], posicoes[primeiras[novas]]))
+
+    with TRAVA_DEDUPLICACAO:
+        for vistas, distintos_novos, posicoes_novas in candidatas:
+            ficam = restantes[posicoes_novas]
+            vistas.update(zip(distintos_novos[ficam].tolist(), conteudo[posicoes_novas[ficam]].tolist()))
+        if relatar:
+            estado['exatas'] += exatas
+            estado['conflitos'] += len(motivos)
+    if not relatar:
+        return restantes
+    if exatas:
+        print(f"   🧬 {exatas} linhas repetidas na planilha (idênticas, não enviadas ao banco)")
+    if motivos:
+        rejeitados = [{
+            'linha': indice_bloco[posicao] + 1,
+            'codigo': 'duplicada',
+            'restricao': restricao,
+            'mensagem': mensagem,
+            'valores': [colunas_limpas[col][posicao] for col in colunas_para_inserir],
+        } for posicao, (restricao, mensagem) in sorted(motivos.items())]
+        for rejeitado in rejeitados[:3]:
+            print(f"      ⚠️  Linha {rejeitado['linha']}: [{rejeitado['restricao']}] {rejeitado['mensagem'][:120]}")
+        print(f"   ⚠️  {len(rejeitados)} registros com chave repetida e conteúdo diferente (não enviados ao banco)")
+        arquivo = salvar_relatorio_rejeitados(nome_tabela, colunas_para_inserir, rejeitados, origem, aba)
+        print(f"   📝 Quarentena: {arquivo}")
+    return restantes
+
+def semear_deduplicacao(nome_tabela, info_tabela, df):
+    """Registra as chaves das linhas de df, confirmadas em uma execução anterior (--resume)
+
+    Refaz em silêncio a limpeza, a pré-validação de FKs e a deduplicação
+    dessas linhas: uma repetição delas na parte retomada da aba é descartada
+    ou vai para a quarentena como na carga sem interrupção. A quarentena e
+    as contagens da parte confirmada ficaram com a execução anterior.
+    """
+    colunas_banco = [c['nome'] for c in info_tabela['colunas']]
+    mapeamento, _ = mapeamento_do_cabecalho(list(df.columns), colunas_banco)
+    colunas = [col for col in colunas_banco if col in mapeamento]
+    if not colunas or (info_tabela['pk'] and info_tabela['pk'] not in mapeamento):
+        return
+    tipos_colunas = {c['nome']: c['tipo'] for c in info_tabela['colunas']}
+    colunas_not_null = [c['nome'] for c in info_tabela['colunas'] if c.get('not_null', False) and c['nome'] in mapeamento]
+    colunas_limpas, mascara_ignorados = preparar_dados_tabela(df, colunas, mapeamento, tipos_colunas,
+                                                              colunas_not_null)
+    validos = ~mascara_ignorados
+    if info_tabela['fks']:
+        validos &= ~validar_fks(info_tabela, colunas_limpas, validos)[0]
+    deduplicar_linhas(nome_tabela, info_tabela, colunas_limpas, colunas, validos, df.index, relatar=False)
+
+def deduplicar_lote(lote, info_tabela):
+    """Aplica a deduplicação a um lote preparado sem ela (carga em lote)
+
+    Retorna o lote só com as linhas válidas, ou None se nenhuma sobrar.
+    """
+    validos = deduplicar_linhas(lote['nome_tabela'], info_tabela, lote['colunas_limpas'], lote['colunas'],
+                                lote['validos'], lote['indice_bloco'], lote['origem'], lote['aba'])
+    return restringir_lote(lote, validos)
+
+def liberar_deduplicacao(nome_tabela):
+    """Esquece as chaves vistas da tabela (fim da carga dela), mantendo as contagens"""
+    with TRAVA_DEDUPLICACAO:
+        if nome_tabela in ESTADO_DEDUPLICACAO:
+            ESTADO_DEDUPLICACAO[nome_tabela]['chaves'].clear()
+
+def zerar_deduplicacao():
+    with TRAVA_DEDUPLICACAO:
+        ESTADO_DEDUPLICACAO.clear()
+
+def resumo_deduplicacao():
+    """[(tabela, idênticas, com conteúdo diferente)] das tabelas com linhas repetidas"""
+    with TRAVA_DEDUPLICACAO:
+        return [(tabela, estado['exatas'], estado['conflitos']) for tabela, estado in ESTADO_DEDUPLICACAO.items()
+                if estado['exatas'] or estado['conflitos']]
+
+# ============================================
+# CARGA INCREMENTAL
+# ============================================
+
+# Estado por tabela durante a execução: hashes da última carga (lidos uma vez
+# do SQLite) e PKs já vistas nesta execução
+ESTADO_INCREMENTAL = {}
+TRAVA_INCREMENTAL = threading.Lock()
+
+def calcular_hashes_linhas(colunas_limpas, colunas, mascara):
+    """Hash (int64) do conteúdo já limpo de cada linha selecionada pela máscara"""
+    quadro = pd.DataFrame({col: colunas_limpas[col][mascara] for col in colunas})
+    return pd.util.hash_pandas_object(quadro, index=False).to_numpy().view(np.int64)
+
+def filtrar_linhas_incrementais(arquivo_estado, nome_tabela, pk_coluna, colunas_limpas, colunas, validos):
+    """Seleciona só as linhas novas ou alteradas desde a última carga
+    
+    Retorna (mascara_enviar, pares, novas, alteradas, iguais), com pares =
+    [(pk, hash)] das linhas enviadas, a gravar no estado depois do COMMIT.
+    """
+    with TRAVA_INCREMENTAL:
+        estado = ESTADO_INCREMENTAL.get(nome_tabela)
+        if estado is None:
+            estado = ESTADO_INCREMENTAL[nome_tabela] = {
+                'anteriores': ler_hashes(arquivo_estado, nome_tabela),
+                'vistas': set(),
+            }
+    
+    posicoes = np.flatnonzero(validos)
+    hashes = calcular_hashes_linhas(colunas_limpas, colunas, validos)
+    mascara_enviar = np.zeros(len(validos), dtype=bool)
+    pares = []
+    novas = alteradas = iguais = 0
+    for posicao, pk, valor_hash in zip(posicoes, colunas_limpas[pk_coluna][posicoes], hashes.tolist()):
+        pk = str(pk)
+        # PK repetida na planilha: vale a primeira linha, como no ON CONFLICT DO NOTHING
+        if pk in estado['vistas']:
+            continue
+        estado['vistas'].add(pk)
+        anterior = estado['anteriores'].get(pk)
+        if anterior == valor_hash:
+            iguais += 1
+            continue
+        if anterior is None:
+            novas += 1
+        else:
+            alteradas += 1
+        mascara_enviar[posicao] = True
+        pares.append((pk, valor_hash))
+    return mascara_enviar, pares, novas, alteradas, iguais
+
+def registrar_linhas_incrementais(arquivo_estado, nome_tabela, pares, adiar=False):
+    """Grava no estado os hashes das linhas que acabaram de ser carregadas
+    
+    adiar=True (carga atômica) só guarda os hashes em memória: eles são
+    gravados por gravar_linhas_pendentes depois do COMMIT da transação.
+    """
+    with TRAVA_INCREMENTAL:
+        if adiar:
+            ESTADO_INCREMENTAL[nome_tabela].setdefault('pendentes', []).extend(pares)
+            return
+    gravar_hashes(arquivo_estado, nome_tabela, pares)
+    with TRAVA_INCREMENTAL:
+        ESTADO_INCREMENTAL[nome_tabela]['anteriores'].update(pares)
+
+def gravar_linhas_pendentes(arquivo_estado):
+    """Grava os hashes adiados de todas as tabelas (depois do COMMIT da carga atômica)"""
+    with TRAVA_INCREMENTAL:
+        pendentes = {tabela: estado.pop('pendentes') for tabela, estado in ESTADO_INCREMENTAL.items()
+                     if estado.get('pendentes')}
+    for tabela, pares in pendentes.items():
+        registrar_linhas_incrementais(arquivo_estado, tabela, pares)
+
+# ============================================
+# CHECKPOINT (--resume)
+# ============================================
+
+# Checkpoint da execução: arquivo SQLite, hash da planilha e posições da
+# execução anterior (só com --resume). Sem arquivo, nada é registrado
+CHECKPOINT = {'arquivo': None, 'planilha': None, 'posicoes': {}}
+
+def configurar_checkpoint(arquivo=None, hash_planilha=None, posicoes=None):
+    """Liga o registro de checkpoints (arquivo=None desliga, como na carga atômica)"""
+    CHECKPOINT['arquivo'] = arquivo
+    CHECKPOINT['planilha'] = hash_planilha
+    CHECKPOINT['posicoes'] = posicoes or {}
+
+def registrar_checkpoint(nome_tabela, blocos, linhas, concluida=False):
+    """Grava a posição confirmada da tabela, se o checkpoint estiver ligado"""
+    if CHECKPOINT['arquivo'] is not None:
+        gravar_checkpoint(CHECKPOINT['arquivo'], CHECKPOINT['planilha'], nome_tabela, blocos, linhas, concluida)
+
+def pular_linhas_confirmadas(blocos, linhas, confirmadas=None):
+    """Descarta as primeiras linhas da aba, já confirmadas em execução anterior
+
+    confirmadas(df), se informada, recebe cada parte descartada.
+    """
+    for bloco in blocos:
+        if linhas >= len(bloco):
+            linhas -= len(bloco)
+            if confirmadas is not None:
+                confirmadas(bloco)
+            continue
+        if linhas and confirmadas is not None:
+            confirmadas(bloco.iloc[:linhas])
+        yield bloco.iloc[linhas:] if linhas else bloco
+        linhas = 0
+
+def fatiar_aba(df, tamanho_bloco):
+    """Divide uma aba já lida em blocos de até tamanho_bloco linhas (cada bloco tem seu COMMIT)"""
+    for inicio in range(0, len(df), tamanho_bloco):
+        yield df.iloc[inicio:inicio + tamanho_bloco]
+
+# ============================================
+# CARGA ATÔMICA (UMA TRANSAÇÃO)
+# ============================================
+
+# Índices secundários (idx_*) das tabelas da carga, com a definição para recriá-los
+SQL_INDICES_SECUNDARIOS = """
+    SELECT i.relname, pg_get_indexdef(i.oid)
+    FROM pg_index x
+    JOIN pg_class i ON i.oid = x.indexrelid
+    JOIN pg_class t ON t.oid = x.indrelid
+    WHERE t.relname = ANY(%s)
+    AND pg_table_is_visible(t.oid)
+    AND NOT x.indisprimary
+    AND NOT x.indisunique
+    AND i.relname LIKE 'idx\\_%%'
+    ORDER BY i.relname
+"""
+
+def iniciar_carga_atomica(conn, catalogo):
+    """Adia a verificação das FKs para o COMMIT da transação única"""
+    cursor = conn.cursor()
+    cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+    cursor.close()
+    
+    # FKs não DEFERRABLE continuam sendo verificadas a cada INSERT
+    imediatas = [fk['nome'] for info in catalogo.values() for fk in info['fks'] if not fk['deferrable']]
+    if imediatas:
+        print(f"⚠️  {len(imediatas)} FKs não são DEFERRABLE e serão verificadas linha a linha:")
+        print(f"   {', '.join(imediatas)}")
+        print("   💡 Veja a seção 'FOREIGN KEYS DEFERRABLE' em QUERIES_UTEIS.sql")
     else:
-        conflict_clause = "ON CONFLICT DO NOTHING"
+        print("🔗 FKs adiadas: integridade verificada uma única vez, no fim da carga")
+
+def remover_indices_secundarios(conn, tabelas):
+    """Remove os índices idx_* das tabelas (dentro da transação) e devolve as definições"""
+    cursor = conn.cursor()
+    inicio = time.perf_counter()
+    cursor.execute(SQL_INDICES_SECUNDARIOS, (list(tabelas),))
+    indices = cursor.fetchall()
+    for nome, _ in indices:
+        cursor.execute(f'DROP INDEX "{nome}"')
+    cursor.close()
+    print(f"🗑️  {len(indices)} índices secundários removidos ({time.perf_counter() - inicio:.2f}s)")
+    return indices
+
+def recriar_indices(conn, indices):
+    """Recria os índices removidos por remover_indices_secundarios"""
+    cursor = conn.cursor()
+    inicio = time.perf_counter()
+    for _, definicao in indices:
+        cursor.execute(definicao)
+    cursor.close()
+    print(f"🏗️  {len(indices)} índices recriados ({time.perf_counter() - inicio:.2f}s)")
+
+def finalizar_carga_atomica(conn, houve_erro, indices_removidos):
+    """Verifica as FKs, recria os índices e faz o COMMIT único; em caso de erro desfaz tudo
     
-    for idx, row in df.iterrows():
-        # Criar novo cursor para cada tentativa (evita problemas de transação)
+    Retorna True se a transação foi confirmada.
+    """
+    if houve_erro:
+        conn.rollback()
+        print("↩️  Transação desfeita: nenhuma tabela foi gravada")
+        return False
+    try:
+        # Verificar agora as FKs adiadas: o PostgreSQL não cria índices em
+        # tabelas com verificações pendentes
         cursor = conn.cursor()
+        inicio = time.perf_counter()
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.close()
+        print(f"🔗 FKs verificadas ({time.perf_counter() - inicio:.2f}s)")
+        if indices_removidos:
+            recriar_indices(conn, indices_removidos)
+        inicio = time.perf_counter()
+        conn.commit()
+        print(f"✅ Transação confirmada ({time.perf_counter() - inicio:.2f}s no COMMIT)")
+        return True
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"❌ Transação recusada: {str(e)[:200]}")
+        print("↩️  Transação desfeita: nenhuma tabela foi gravada")
+        return False
+
+# ============================================
+# CARGA POR NÍVEIS DE DEPENDÊNCIA (PARALELA)
+# ============================================
+
+class SaidaPorThread(io.TextIOBase):
+    """sys.stdout que desvia os prints de cada thread para um buffer próprio
+    
+    Permite que várias tabelas sejam carregadas ao mesmo tempo e que o log de
+    cada uma seja impresso inteiro, sem linhas intercaladas.
+    """
+    
+    def __init__(self, saida_original):
+        self.saida_original = saida_original
+        self.local = threading.local()
+    
+    def iniciar_captura(self):
+        self.local.buffer = io.StringIO()
+    
+    def captura_atual(self):
+        return getattr(self.local, 'buffer', None)
+    
+    def adotar_captura(self, buffer):
+        """Faz a thread atual escrever no buffer de outra (threads auxiliares da mesma tabela)"""
+        self.local.buffer = buffer
+    
+    def finalizar_captura(self):
+        buffer = getattr(self.local, 'buffer', None)
+        self.local.buffer = None
+        return buffer.getvalue() if buffer is not None else ''
+    
+    def write(self, texto):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is not None:
+            return buffer.write(texto)
+        return self.saida_original.write(texto)
+    
+    def flush(self):
+        self.saida_original.flush()
+
+def obter_niveis_dependencia(catalogo, tabelas):
+    """Agrupa as tabelas em níveis topológicos pelo grafo de FKs do catálogo
+    
+    Tabelas do mesmo nível não dependem umas das outras e podem ser
+    carregadas ao mesmo tempo. Dentro de cada nível vale a ordem de 'tabelas'.
+    """
+    dependencias = {tabela: set() for tabela in tabelas}
+    for filha in tabelas:
+        for fk in catalogo.get(filha, {}).get('fks', []):
+            pai = fk['tabela_ref']
+            # FKs para fora do conjunto ou auto-referências não definem ordem
+            if pai in dependencias and pai != filha:
+                dependencias[filha].add(pai)
+    
+    niveis = []
+    carregadas = set()
+    restantes = list(tabelas)
+    while restantes:
+        nivel = [t for t in restantes if dependencias[t] <= carregadas]
+        if not nivel:
+            # Ciclo de FKs: cair para a ordem fixa, uma tabela por nível
+            print(f"   ⚠️  Ciclo de FKs entre: {', '.join(restantes)} (carga sequencial)")
+            niveis.extend([t] for t in restantes)
+            break
+        niveis.append(nivel)
+        carregadas.update(nivel)
+        restantes = [t for t in restantes if t not in carregadas]
+    
+    return niveis
+
+# ============================================
+# LEITURA EM BLOCOS (STREAMING)
+# ============================================
+
+def encontrar_aba(tabela_banco, nomes_abas):
+    """Encontra a aba do Excel correspondente à tabela (case-insensitive)"""
+    for aba_excel, tab_banco in MAPEAMENTO_ABAS.items():
+        if tab_banco == tabela_banco:
+            for aba_real in nomes_abas:
+                if aba_real.upper() == aba_excel.upper():
+                    return aba_real
+    return None
+
+def nomes_colunas_cabecalho(cabecalho):
+    """Gera nomes de colunas como o pandas: 'Unnamed: i' para vazias e '.1', '.2' para repetidas"""
+    nomes = []
+    contagem = {}
+    for i, valor in enumerate(cabecalho):
+        nome = f"Unnamed: {i}" if valor is None else str(valor)
+        if nome in contagem:
+            contagem[nome] += 1
+            nome = f"{nome}.{contagem[nome]}"
+        else:
+            contagem[nome] = 0
+        nomes.append(nome)
+    return nomes
+
+# Colunas com poucos valores distintos viram Categorical na extração: um
+# código por linha na memória, e a limpeza roda uma vez por valor distinto
+FRACAO_MAXIMA_CATEGORIAS = 0.5
+LINHAS_MINIMAS_CATEGORIAS = 100
+TIPOS_CATEGORIZAVEIS = {'string', 'integer'}
+
+def categorizar_colunas(df, fracao_maxima=FRACAO_MAXIMA_CATEGORIAS, linhas_minimas=LINHAS_MINIMAS_CATEGORIAS):
+    """Converte em Categorical as colunas de texto com até fracao_maxima de valores distintos
+    
+    Só colunas só de textos ou só de inteiros: numa coluna misturada 1, 1.0 e
+    True seriam a mesma categoria, e a limpeza trata cada um de um jeito.
+    """
+    if len(df) < linhas_minimas:
+        return df
+    convertidas = {}
+    for posicao in range(len(df.columns)):
+        serie = df.iloc[:, posicao]
+        if not (serie.dtype == object or isinstance(serie.dtype, pd.StringDtype)):
+            continue
+        if serie.nunique(dropna=True) > len(serie) * fracao_maxima:
+            continue
+        if pd.api.types.infer_dtype(serie, skipna=True) not in TIPOS_CATEGORIZAVEIS:
+            continue
+        convertidas[posicao] = serie.astype('category')
+    if not convertidas:
+        return df
+    df = df.copy(deep=False)
+    for posicao, serie in convertidas.items():
+        df.isetitem(posicao, serie)
+    return df
+
+def descategorizar_colunas(df):
+    """Volta as colunas Categorical ao dtype das categorias (inteiros em object, por causa dos vazios)"""
+    if not any(isinstance(dtype, pd.CategoricalDtype) for dtype in df.dtypes):
+        return df
+    df = df.copy(deep=False)
+    for posicao, dtype in enumerate(df.dtypes):
+        if isinstance(dtype, pd.CategoricalDtype):
+            destino = object if dtype.categories.dtype.kind in 'iu' else dtype.categories.dtype
+            df.isetitem(posicao, df.iloc[:, posicao].astype(destino))
+    return df
+
+def abrir_planilha_streaming(arquivo_excel):
+    """Abre o arquivo Excel em modo somente leitura (sem carregar as abas)"""
+    return openpyxl.load_workbook(arquivo_excel, read_only=True, data_only=True)
+
+def ler_aba_em_blocos(workbook, nome_aba, tamanho_bloco=TAMANHO_BLOCO_PADRAO, categorizar=True):
+    """Lê uma aba linha a linha e gera DataFrames de até tamanho_bloco linhas
+    
+    A memória usada fica limitada ao tamanho do bloco, e não ao da planilha.
+    Os valores ficam como vieram do Excel (dtype object); a limpeza por tipo
+    do banco acontece depois, em limpar_coluna. O índice de cada bloco
+    continua a numeração da aba, para que "Linha N" aponte a linha certa.
+    Com categorizar, as colunas de baixa cardinalidade de cada bloco viram
+    Categorical (ver categorizar_colunas).
+    """
+    linhas = workbook[nome_aba].iter_rows(values_only=True)
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        return
+    colunas = nomes_colunas_cabecalho(cabecalho)
+    largura = len(colunas)
+    
+    bloco = []
+    linhas_vazias = 0
+    inicio = 0
+    for linha in linhas:
+        if all(valor is None for valor in linha):
+            # Linhas vazias no fim da aba são descartadas (como no read_excel)
+            linhas_vazias += 1
+            continue
+        if linhas_vazias:
+            bloco.extend([(None,) * largura] * linhas_vazias)
+            linhas_vazias = 0
+        bloco.append(tuple(linha[:largura]) + (None,) * (largura - len(linha)))
+        
+        if len(bloco) >= tamanho_bloco:
+            df = pd.DataFrame(bloco[:tamanho_bloco], columns=colunas, dtype=object,
+                              index=pd.RangeIndex(inicio, inicio + tamanho_bloco))
+            yield categorizar_colunas(df) if categorizar else df
+            inicio += tamanho_bloco
+            bloco = bloco[tamanho_bloco:]
+    
+    if bloco:
+        df = pd.DataFrame(bloco, columns=colunas, dtype=object,
+                          index=pd.RangeIndex(inicio, inicio + len(bloco)))
+        yield categorizar_colunas(df) if categorizar else df
+
+# ============================================
+# PIPELINE (EXTRAÇÃO → LIMPEZA → CARGA)
+# ============================================
+
+# Profundidade das filas entre as etapas: limita quantos blocos ficam na
+# memória esperando a etapa seguinte (backpressure)
+PROFUNDIDADE_FILA_PADRAO = 2
+
+FIM_DOS_BLOCOS = object()
+
+def colocar_na_fila(fila, item, parar):
+    """put com espera limitada: desiste se a carga foi interrompida"""
+    while not parar.is_set():
         try:
-            valores = []
-            for col_banco in colunas_para_inserir:
-                col_planilha = mapeamento_colunas[col_banco]
-                # Garantir que a coluna existe no DataFrame (pode ter espaços)
-                if col_planilha in row:
-                    valor = row[col_planilha]
-                elif col_planilha.strip() in df.columns:
-                    # Tentar com strip se a coluna tiver espaços
-                    col_planilha_stripped = col_planilha.strip()
-                    mapeamento_colunas[col_banco] = col_planilha_stripped  # Atualizar mapeamento
-                    valor = row[col_planilha_stripped] if col_planilha_stripped in row else None
-                else:
-                    valor = None
-                tipo = tipos_colunas[col_banco]
-                valor_limpo = limpar_valor(valor, tipo)
-                valores.append(valor_limpo)
-            
-            placeholders = ', '.join(['%s'] * len(valores))
-            query = f"""
-                INSERT INTO {nome_tabela} ({colunas_str})
-                VALUES ({placeholders})
-                {conflict_clause}
-            """
-            
-            cursor.execute(query, valores)
-            conn.commit()  # Commit após cada inserção bem-sucedida
-            
-            if cursor.rowcount > 0:
-                linhas_inseridas += 1
-            else:
-                linhas_duplicadas += 1
-            cursor.close()
-            
-        except psycopg2.IntegrityError as e:
-            conn.rollback()  # Rollback em caso de erro
-            cursor.close()
-            linhas_erro += 1
-            error_msg = str(e)
-            if linhas_erro <= 5:  # Mostrar apenas os 5 primeiros erros
-                print(f"      ⚠️  Linha {idx+1}: {error_msg[:120]}")
+            fila.put(item, timeout=0.1)
+            return True
+        except queue.Full:
             continue
+    return False
+
+def executar_pipeline(nome_tabela, blocos, preparar, carregar, profundidade=PROFUNDIDADE_FILA_PADRAO,
+                      bloco_confirmado=None):
+    """Executa extração, limpeza e carga de uma tabela em paralelo, bloco a bloco
+    
+    Enquanto o bloco N-1 é carregado no banco, o bloco N está sendo limpo e o
+    N+1 sendo lido da planilha. A extração e a limpeza rodam em threads
+    próprias, ligadas por filas limitadas; a carga roda na thread atual (dona
+    da conexão). Um erro em qualquer etapa interrompe as demais e é relançado.
+    
+    preparar(bloco) devolve um lote (ou None) e carregar(lote) as linhas inseridas.
+    bloco_confirmado(blocos, fim), se informado, é chamado na thread de carga
+    depois de cada bloco gravado, com o número de blocos já gravados e a linha
+    da aba logo após o bloco (checkpoint).
+    Cada bloco é medido em cada etapa (metricas_etl) com o nome da tabela.
+    Retorna (linhas_inseridas, registros_planilha).
+    """
+    fila_blocos = queue.Queue(maxsize=profundidade)
+    fila_lotes = queue.Queue(maxsize=profundidade)
+    parar = threading.Event()
+    
+    # As threads auxiliares escrevem no mesmo log capturado da tabela (--workers)
+    saida = sys.stdout if isinstance(sys.stdout, SaidaPorThread) else None
+    captura = saida.captura_atual() if saida is not None else None
+    
+    def extrair():
+        if saida is not None:
+            saida.adotar_captura(captura)
+        try:
+            iterador = iter(blocos)
+            while not parar.is_set():
+                with medir_etapa(nome_tabela, 'extração') as medicao:
+                    bloco = next(iterador, FIM_DOS_BLOCOS)
+                    if bloco is FIM_DOS_BLOCOS:
+                        medicao['blocos'] = 0
+                    else:
+                        medicao['linhas'] = len(bloco)
+                        medicao['bytes'] = bytes_do_bloco(bloco)
+                if bloco is FIM_DOS_BLOCOS:
+                    break
+                if not colocar_na_fila(fila_blocos, bloco, parar):
+                    return
+            colocar_na_fila(fila_blocos, FIM_DOS_BLOCOS, parar)
         except Exception as e:
-            conn.rollback()  # Rollback em caso de erro
-            cursor.close()
-            linhas_erro += 1
-            if linhas_erro <= 5:
-                print(f"      ⚠️  Linha {idx+1}: {str(e)[:120]}")
-            continue
+            colocar_na_fila(fila_blocos, e, parar)
     
-    if linhas_duplicadas > 0:
-        print(f"   ℹ️  {linhas_duplicadas} registros já existiam (duplicatas ignoradas)")
-    if linhas_erro > 0:
-        print(f"   ⚠️  {linhas_erro} registros com erro (FKs inválidas ou outros problemas)")
+    def limpar():
+        if saida is not None:
+            saida.adotar_captura(captura)
+        try:
+            while True:
+                bloco = fila_blocos.get()
+                if bloco is FIM_DOS_BLOCOS or isinstance(bloco, Exception):
+                    colocar_na_fila(fila_lotes, bloco, parar)
+                    return
+                with medir_etapa(nome_tabela, 'limpeza') as medicao:
+                    lote = preparar(bloco)
+                    medicao['linhas'] = len(lote['dados']) if lote is not None else 0
+                fim = int(bloco.index[-1]) + 1 if len(bloco) else None
+                if not colocar_na_fila(fila_lotes, (len(bloco), fim, lote), parar):
+                    return
+        except Exception as e:
+            colocar_na_fila(fila_lotes, e, parar)
     
-    return linhas_inseridas
+    threads = [threading.Thread(target=extrair, name='extracao', daemon=True),
+               threading.Thread(target=limpar, name='limpeza', daemon=True)]
+    for thread in threads:
+        thread.start()
+    
+    linhas_inseridas = 0
+    registros_planilha = 0
+    blocos_gravados = 0
+    try:
+        while True:
+            item = fila_lotes.get()
+            if item is FIM_DOS_BLOCOS:
+                break
+            if isinstance(item, Exception):
+                raise item
+            tamanho_bloco, fim, lote = item
+            registros_planilha += tamanho_bloco
+            if lote is not None:
+                with medir_etapa(nome_tabela, 'carga') as medicao:
+                    inseridas = carregar(lote)
+                    medicao['linhas'] = inseridas
+                linhas_inseridas += inseridas
+            blocos_gravados += 1
+            if bloco_confirmado is not None and fim is not None:
+                bloco_confirmado(blocos_gravados, fim)
+    finally:
+        parar.set()
+        # Destravar a limpeza se ela estiver esperando um bloco
+        try:
+            fila_blocos.put_nowait(FIM_DOS_BLOCOS)
+        except queue.Full:
+            pass
+        for thread in threads:
+            thread.join()
+    
+    return linhas_inseridas, registros_planilha
 
 # ============================================
 # FUNÇÃO PRINCIPAL
 # ============================================
 
-def analisar_planilha_detalhadamente(arquivo_excel):
-    """Analisa a planilha em detalhes para entender estrutura"""
-    print("=" * 100)
-    print("ANÁLISE DETALHADA DA PLANILHA")
-    print("=" * 100)
-    print()
+def carregar_tabela(conn, tabela_banco, nomes_abas, abas_excel, workbook, opcoes, tabelas_erro, catalogo):
+    """Mapeia as colunas e insere todos os blocos da aba de uma tabela
+    
+    Retorna (status, linhas_inseridas), com status 'processada', 'erro' ou 'pulada'.
+    Com --resume, tabelas concluídas na execução anterior são puladas e as
+    parciais recomeçam na linha seguinte ao último bloco confirmado.
+    """
+    # Posição confirmada na execução anterior (--resume)
+    anterior = CHECKPOINT['posicoes'].get(tabela_banco)
+    if anterior is not None and anterior['concluida']:
+        print(f"⏩ {tabela_banco}: concluída em execução anterior (pulando)")
+        print()
+        return ('processada', 0)
+    linha_inicial = anterior['linhas'] if anterior is not None else 0
+    blocos_anteriores = anterior['blocos'] if anterior is not None else 0
     
+    # Encontrar aba correspondente
+    aba_encontrada = encontrar_aba(tabela_banco, nomes_abas)
+    
+    if not aba_encontrada:
+        print(f"⏭️  {tabela_banco}: Aba não encontrada no Excel (pulando)")
+        return ('pulada', 0)
+    
+    # Blocos de até --tamanho-bloco linhas: cada um tem seu COMMIT e seu checkpoint
+    if opcoes.streaming:
+        blocos = ler_aba_em_blocos(workbook, aba_encontrada, opcoes.tamanho_bloco,
+                                   categorizar=not opcoes.sem_categorias)
+    else:
+        blocos = fatiar_aba(abas_excel[aba_encontrada], opcoes.tamanho_bloco)
+    info_tabela = catalogo.get(tabela_banco)
+    if linha_inicial:
+        # As chaves das linhas já confirmadas valem na deduplicação da parte retomada
+        semear = None
+        if info_tabela is not None:
+            info_semeadura = dict(info_tabela, fks=[]) if opcoes.staging else info_tabela
+            def semear(confirmado):
+                carregar_chaves_das_fks(conn, info_semeadura)
+                semear_deduplicacao(tabela_banco, info_semeadura, confirmado)
+        blocos = pular_linhas_confirmadas(blocos, linha_inicial, semear)
+    
+    # O primeiro bloco define as colunas
+    # Só o tempo: o bloco é contado quando passar pelo pipeline
+    with medir_etapa(tabela_banco, 'extração', blocos=0):
+        df = next(blocos, None)
+    
+    if df is None or df.empty:
+        if linha_inicial:
+            # Todos os blocos já confirmados: faltou só marcar a tabela como concluída
+            print(f"⏩ {tabela_banco}: todas as linhas confirmadas em execução anterior (pulando)")
+            print()
+            registrar_checkpoint(tabela_banco, blocos_anteriores, linha_inicial, concluida=True)
+            return ('processada', 0)
+        print(f"⏭️  {tabela_banco}: Aba vazia (pulando)")
+        return ('pulada', 0)
+    
+    print(f"📊 {tabela_banco} (aba: {aba_encontrada})")
+    if not opcoes.streaming:
+        print(f"   Registros na planilha: {len(abas_excel[aba_encontrada])}")
+    if linha_inicial:
+        print(f"   ⏩ Retomando na linha {linha_inicial + 1} ({blocos_anteriores} blocos já confirmados; "
+              f"repetições das chaves deles continuam sendo detectadas)")
+    
+    # Mapear colunas
+    if info_tabela is not None:
+        colunas_banco = [c['nome'] for c in info_tabela['colunas']]
+    else:
+        colunas_banco = [c['nome'] for c in obter_colunas_tabela(conn, tabela_banco)]
+    
+    # Mostrar debug apenas se houver erro anterior ou se for tabela problemática
+    tabelas_problematicas = ['endereco', 'contato', 'contato_telefone', 'centros_inovacao', 
+                            'endereco_centro', 'ator', 'programa']
+    mostrar_debug = tabela_banco in tabelas_problematicas or tabela_banco in tabelas_erro
+    
+    with medir_etapa(tabela_banco, 'mapeamento'):
+        mapeamento = mapear_colunas_planilha_para_banco(df, colunas_banco, mostrar_debug=mostrar_debug)
+    
+    if not mapeamento:
+        print(f"   ⚠️  Nenhuma coluna mapeada (pulando)")
+        print(f"   💡 Colunas disponíveis na planilha: {', '.join(list(df.columns)[:15])}")
+        return ('pulada', 0)
+    
+    # Carga incremental: estado por banco de destino
+    arquivo_estado = caminho_estado(CONFIG_BANCO['database']) if opcoes.incremental else None
+    
+    # Checkpoint depois do COMMIT de cada bloco
+    posicao = {'blocos': blocos_anteriores, 'linhas': linha_inicial}
+    def bloco_confirmado(blocos_gravados, fim):
+        posicao['blocos'] = blocos_anteriores + blocos_gravados
+        posicao['linhas'] = fim
+        registrar_checkpoint(tabela_banco, posicao['blocos'], fim)
+    
+    # Staging no servidor (--staging): os blocos vão por COPY para a staging,
+    # as FKs são verificadas lá e a tabela final só é tocada na mesclagem
+    staging = None
+    info_preparo = info_tabela
+    carregar = lambda lote: executar_insercao(conn, lote, opcoes.modo_carga, confirmar=not opcoes.atomico,
+                                              motor=opcoes.motor)
+    if opcoes.staging and info_tabela is not None:
+        staging = nova_staging(tabela_banco, info_tabela)
+        info_preparo = dict(info_tabela, fks=[])
+        carregar = lambda lote: copiar_para_staging(conn, staging, lote['colunas'], lote['dados'],
+                                                    lote['indices'] + 1)
+        # Nada é confirmado na tabela final antes da mesclagem: checkpoint só da tabela inteira
+        bloco_confirmado = None
+    
+    # A limpeza roda em outra thread e não usa a conexão: os conjuntos de
+    # chaves das FKs são consultados aqui, na thread de carga, antes de cada bloco
+    def carregar_bloco(lote):
+        inseridas = carregar(lote)
+        carregar_chaves_das_fks(conn, info_preparo)
+        return inseridas
+    
+    # Inserir dados: leitura, limpeza e carga dos blocos em pipeline
     try:
-        abas_excel = pd.read_excel(arquivo_excel, sheet_name=None, engine='openpyxl')
-        
-        for sheet_name in abas_excel.keys():
-            df = abas_excel[sheet_name]
-            print(f"\n{'='*100}")
-            print(f"ABA: {sheet_name}")
-            print(f"{'='*100}")
-            print(f"📏 Dimensões: {len(df)} linhas × {len(df.columns)} colunas")
-            print(f"\n📝 COLUNAS EXATAS ({len(df.columns)}):")
-            for i, col in enumerate(df.columns, 1):
-                # Contar valores não nulos
-                na_count = df[col].isna().sum()
-                not_na = len(df) - na_count
-                pct = (not_na / len(df) * 100) if len(df) > 0 else 0
-                print(f"   {i:2d}. {repr(col):60s} | Não-nulos: {not_na:4d}/{len(df)} ({pct:5.1f}%)")
-            
-            print(f"\n📊 PRIMEIRAS 3 LINHAS (valores reais):")
-            for idx in range(min(3, len(df))):
-                print(f"\n   Linha {idx+1}:")
-                for col in df.columns:
-                    valor = df.iloc[idx][col]
-                    if pd.isna(valor):
-                        print(f"      {col:50s} → NULL")
-                    else:
-                        valor_str = str(valor)[:50]
-                        print(f"      {col:50s} → {valor_str}")
-            
-            print(f"\n🔍 TIPOS DE DADOS:")
-            for col in df.columns:
-                dtype = df[col].dtype
-                print(f"   {col:50s} → {str(dtype):20s}")
-        
-        print("\n" + "=" * 100)
-        return abas_excel
-        
+        carregar_chaves_das_fks(conn, info_preparo)
+        linhas_inseridas, registros_planilha = executar_pipeline(
+            tabela_banco,
+            itertools.chain([df], blocos),
+            lambda bloco: preparar_insercao(conn, tabela_banco, bloco, mapeamento,
+                                            info_preparo, arquivo_estado, aba=aba_encontrada),
+            carregar_bloco,
+            opcoes.profundidade_fila,
+            bloco_confirmado,
+        )
+        if staging is not None:
+            print(f"   📥 {linhas_inseridas} registros copiados para a staging ({staging['nome']})")
+            linhas_inseridas = mesclar_tabela_staging(conn, staging, opcoes.sessoes_staging, aba_encontrada)
+        registrar_checkpoint(tabela_banco, posicao['blocos'], posicao['linhas'], concluida=True)
+        if opcoes.streaming:
+            print(f"   Registros na planilha: {registros_planilha}")
+        print(f"   ✅ {linhas_inseridas} registros inseridos")
+        resultado = ('processada', linhas_inseridas)
     except Exception as e:
-        print(f"❌ Erro ao analisar planilha: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
-
-def main():
-    # Garantir que estamos no diretório correto
-    script_dir = Path(__file__).parent.absolute()
-    os.chdir(script_dir)
+        print(f"   ❌ Erro: {e}")
+        resultado = ('erro', 0)
+        if staging is not None:
+            descartar_staging(conn, staging)
+    liberar_deduplicacao(tabela_banco)
     
-    print("=" * 100)
-    print("INSERÇÃO DE DADOS NO POSTGRESQL")
-    print("=" * 100)
-    print(f"📁 Diretório de trabalho: {script_dir}")
     print()
+    return resultado
+
+def carregar_nivel_em_paralelo(pool, nivel, workers, nomes_abas, abas_excel, arquivo_excel, opcoes,
+                               tabelas_erro, catalogo):
+    """Carrega as tabelas de um mesmo nível ao mesmo tempo, uma conexão do pool por tabela
     
-    # 1. Encontrar arquivo Excel
-    print("📂 Procurando arquivo Excel...")
+    O log de cada tabela é capturado e impresso inteiro, na ordem do nível.
+    """
+    saida = sys.stdout if isinstance(sys.stdout, SaidaPorThread) else SaidaPorThread(sys.stdout)
+    
+    def tarefa(tabela_banco):
+        saida.iniciar_captura()
+        # openpyxl não é thread-safe: cada thread abre sua própria cópia em streaming
+        workbook = abrir_planilha_streaming(arquivo_excel) if opcoes.streaming else None
+        try:
+            with conexao_do_pool(pool) as conn:
+                resultado = carregar_tabela(conn, tabela_banco, nomes_abas, abas_excel,
+                                            workbook, opcoes, tabelas_erro, catalogo)
+        except Exception as e:
+            print(f"   ❌ Erro: {e}")
+            print()
+            resultado = ('erro', 0)
+        finally:
+            if workbook is not None:
+                workbook.close()
+        return resultado, saida.finalizar_captura()
+    
+    sys_stdout_anterior = sys.stdout
+    sys.stdout = saida
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futuros = {tabela: executor.submit(tarefa, tabela) for tabela in nivel}
+            resultados = {}
+            for tabela in nivel:
+                resultados[tabela], log = futuros[tabela].result()
+                saida.saida_original.write(log)
+    finally:
+        sys.stdout = sys_stdout_anterior
+    
+    return resultados
+
+
+def encontrar_planilha(diretorio='.'):
+    """Planilha a carregar no diretório, ou None se não houver nenhuma"""
     arquivo_excel = None
     
     # Prioridade: FINAL > SEM_DUPLICATAS > CORRIGIDO > COM_FKs_CORRETAS
-    for f in Path('.').glob('*.xlsx'):
+    for f in Path(diretorio).glob('*.xlsx'):
         nome_upper = f.name.upper()
         if 'FINAL' in nome_upper:
             arquivo_excel = str(f)
@@ -660,6 +2157,176 @@ def main():
             arquivo_excel = str(f)
         elif 'COM_FKs_CORRETAS' in nome_upper and arquivo_excel is None:
             arquivo_excel = str(f)
+    return arquivo_excel
+
+def ler_planilha(arquivo_excel, usar_cache=True, limite_cache_mb=LIMITE_CACHE_MB, categorizar=True,
+                 tabelas=None):
+    """Lê todas as abas do XLSX, usando o cache Arrow quando disponível
+    
+    O cache é identificado pelo hash do arquivo: qualquer alteração na
+    planilha gera uma nova entrada (ver cache_planilha). Com categorizar, as
+    colunas de baixa cardinalidade viram Categorical (no cache, arrays
+    dictionary do Arrow). tabelas: sem o cache, só as abas destas tabelas
+    são lidas do XLSX (o cache sempre guarda e devolve a planilha inteira).
+    """
+    def ler_excel(tabelas=None):
+        if tabelas is None:
+            abas = pd.read_excel(arquivo_excel, sheet_name=None, engine='openpyxl')
+        else:
+            with pd.ExcelFile(arquivo_excel, engine='openpyxl') as planilha:
+                nomes = [encontrar_aba(tabela, planilha.sheet_names) for tabela in tabelas]
+                abas = planilha.parse(sheet_name=[aba for aba in nomes if aba is not None]) if any(nomes) else {}
+        return {aba: categorizar_colunas(df) for aba, df in abas.items()} if categorizar else abas
+    
+    if not usar_cache:
+        return ler_excel(tabelas)
+    if not cache_disponivel():
+        print("ℹ️  pyarrow não instalado: cache de planilhas desativado")
+        return ler_excel(tabelas)
+    
+    hash_arquivo = calcular_hash_arquivo(arquivo_excel)
+    abas_excel = ler_abas_do_cache(hash_arquivo)
+    if abas_excel is not None:
+        print(f"⚡ Planilha lida do cache Arrow (hash {hash_arquivo[:12]})")
+        if categorizar:
+            # Entradas gravadas sem categorias (ou com elas, se categorizar=False)
+            return {aba: categorizar_colunas(df) for aba, df in abas_excel.items()}
+        return {aba: descategorizar_colunas(df) for aba, df in abas_excel.items()}
+    
+    abas_excel = ler_excel()
+    erro = gravar_abas_no_cache(hash_arquivo, abas_excel, limite_mb=limite_cache_mb)
+    if erro is None:
+        print(f"💾 Planilha gravada no cache Arrow (hash {hash_arquivo[:12]})")
+    else:
+        print(f"⚠️  Planilha não gravada no cache Arrow ({erro})")
+    return abas_excel
+
+def salvar_metricas(opcoes, arquivo_excel, segundos_totais, total_inserido, tabelas_erro):
+    """Acrescenta as métricas da execução ao JSON-lines e, se pedido, grava o .prom"""
+    registros = registros_de_metricas(ID_EXECUCAO, segundos_totais, total_inserido, extras={
+        'arquivo': arquivo_excel,
+        'modo_carga': opcoes.modo_carga,
+        'motor': opcoes.motor,
+        'streaming': opcoes.streaming,
+        'workers': opcoes.workers,
+        'atomico': opcoes.atomico,
+        'staging': opcoes.staging,
+        'incremental': opcoes.incremental,
+        'tabelas_erro': len(tabelas_erro),
+        'datas_nao_reconhecidas': sum(linhas for _, _, linhas in resumo_falhas_datas()),
+        'duplicatas_planilha': sum(exatas + conflitos for _, exatas, conflitos in resumo_deduplicacao()),
+    })
+    try:
+        gravar_jsonl(opcoes.metricas, registros)
+        print(f"📈 Métricas: {opcoes.metricas}")
+        if opcoes.metricas_prometheus:
+            gravar_prometheus(opcoes.metricas_prometheus, registros)
+            print(f"📈 Métricas Prometheus: {opcoes.metricas_prometheus}")
+    except OSError as e:
+        # Falha ao gravar métricas não invalida a carga
+        print(f"⚠️  Não foi possível gravar as métricas: {e}")
+
+def parse_argumentos(argv=None):
+    """Lê as opções de linha de comando"""
+    parser = argparse.ArgumentParser(description="Insere os dados da planilha XLSX no PostgreSQL")
+    parser.add_argument('--modo-carga', choices=MODOS_CARGA, default=MODO_CARGA_PADRAO,
+                        help="execute_values (INSERT em páginas) ou copy (COPY + INSERT ... SELECT)")
+    parser.add_argument('--motor', choices=MOTORES, default=MOTOR_PADRAO,
+                        help=f"motor da carga: psycopg2 ou asyncpg (COPY binário, exige pip install asyncpg; "
+                             f"ignora --modo-carga) (padrão: {MOTOR_PADRAO})")
+    parser.add_argument('--streaming', action='store_true',
+                        help="lê as abas em blocos com openpyxl (read_only) em vez de carregar tudo")
+    parser.add_argument('--perfil', choices=MODOS_PERFIL, default=MODO_PERFIL_PADRAO,
+                        help="perfil das abas em JSON: desligado, amostra (padrão) ou completo")
+    parser.add_argument('--tamanho-amostra', type=int, default=TAMANHO_AMOSTRA_PADRAO,
+                        help=f"linhas por aba no --perfil amostra (padrão: {TAMANHO_AMOSTRA_PADRAO})")
+    parser.add_argument('--sem-cache-catalogo', action='store_true',
+                        help="ignora o cache em disco e relê colunas/PKs/FKs do banco")
+    parser.add_argument('--sem-cache-planilha', action='store_true',
+                        help="sempre relê o XLSX, sem usar nem gravar o cache Arrow das abas")
+    parser.add_argument('--sem-categorias', action='store_true',
+                        help="não converte as colunas de baixa cardinalidade em Categorical na leitura")
+    parser.add_argument('--limite-cache-mb', type=int, default=LIMITE_CACHE_MB,
+                        help=f"tamanho máximo do cache Arrow das planilhas (padrão: {LIMITE_CACHE_MB} MB)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="conexões simultâneas: tabelas do mesmo nível de FK carregam em paralelo (padrão: 1)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="envia só linhas novas ou alteradas desde a última carga (upsert pela PK)")
+    parser.add_argument('--atomico', action='store_true',
+                        help="carrega todas as tabelas em uma única transação, com FKs verificadas uma vez no fim")
+    parser.add_argument('--recriar-indices', action='store_true',
+                        help="com --atomico: remove os índices idx_* antes da carga e os recria no fim")
+    parser.add_argument('--staging', action='store_true',
+                        help="copia os blocos para tabelas UNLOGGED no esquema etl_staging, valida FKs e UNIQUEs "
+                             "no servidor e mescla na tabela final em faixas da PK (ver carga_staging.py)")
+    parser.add_argument('--sessoes-staging', type=int, default=SESSOES_STAGING_PADRAO,
+                        help=f"com --staging: sessões simultâneas na mesclagem de cada tabela, uma faixa da PK "
+                             f"por sessão (padrão: {SESSOES_STAGING_PADRAO})")
+    parser.add_argument('--profundidade-fila', type=int, default=PROFUNDIDADE_FILA_PADRAO,
+                        help=f"blocos em espera entre leitura, limpeza e carga (padrão: {PROFUNDIDADE_FILA_PADRAO})")
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO_PADRAO,
+                        help=f"linhas por bloco; cada bloco tem seu COMMIT e seu checkpoint "
+                             f"(padrão: {TAMANHO_BLOCO_PADRAO})")
+    parser.add_argument('--resume', action='store_true',
+                        help="retoma a última carga da mesma planilha: pula as tabelas concluídas e "
+                             "recomeça as parciais no último bloco confirmado")
+    parser.add_argument('--metricas', default=ARQUIVO_METRICAS_PADRAO,
+                        help=f"arquivo JSON-lines onde as métricas de cada execução são acrescentadas "
+                             f"(padrão: {ARQUIVO_METRICAS_PADRAO})")
+    parser.add_argument('--metricas-prometheus', metavar='ARQUIVO',
+                        help="grava também as métricas no formato do textfile collector do node_exporter (.prom)")
+    parser.add_argument('--formato-quarentena', choices=FORMATOS_QUARENTENA, default=FORMATO_QUARENTENA_PADRAO,
+                        help="formato dos arquivos de linhas rejeitadas em rejeitados/<execução>/ "
+                             "(parquet exige pyarrow)")
+    adicionar_argumentos_conexao(parser)
+    opcoes = parser.parse_args(argv)
+    if opcoes.resume and opcoes.atomico:
+        parser.error("--resume não se aplica a --atomico (a carga atômica grava tudo ou nada)")
+    if opcoes.recriar_indices and not opcoes.atomico:
+        parser.error("--recriar-indices exige --atomico (os índices só podem ser removidos dentro da transação)")
+    if opcoes.staging and opcoes.atomico:
+        parser.error("--staging não se aplica a --atomico (a mesclagem usa várias sessões, cada uma com seu COMMIT)")
+    if opcoes.staging and opcoes.incremental:
+        parser.error("--staging não se aplica a --incremental (o upsert é feito bloco a bloco na tabela final)")
+    if opcoes.sessoes_staging < 1:
+        parser.error("--sessoes-staging deve ser pelo menos 1")
+    return opcoes
+
+def main(opcoes=None):
+    if opcoes is None:
+        opcoes = parse_argumentos([])
+    
+    # Garantir que estamos no diretório correto
+    script_dir = Path(__file__).parent.absolute()
+    os.chdir(script_dir)
+    
+    print("=" * 100)
+    print("INSERÇÃO DE DADOS NO POSTGRESQL")
+    print("=" * 100)
+    print(f"📁 Diretório de trabalho: {script_dir}")
+    if opcoes.motor == 'asyncpg' and not asyncpg_disponivel():
+        print("ℹ️  asyncpg não instalado: motor psycopg2 (pip install asyncpg)")
+        opcoes.motor = 'psycopg2'
+    if opcoes.motor == 'asyncpg' and opcoes.atomico:
+        print("ℹ️  --atomico usa o motor psycopg2 (a transação única fica na conexão principal)")
+        opcoes.motor = 'psycopg2'
+    if opcoes.motor == 'asyncpg' and opcoes.staging:
+        print("ℹ️  --staging usa o motor psycopg2 (COPY para a staging e mesclagem no servidor)")
+        opcoes.motor = 'psycopg2'
+    if opcoes.staging:
+        print(f"⚙️  Carga em staging no servidor: etl_staging, mesclagem em até {opcoes.sessoes_staging} sessões")
+    elif opcoes.motor == 'asyncpg':
+        print(f"⚙️  Motor de carga: asyncpg (COPY binário)")
+    else:
+        print(f"⚙️  Modo de carga: {opcoes.modo_carga}")
+    if opcoes.incremental:
+        print(f"🔄 Carga incremental (estado: {caminho_estado(CONFIG_BANCO['database'])})")
+        ESTADO_INCREMENTAL.clear()
+    print()
+    
+    # 1. Encontrar arquivo Excel
+    print("📂 Procurando arquivo Excel...")
+    arquivo_excel = encontrar_planilha()
     
     if not arquivo_excel:
         print("❌ Arquivo Excel não encontrado!")
@@ -667,17 +2334,66 @@ def main():
         return
     
     print(f"✅ Arquivo encontrado: {arquivo_excel}")
+    configurar_quarentena(opcoes.formato_quarentena, Path(arquivo_excel).name)
+    
+    # Checkpoints por planilha (hash do conteúdo) e tabela; sem --resume a carga recomeça do zero
+    if opcoes.atomico:
+        configurar_checkpoint()
+    else:
+        hash_planilha = calcular_hash_arquivo(arquivo_excel)
+        arquivo_checkpoint = caminho_checkpoint(CONFIG_BANCO['database'])
+        posicoes = {}
+        if opcoes.resume:
+            posicoes = ler_checkpoints(arquivo_checkpoint, hash_planilha)
+            concluidas = sum(1 for posicao in posicoes.values() if posicao['concluida'])
+            print(f"♻️  Retomando a carga (hash {hash_planilha[:12]}): {concluidas} tabelas concluídas, "
+                  f"{len(posicoes) - concluidas} parciais")
+        else:
+            apagar_checkpoints(arquivo_checkpoint, hash_planilha)
+        configurar_checkpoint(arquivo_checkpoint, hash_planilha, posicoes)
     print()
     
     # 2. ANALISAR PLANILHA PRIMEIRO
-    print("🔍 Analisando estrutura da planilha...")
-    abas_excel = analisar_planilha_detalhadamente(arquivo_excel)
-    
-    if abas_excel is None:
-        print("❌ Erro ao ler arquivo Excel")
-        return
-    
-    print(f"\n✅ {len(abas_excel)} abas carregadas: {', '.join(abas_excel.keys())}")
+    zerar_metricas()
+    zerar_falhas_datas()
+    zerar_deduplicacao()
+    inicio_carga = time.perf_counter()
+    workbook = None
+    abas_excel = None
+    if opcoes.streaming:
+        # No streaming nenhuma aba é carregada inteira (perfil das abas desligado)
+        print(f"🌊 Modo streaming: blocos de {opcoes.tamanho_bloco} linhas")
+        try:
+            workbook = abrir_planilha_streaming(arquivo_excel)
+        except Exception as e:
+            print(f"❌ Erro ao abrir arquivo Excel: {e}")
+            return
+        nomes_abas = workbook.sheetnames
+        print(f"\n✅ {len(nomes_abas)} abas encontradas: {', '.join(nomes_abas)}")
+    else:
+        print("📖 Lendo arquivo Excel...")
+        try:
+            with medir_etapa(None, 'leitura') as medicao:
+                abas_excel = ler_planilha(arquivo_excel, usar_cache=not opcoes.sem_cache_planilha,
+                                          categorizar=not opcoes.sem_categorias,
+                                          limite_cache_mb=opcoes.limite_cache_mb)
+                medicao['linhas'] = sum(len(df) for df in abas_excel.values())
+                medicao['bytes'] = os.path.getsize(arquivo_excel)
+        except Exception as e:
+            print(f"❌ Erro ao ler arquivo Excel: {e}")
+            return
+        
+        nomes_abas = list(abas_excel.keys())
+        print(f"✅ {len(abas_excel)} abas carregadas: {', '.join(abas_excel.keys())}")
+        
+        # Perfil das abas (nulos, cardinalidade, tipos) em JSON
+        if opcoes.perfil != 'desligado':
+            with medir_etapa(None, 'perfil') as medicao:
+                perfil = perfilar_planilha(abas_excel, opcoes.perfil, opcoes.tamanho_amostra)
+                arquivo_perfil = salvar_perfil(perfil, arquivo_excel)
+                medicao['linhas'] = sum(aba['linhas_perfiladas'] for aba in perfil['abas'].values())
+            print(f"\n🔍 Perfil das abas ({opcoes.perfil}, {medicao['segundos']:.2f}s): {arquivo_perfil}")
+            imprimir_resumo_perfil(perfil)
     print()
     
     # 3. Conectar ao banco
@@ -687,51 +2403,30 @@ def main():
     print(f"   Database: {CONFIG_BANCO['database']}")
     print(f"   User: {CONFIG_BANCO['user']}")
     print(f"   Password: {'*' * len(str(CONFIG_BANCO['password'])) if CONFIG_BANCO['password'] else '(vazia)'}")
+    configurar_sessao(opcoes)
+    print(f"   Sessão: {descrever_sessao()}")
     print()
     
     try:
-        # Converter todos os valores para strings seguras (ASCII quando possível)
-        def garantir_string_segura(valor):
-            """Converte valor para string segura para conexão"""
-            if valor is None:
-                return ''
-            if isinstance(valor, (int, float)):
-                return str(valor)
-            if isinstance(valor, bytes):
-                try:
-                    return valor.decode('utf-8', errors='replace')
-                except:
-                    return valor.decode('latin-1', errors='replace')
-            if isinstance(valor, str):
-                # Tentar garantir que é UTF-8 válido
-                try:
-                    # Testar se pode codificar em UTF-8
-                    valor.encode('utf-8')
-                    return valor
-                except UnicodeEncodeError:
-                    # Se não conseguir, usar replace para substituir caracteres problemáticos
-                    return valor.encode('utf-8', errors='replace').decode('utf-8', errors='replace')
-            return str(valor)
-        
-        # Preparar parâmetros de conexão
-        host = garantir_string_segura(CONFIG_BANCO['host'])
-        database = garantir_string_segura(CONFIG_BANCO['database'])
-        user = garantir_string_segura(CONFIG_BANCO['user'])
-        password = garantir_string_segura(CONFIG_BANCO['password'])
-        port = int(CONFIG_BANCO['port'])
-        
-        # Conectar usando parâmetros nomeados (mais seguro que DSN string)
-        conn = psycopg2.connect(
-            host=host,
-            port=port,
-            database=database,
-            user=user,
-            password=password,
-            client_encoding='UTF8'
-        )
+        parametros = obter_parametros_conexao()
+        database = parametros['database']
+        host = parametros['host']
+        
+        if opcoes.motor == 'asyncpg':
+            # Uma conexão asyncpg por tabela carregada ao mesmo tempo. Antes
+            # do pool: se falhar, nenhuma conexão do pool fica emprestada
+            iniciar_motor_asyncpg(opcoes.workers)
+        # Conexão principal e dos workers vêm do mesmo pool (conexao_banco):
+        # comandos e bytes enviados entram nas métricas da carga. Com --staging,
+        # cada tabela carregada ao mesmo tempo ainda usa até --sessoes-staging
+        # conexões na mesclagem
+        pool = obter_pool(opcoes.workers + 1 + (opcoes.workers * opcoes.sessoes_staging if opcoes.staging else 0))
+        conn = pool.getconn()
         print(f"✅ Conectado ao banco: {database}@{host}")
         print()
     except psycopg2.OperationalError as e:
+        fechar_pool()
+        encerrar_motor_asyncpg()
         print(f"❌ Erro de conexão com o banco:")
         print(f"   {e}")
         print()
@@ -747,6 +2442,8 @@ def main():
         print("   • Crie o banco se não existir: CREATE DATABASE centros_inovacao;")
         return
     except Exception as e:
+        fechar_pool()
+        encerrar_motor_asyncpg()
         print(f"❌ Erro inesperado ao conectar: {e}")
         print(f"   Tipo do erro: {type(e).__name__}")
         import traceback
@@ -764,58 +2461,78 @@ def main():
     tabelas_erro = []
     
     try:
-        for tabela_banco in ORDEM_INSERCAO:
-            # Encontrar aba correspondente
-            aba_encontrada = None
-            for aba_excel, tab_banco in MAPEAMENTO_ABAS.items():
-                if tab_banco == tabela_banco:
-                    # Tentar encontrar a aba (case-insensitive)
-                    for aba_real in abas_excel.keys():
-                        if aba_real.upper() == aba_excel.upper():
-                            aba_encontrada = aba_real
-                            break
-                    if aba_encontrada:
-                        break
-            
-            if not aba_encontrada:
-                print(f"⏭️  {tabela_banco}: Aba não encontrada no Excel (pulando)")
-                continue
-            
-            df = abas_excel[aba_encontrada].copy()
-            
-            if df.empty:
-                print(f"⏭️  {tabela_banco}: Aba vazia (pulando)")
-                continue
-            
-            print(f"📊 {tabela_banco} (aba: {aba_encontrada})")
-            print(f"   Registros na planilha: {len(df)}")
-            
-            # Mapear colunas
-            colunas_banco = [c['nome'] for c in obter_colunas_tabela(conn, tabela_banco)]
-            
-            # Mostrar debug apenas se houver erro anterior ou se for tabela problemática
-            tabelas_problematicas = ['endereco', 'contato', 'contato_telefone', 'centros_inovacao', 
-                                    'endereco_centro', 'ator', 'programa']
-            mostrar_debug = tabela_banco in tabelas_problematicas or tabela_banco in tabelas_erro
-            
-            mapeamento = mapear_colunas_planilha_para_banco(df, colunas_banco, mostrar_debug=mostrar_debug)
+        with medir_etapa(None, 'preparação'):
+            # Metadados de todas as tabelas em uma consulta (ou do cache em disco)
+            catalogo, catalogo_em_cache = carregar_catalogo(conn, ORDEM_INSERCAO,
+                                                            usar_cache=not opcoes.sem_cache_catalogo)
+            origem = "cache em disco" if catalogo_em_cache else "consulta ao banco"
+            print(f"🗂️  Catálogo: {len(catalogo)} tabelas ({origem})")
+            print()
+            conn.commit()
             
-            if not mapeamento:
-                print(f"   ⚠️  Nenhuma coluna mapeada (pulando)")
-                print(f"   💡 Colunas disponíveis na planilha: {', '.join(list(df.columns)[:15])}")
-                continue
+            # Chaves das tabelas referenciadas por FKs (pré-validação no cliente);
+            # com --staging as FKs são verificadas no servidor, sem trazer as chaves
+            if not opcoes.staging:
+                semear_chaves_referenciadas(conn, catalogo)
+            else:
+                criar_esquema_staging(conn)
             
-            # Inserir dados
-            try:
-                linhas_inseridas = inserir_dados_tabela(conn, tabela_banco, df, mapeamento)
-                print(f"   ✅ {linhas_inseridas} registros inseridos")
+            indices_removidos = []
+            if opcoes.atomico:
+                print("🔒 Carga atômica: todas as tabelas em uma única transação")
+                if opcoes.workers > 1:
+                    print("   ℹ️  --workers ignorado (uma transação usa uma única conexão)")
+                iniciar_carga_atomica(conn, catalogo)
+                if opcoes.recriar_indices:
+                    indices_removidos = remover_indices_secundarios(conn, ORDEM_INSERCAO)
+                print()
+        
+        if opcoes.workers > 1 and not opcoes.atomico:
+            niveis = obter_niveis_dependencia(catalogo, ORDEM_INSERCAO)
+            print(f"🧵 Carga paralela: {opcoes.workers} workers, {len(niveis)} níveis de dependência")
+            for numero, nivel in enumerate(niveis, 1):
+                print(f"   Nível {numero}: {', '.join(nivel)}")
+            print()
+            paralelo = True
+        else:
+            # Uma tabela por nível: exatamente a ORDEM_INSERCAO, na conexão principal
+            niveis = [[tabela] for tabela in ORDEM_INSERCAO]
+            paralelo = False
+        
+        resultados = {}
+        for nivel in niveis:
+            if paralelo and len(nivel) > 1:
+                resultados.update(carregar_nivel_em_paralelo(pool, nivel, opcoes.workers, nomes_abas,
+                                                             abas_excel, arquivo_excel, opcoes,
+                                                             tabelas_erro, catalogo))
+            else:
+                for tabela_banco in nivel:
+                    resultados[tabela_banco] = carregar_tabela(conn, tabela_banco, nomes_abas, abas_excel,
+                                                               workbook, opcoes, tabelas_erro, catalogo)
+            # Na carga atômica o primeiro erro encerra a carga (a transação será desfeita)
+            if opcoes.atomico and any(resultados[t][0] == 'erro' for t in nivel):
+                break
+        
+        if opcoes.atomico:
+            houve_erro = any(status == 'erro' for status, _ in resultados.values())
+            with medir_etapa(None, 'finalização'):
+                confirmada = finalizar_carga_atomica(conn, houve_erro, indices_removidos)
+            if not confirmada:
+                # Nada foi gravado: as tabelas carregadas passam a contar como erro
+                resultados = {tabela: ('erro' if status == 'processada' else status, 0)
+                              for tabela, (status, _) in resultados.items()}
+            elif opcoes.incremental:
+                gravar_linhas_pendentes(caminho_estado(CONFIG_BANCO['database']))
+            print()
+        
+        # Totais sempre na ORDEM_INSERCAO, qualquer que tenha sido a ordem de término
+        for tabela_banco in ORDEM_INSERCAO:
+            status, linhas_inseridas = resultados.get(tabela_banco, ('pulada', 0))
+            if status == 'processada':
                 total_inserido += linhas_inseridas
                 tabelas_processadas.append(tabela_banco)
-            except Exception as e:
-                print(f"   ❌ Erro: {e}")
+            elif status == 'erro' and tabela_banco not in tabelas_erro:
                 tabelas_erro.append(tabela_banco)
-            
-            print()
         
         # Resumo final
         print("=" * 100)
@@ -826,17 +2543,40 @@ def main():
         if tabelas_erro:
             print(f"❌ Tabelas com erro: {len(tabelas_erro)}")
             print(f"   {', '.join(tabelas_erro)}")
-        print(f"📊 Total de registros inseridos: {total_inserido}")
+        segundos_totais = time.perf_counter() - inicio_carga
+        vazao = total_inserido / segundos_totais if segundos_totais else 0
+        print(f"📊 Total de registros inseridos: {total_inserido} ({vazao:,.0f} registros/s)")
+        falhas_datas = resumo_falhas_datas()
+        if falhas_datas:
+            print(f"📅 Datas não reconhecidas (gravadas como NULL):")
+            for tabela, coluna, linhas in falhas_datas:
+                print(f"   {tabela}.{coluna}: {linhas}")
+        duplicatas = resumo_deduplicacao()
+        if duplicatas:
+            print(f"🧬 Linhas repetidas na planilha (não enviadas ao banco):")
+            for tabela, exatas, conflitos in duplicatas:
+                print(f"   {tabela}: {exatas} idênticas, {conflitos} com conteúdo diferente (quarentena)")
+        imprimir_metricas(segundos_totais)
+        salvar_metricas(opcoes, arquivo_excel, segundos_totais, total_inserido, tabelas_erro)
         print()
         
+    except StagingEmUso as e:
+        print(f"❌ Staging em uso: {e}")
+        conn.rollback()
     except Exception as e:
         print(f"❌ Erro geral: {e}")
         conn.rollback()
     finally:
-        conn.close()
+        if workbook is not None:
+            workbook.close()
+        pool.putconn(conn)
+        fechar_pool()
+        encerrar_motor_asyncpg()
         print("✅ Conexão fechada")
 
 if __name__ == "__main__":
+    opcoes = parse_argumentos()
+    
     # Verificar se senha foi configurada
     if not CONFIG_BANCO['password']:
         print("⚠️  ATENÇÃO: Configure a senha do banco na linha 20 do script!")
@@ -846,5 +2586,5 @@ if __name__ == "__main__":
         if resposta not in ['s', 'sim', 'y', 'yes']:
             sys.exit(0)
     
-    main()
+    main(opcoes)
 
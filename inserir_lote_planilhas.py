@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+CARGA EM LOTE DE VÁRIAS PLANILHAS
+Insere no PostgreSQL várias planilhas com o mesmo layout de abas
+(ex: planilhas regionais recebidas no dia)
+
+Nível a nível do grafo de FKs:
+1. Leitura, mapeamento de colunas e limpeza das tabelas do nível em cada
+   planilha, em paralelo, em processos separados (ProcessPoolExecutor)
+2. Carga no banco por poucas conexões: uma tabela só é carregada depois que
+   suas tabelas pai foram carregadas a partir de TODAS as planilhas. Tabelas
+   do mesmo nível carregam ao mesmo tempo, uma conexão por tabela, com as
+   planilhas sempre na ordem do manifesto (em PK repetida vence a primeira)
+
+O processo principal só guarda os dados limpos de um nível por vez; cada
+planilha é relida a cada nível (com o cache Arrow, sem reprocessar o XLSX).
+
+A deduplicação (PK e UNIQUEs repetidas) também fica para a carga: cada
+tabela é deduplicada em todas as planilhas juntas, na ordem do manifesto.
+
+Uso:
+    python inserir_lote_planilhas.py --diretorio planilhas_regionais/
+    python inserir_lote_planilhas.py --manifesto lista.txt --processos 4 --conexoes 2
+    python inserir_lote_planilhas.py norte.xlsx sul.xlsx
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from carga_asyncpg import asyncpg_disponivel, encerrar_motor_asyncpg, iniciar_motor_asyncpg
+from catalogo_banco import carregar_catalogo
+from conexao_banco import (
+    adicionar_argumentos_conexao,
+    conexao_do_pool,
+    configurar_sessao,
+    descrever_sessao,
+    fechar_pool,
+    obter_pool,
+)
+from inserir_dados_banco import (
+    ID_EXECUCAO,
+    MODO_CARGA_PADRAO,
+    MODOS_CARGA,
+    MOTOR_PADRAO,
+    MOTORES,
+    ORDEM_INSERCAO,
+    SaidaPorThread,
+    configurar_quarentena,
+    encontrar_aba,
+    deduplicar_lote,
+    executar_insercao,
+    ler_planilha,
+    liberar_deduplicacao,
+    mapear_colunas_planilha_para_banco,
+    obter_niveis_dependencia,
+    preparar_insercao,
+    resumo_deduplicacao,
+    semear_chaves_referenciadas,
+    validar_fks_do_lote,
+    zerar_deduplicacao,
+)
+from quarentena import FORMATO_QUARENTENA_PADRAO, FORMATOS_QUARENTENA
+
+# ============================================
+# LISTA DE PLANILHAS
+# ============================================
+
+def listar_planilhas(diretorio=None, manifesto=None, arquivos=None):
+    """Monta a lista ordenada de planilhas a carregar
+
+    manifesto: arquivo texto com um caminho por linha (linhas vazias e
+    iniciadas por # são ignoradas; caminhos relativos ao manifesto).
+    """
+    planilhas = [Path(a) for a in (arquivos or [])]
+    if diretorio:
+        planilhas += sorted(p for p in Path(diretorio).glob('*.xlsx') if not p.name.startswith('~$'))
+    if manifesto:
+        base = Path(manifesto).parent
+        with open(manifesto, 'r', encoding='utf-8') as f:
+            for linha in f:
+                linha = linha.strip()
+                if linha and not linha.startswith('#'):
+                    caminho = Path(linha)
+                    planilhas.append(caminho if caminho.is_absolute() else base / caminho)
+    # Sem repetir a mesma planilha (mantendo a primeira ocorrência)
+    vistas = set()
+    unicas = []
+    for planilha in planilhas:
+        chave = planilha.resolve()
+        if chave not in vistas:
+            vistas.add(chave)
+            unicas.append(planilha)
+    return unicas
+
+# ============================================
+# ETAPA 1: LEITURA E LIMPEZA (PROCESSOS)
+# ============================================
+
+def preparar_planilha(arquivo_excel, catalogo, usar_cache, tabelas=ORDEM_INSERCAO):
+    """Lê, mapeia e limpa as abas das tabelas de uma planilha (roda em um processo do pool)
+
+    A pré-validação de FKs e a deduplicação ficam para a etapa de carga, que
+    conhece as chaves de todas as planilhas. Retorna um dict com os lotes por tabela, o log
+    da planilha e o tempo gasto. Os lotes vêm sem 'dados': as tuplas são
+    montadas na carga a partir das colunas limpas (restringir_lote), então
+    as linhas atravessam o pickle uma vez só.
+    """
+    inicio = time.perf_counter()
+    origem = Path(arquivo_excel).stem
+    log = io.StringIO()
+    resultado = {'arquivo': str(arquivo_excel), 'lotes': {}, 'registros': 0, 'erro': None}
+    with contextlib.redirect_stdout(log):
+        try:
+            abas_excel = ler_planilha(arquivo_excel, usar_cache=usar_cache, tabelas=tabelas)
+            nomes_abas = list(abas_excel.keys())
+            for tabela_banco in tabelas:
+                aba = encontrar_aba(tabela_banco, nomes_abas)
+                info_tabela = catalogo.get(tabela_banco)
+                if aba is None or info_tabela is None or abas_excel[aba].empty:
+                    continue
+                df = abas_excel[aba]
+                resultado['registros'] += len(df)
+                print(f"📊 {tabela_banco} (aba: {aba}): {len(df)} registros")
+                colunas_banco = [c['nome'] for c in info_tabela['colunas']]
+                mapeamento = mapear_colunas_planilha_para_banco(df, colunas_banco)
+                if not mapeamento:
+                    print(f"   ⚠️  Nenhuma coluna mapeada (pulando)")
+                    continue
+                # FKs validadas e duplicatas removidas depois, na carga
+                lote = preparar_insercao(None, tabela_banco, df, mapeamento, dict(info_tabela, fks=[]),
+                                         origem=origem, aba=aba, deduplicar=False)
+                if lote is not None:
+                    del lote['dados']
+                    resultado['lotes'][tabela_banco] = lote
+        except Exception as e:
+            print(f"❌ Erro: {e}")
+            resultado['erro'] = str(e)
+    resultado['log'] = log.getvalue()
+    resultado['segundos'] = time.perf_counter() - inicio
+    return resultado
+
+# ============================================
+# ETAPA 2: CARGA (CONEXÕES DO POOL)
+# ============================================
+
+def carregar_tabela_de_todas(conn, tabela_banco, preparadas, info_tabela, modo_carga, motor='psycopg2'):
+    """Carrega uma tabela a partir de todas as planilhas, na ordem do manifesto
+
+    Retorna {arquivo: linhas_inseridas}.
+    """
+    inseridas_por_arquivo = {}
+    for preparada in preparadas:
+        lote = preparada['lotes'].get(tabela_banco)
+        if lote is None:
+            continue
+        print(f"📊 {tabela_banco} ← {Path(preparada['arquivo']).name}")
+        lote = validar_fks_do_lote(conn, lote, info_tabela)
+        if lote is not None:
+            lote = deduplicar_lote(lote, info_tabela)
+        inseridas = executar_insercao(conn, lote, modo_carga, motor=motor) if lote is not None else 0
+        print(f"   ✅ {inseridas} registros inseridos")
+        inseridas_por_arquivo[preparada['arquivo']] = inseridas
+    liberar_deduplicacao(tabela_banco)
+    return inseridas_por_arquivo
+
+def carregar_nivel(pool, conexoes, catalogo, preparadas, nivel, modo_carga, motor='psycopg2'):
+    """Carrega as tabelas de um nível de FK, uma conexão por tabela
+
+    Retorna ({arquivo: linhas_inseridas}, [tabelas com erro]).
+    """
+    saida = SaidaPorThread(sys.stdout)
+    inseridas = {p['arquivo']: 0 for p in preparadas}
+    tabelas_erro = []
+
+    def tarefa(tabela_banco):
+        saida.iniciar_captura()
+        try:
+            with conexao_do_pool(pool) as conn:
+                resultado = carregar_tabela_de_todas(conn, tabela_banco, preparadas,
+                                                     catalogo[tabela_banco], modo_carga, motor)
+        except Exception as e:
+            print(f"   ❌ Erro em {tabela_banco}: {e}")
+            resultado = None
+        return resultado, saida.finalizar_captura()
+
+    sys_stdout_anterior = sys.stdout
+    sys.stdout = saida
+    try:
+        with ThreadPoolExecutor(max_workers=conexoes) as executor:
+            futuros = {tabela: executor.submit(tarefa, tabela) for tabela in nivel}
+            for tabela in nivel:
+                resultado, log = futuros[tabela].result()
+                saida.saida_original.write(log)
+                if resultado is None:
+                    tabelas_erro.append(tabela)
+                    continue
+                for arquivo, linhas in resultado.items():
+                    inseridas[arquivo] += linhas
+    finally:
+        sys.stdout = sys_stdout_anterior
+
+    return inseridas, tabelas_erro
+
+# ============================================
+# FUNÇÃO PRINCIPAL
+# ============================================
+
+def parse_argumentos(argv=None):
+    """Lê as opções de linha de comando"""
+    parser = argparse.ArgumentParser(description="Insere várias planilhas XLSX no PostgreSQL")
+    parser.add_argument('arquivos', nargs='*', help="planilhas XLSX (além de --diretorio/--manifesto)")
+    parser.add_argument('--diretorio', help="carrega todos os *.xlsx do diretório (em ordem alfabética)")
+    parser.add_argument('--manifesto', help="arquivo texto com um caminho de planilha por linha")
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1,
+                        help="processos de leitura/limpeza (padrão: número de CPUs)")
+    parser.add_argument('--conexoes', type=int, default=2,
+                        help="conexões de carga: tabelas do mesmo nível de FK carregam em paralelo (padrão: 2)")
+    parser.add_argument('--modo-carga', choices=MODOS_CARGA, default=MODO_CARGA_PADRAO)
+    parser.add_argument('--motor', choices=MOTORES, default=MOTOR_PADRAO,
+                        help=f"motor da carga: psycopg2 ou asyncpg (COPY binário, ignora --modo-carga) "
+                             f"(padrão: {MOTOR_PADRAO})")
+    parser.add_argument('--sem-cache-catalogo', action='store_true')
+    parser.add_argument('--sem-cache-planilha', action='store_true')
+    parser.add_argument('--formato-quarentena', choices=FORMATOS_QUARENTENA, default=FORMATO_QUARENTENA_PADRAO)
+    adicionar_argumentos_conexao(parser)
+    opcoes = parser.parse_args(argv)
+    if not (opcoes.arquivos or opcoes.diretorio or opcoes.manifesto):
+        parser.error("informe as planilhas, --diretorio ou --manifesto")
+    return opcoes
+
+def main(opcoes=None):
+    if opcoes is None:
+        opcoes = parse_argumentos()
+
+    print("=" * 100)
+    print("CARGA EM LOTE DE PLANILHAS NO POSTGRESQL")
+    print("=" * 100)
+
+    planilhas = listar_planilhas(opcoes.diretorio, opcoes.manifesto, opcoes.arquivos)
+    inexistentes = [p for p in planilhas if not p.exists()]
+    if inexistentes:
+        print(f"❌ Planilhas não encontradas: {', '.join(str(p) for p in inexistentes)}")
+        sys.exit(1)
+    if not planilhas:
+        print("❌ Nenhuma planilha encontrada")
+        sys.exit(1)
+    print(f"📂 {len(planilhas)} planilhas | {opcoes.processos} processos | {opcoes.conexoes} conexões")
+    configurar_sessao(opcoes)
+    if opcoes.motor == 'asyncpg' and not asyncpg_disponivel():
+        print("ℹ️  asyncpg não instalado: motor psycopg2 (pip install asyncpg)")
+        opcoes.motor = 'psycopg2'
+    formato_quarentena = configurar_quarentena(opcoes.formato_quarentena)
+    print(f"🔌 Sessão: {descrever_sessao()}" + (" | motor asyncpg (COPY binário)" if opcoes.motor == 'asyncpg' else ""))
+    print()
+
+    inicio_total = time.perf_counter()
+    # Conexão principal e de carga no mesmo pool (conexao_banco)
+    pool = obter_pool(opcoes.conexoes + 1)
+    conn = pool.getconn()
+    try:
+        catalogo, _ = carregar_catalogo(conn, ORDEM_INSERCAO, usar_cache=not opcoes.sem_cache_catalogo)
+        conn.commit()
+        niveis = obter_niveis_dependencia(catalogo, [t for t in ORDEM_INSERCAO if t in catalogo])
+        semear_chaves_referenciadas(conn, catalogo)
+        zerar_deduplicacao()
+
+        # Situação de cada planilha, somada nível a nível (a ordem é a do manifesto)
+        preparadas = [{'arquivo': str(p), 'registros': 0, 'erro': None, 'segundos': 0.0} for p in planilhas]
+        inseridas = {p['arquivo']: 0 for p in preparadas}
+        tabelas_erro = []
+        segundos_carga = 0.0
+        # Formato e ID da execução passados a cada processo de limpeza: no spawn
+        # (Windows) eles importam o módulo de novo e não herdam os do principal
+        with ProcessPoolExecutor(max_workers=opcoes.processos, initializer=configurar_quarentena,
+                                 initargs=(formato_quarentena, None, ID_EXECUCAO)) as executor:
+            for numero, nivel in enumerate(niveis, 1):
+                # 1. Leitura e limpeza das tabelas do nível em paralelo (processos)
+                print("=" * 100)
+                print(f"NÍVEL {numero} DE {len(niveis)}: {', '.join(nivel)}")
+                print("=" * 100)
+                print("🔍 Lendo e limpando as planilhas...")
+                validas = [p for p in preparadas if not p['erro']]
+                futuros = {executor.submit(preparar_planilha, p['arquivo'], catalogo,
+                                           not opcoes.sem_cache_planilha, nivel): p for p in validas}
+                do_nivel = {}
+                for futuro in as_completed(futuros):
+                    preparada = futuros[futuro]
+                    try:
+                        resultado = futuro.result()
+                    except Exception as e:
+                        resultado = {'arquivo': preparada['arquivo'], 'lotes': {}, 'registros': 0,
+                                     'erro': str(e), 'log': '', 'segundos': 0.0}
+                    preparada['registros'] += resultado['registros']
+                    preparada['segundos'] += resultado['segundos']
+                    preparada['erro'] = resultado['erro']
+                    do_nivel[preparada['arquivo']] = resultado
+                    situacao = "❌" if resultado['erro'] else "✅"
+                    print(f"   {situacao} {Path(preparada['arquivo']).name}: {resultado['registros']} registros "
+                          f"({resultado['segundos']:.2f}s)")
+                # Ordem do manifesto, independente da ordem de término dos processos
+                do_nivel = [do_nivel[p['arquivo']] for p in validas]
+                print()
+                for resultado in do_nivel:
+                    if resultado['log'].strip():
+                        print(f"{'─' * 100}\n📄 {Path(resultado['arquivo']).name}\n{'─' * 100}")
+                        print(resultado['log'])
+
+                # 2. Carga do nível com poucas conexões
+                if opcoes.motor == 'asyncpg':
+                    # Só agora: a thread do event loop não pode existir antes do fork dos
+                    # processos de limpeza (com fork, todos são criados no primeiro submit)
+                    iniciar_motor_asyncpg(opcoes.conexoes)
+                inicio_carga = time.perf_counter()
+                inseridas_nivel, erros_nivel = carregar_nivel(pool, opcoes.conexoes, catalogo,
+                                                              [r for r in do_nivel if not r['erro']], nivel,
+                                                              opcoes.modo_carga, opcoes.motor)
+                segundos_carga += time.perf_counter() - inicio_carga
+                for arquivo, linhas in inseridas_nivel.items():
+                    inseridas[arquivo] += linhas
+                tabelas_erro += erros_nivel
+                # Os dados do nível não são mais necessários
+                do_nivel = futuros = resultado = None
+    finally:
+        pool.putconn(conn)
+        fechar_pool()
+        encerrar_motor_asyncpg()
+
+    segundos_totais = time.perf_counter() - inicio_total
+    print()
+    print("=" * 100)
+    print("RESUMO POR PLANILHA")
+    print("=" * 100)
+    print(f"{'PLANILHA':40s} {'SITUAÇÃO':10s} {'REGISTROS':>10s} {'INSERIDOS':>10s} {'LEITURA':>9s} {'REG/S':>9s}")
+    print("-" * 93)
+    for preparada in preparadas:
+        nome = Path(preparada['arquivo']).name[:40]
+        situacao = 'erro' if preparada['erro'] else 'ok'
+        linhas = inseridas.get(preparada['arquivo'], 0)
+        vazao = preparada['registros'] / preparada['segundos'] if preparada['segundos'] else 0
+        print(f"{nome:40s} {situacao:10s} {preparada['registros']:10d} {linhas:10d} "
+              f"{preparada['segundos']:8.2f}s {vazao:9,.0f}")
+    total_inserido = sum(inseridas.values())
+    print("-" * 93)
+    if tabelas_erro:
+        print(f"❌ Tabelas com erro: {', '.join(tabelas_erro)}")
+    for tabela, exatas, conflitos in resumo_deduplicacao():
+        print(f"🧬 {tabela}: {exatas} linhas repetidas idênticas, {conflitos} com conteúdo diferente (quarentena)")
+    print(f"📊 Total de registros inseridos: {total_inserido} em {segundos_totais:.2f}s "
+          f"(carga: {segundos_carga:.2f}s, {total_inserido / segundos_carga if segundos_carga else 0:,.0f} registros/s)")
+    if any(p['erro'] for p in preparadas) or tabelas_erro:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
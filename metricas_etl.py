@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+MÉTRICAS DA CARGA (ETL)
+Tempo, linhas, bytes e idas ao banco por tabela e por etapa da carga
+
+Etapas medidas:
+  leitura      XLSX inteiro (ou cache Arrow) antes da carga
+  perfil       perfil das abas (perfil_planilha)
+  preparação   catálogo, chaves referenciadas e início da carga atômica
+  extração     blocos lidos da aba (bytes = memória ocupada pelo bloco)
+  mapeamento   mapear_colunas_planilha_para_banco
+  limpeza      preparar_insercao (limpeza, pré-validação de FKs, deduplicação, incremental)
+  carga        executar_insercao (bytes = SQL/COPY enviados ao banco; com
+               --staging, o COPY para a staging)
+  bisseção     reenvio linha a linha de um lote que falhou (parte da carga)
+  validação    --staging: tipos, FKs e UNIQUEs verificados na staging, no servidor
+  mesclagem    --staging: INSERT ... SELECT da staging na tabela final (um
+               bloco por faixa da PK; faixas em paralelo somam seus tempos)
+  finalização  verificação das FKs, índices e COMMIT da carga atômica
+
+Etapas aninhadas também somam na etapa de fora: o tempo, os bytes e as idas
+ao banco da bisseção já estão incluídos na carga da mesma tabela.
+
+As idas ao banco são contadas pelas conexões abertas com
+connection_factory=ConexaoMedida: cada execute, COPY, COMMIT e ROLLBACK conta
+uma vez para as etapas ativas na thread que fez a chamada.
+
+Saída: uma linha JSON por (tabela, etapa) acrescentada a um arquivo
+JSON-lines a cada execução, e opcionalmente um arquivo .prom no formato do
+textfile collector do node_exporter (Prometheus).
+"""
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import psycopg2.extensions
+
+ETAPAS = ['leitura', 'perfil', 'preparação', 'extração', 'mapeamento', 'limpeza', 'carga', 'bisseção',
+          'validação', 'mesclagem', 'finalização']
+ETAPAS_ANINHADAS = {'bisseção'}
+
+ARQUIVO_METRICAS_PADRAO = os.path.join('metricas', 'carga.jsonl')
+
+# {(tabela, etapa): {'blocos', 'linhas', 'segundos', 'bytes', 'idas_ao_banco'}}
+# tabela None = etapa da execução inteira (leitura, preparação, finalização...)
+METRICAS = {}
+TRAVA_METRICAS = threading.Lock()
+
+# Pilha de etapas ativas em cada thread (ver medir_etapa)
+CONTEXTO = threading.local()
+
+def nova_metrica():
+    return {'blocos': 0, 'linhas': 0, 'segundos': 0.0, 'bytes': 0, 'idas_ao_banco': 0}
+
+def zerar_metricas():
+    """Zera as métricas no início de uma execução"""
+    with TRAVA_METRICAS:
+        METRICAS.clear()
+
+def registrar_metrica(tabela, etapa, linhas=0, segundos=0.0, blocos=1, bytes_=0, idas_ao_banco=0):
+    """Soma uma medição ao total de (tabela, etapa)"""
+    with TRAVA_METRICAS:
+        metrica = METRICAS.setdefault((tabela, etapa), nova_metrica())
+        metrica['blocos'] += blocos
+        metrica['linhas'] += linhas
+        metrica['segundos'] += segundos
+        metrica['bytes'] += bytes_
+        metrica['idas_ao_banco'] += idas_ao_banco
+
+def pilha_de_etapas():
+    if not hasattr(CONTEXTO, 'pilha'):
+        CONTEXTO.pilha = []
+    return CONTEXTO.pilha
+
+@contextlib.contextmanager
+def medir_etapa(tabela, etapa, blocos=1):
+    """Mede o bloco 'with' como uma execução da etapa
+
+    Devolve um dict em que o chamador informa 'linhas' e 'bytes' (os bytes
+    enviados ao banco são somados sozinhos). A medição é registrada mesmo
+    se o bloco terminar com exceção.
+    """
+    medicao = nova_metrica()
+    medicao['blocos'] = blocos
+    pilha = pilha_de_etapas()
+    pilha.append(medicao)
+    inicio = time.perf_counter()
+    try:
+        yield medicao
+    finally:
+        medicao['segundos'] = time.perf_counter() - inicio
+        pilha.pop()
+        registrar_metrica(tabela, etapa, medicao['linhas'], medicao['segundos'], medicao['blocos'],
+                          medicao['bytes'], medicao['idas_ao_banco'])
+
+def contar_ida_ao_banco(bytes_enviados=0):
+    """Soma uma ida ao banco a todas as etapas ativas na thread atual"""
+    pilha = pilha_de_etapas()
+    if not pilha:
+        registrar_metrica(None, 'outros', blocos=0, bytes_=bytes_enviados, idas_ao_banco=1)
+        return
+    for medicao in pilha:
+        medicao['idas_ao_banco'] += 1
+        medicao['bytes'] += bytes_enviados
+
+def bytes_do_bloco(df):
+    """Memória ocupada pelo bloco lido (strings incluídas)"""
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+# ============================================
+# CONTAGEM DAS IDAS AO BANCO
+# ============================================
+
+class CursorMedido(psycopg2.extensions.cursor):
+    """Cursor que conta cada comando enviado e o tamanho do SQL"""
+
+    def execute(self, query, vars=None):
+        try:
+            return super().execute(query, vars)
+        finally:
+            # self.query é o SQL final, já com os parâmetros (None se nem chegou a ser montado)
+            contar_ida_ao_banco(len(self.query or b''))
+
+    def executemany(self, query, vars_list):
+        # O psycopg2 envia um comando por item da lista
+        vars_list = list(vars_list)
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            for _ in vars_list:
+                contar_ida_ao_banco(len(query))
+
+    def copy_expert(self, sql, file, size=8192):
+        inicio = file.tell() if hasattr(file, 'tell') else 0
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            fim = file.tell() if hasattr(file, 'tell') else inicio
+            contar_ida_ao_banco(len(sql) + fim - inicio)
+
+class ConexaoMedida(psycopg2.extensions.connection):
+    """Conexão cujos cursores e COMMIT/ROLLBACK entram nas métricas"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = CursorMedido
+
+    def commit(self):
+        try:
+            return super().commit()
+        finally:
+            contar_ida_ao_banco()
+
+    def rollback(self):
+        try:
+            return super().rollback()
+        finally:
+            contar_ida_ao_banco()
+
+# ============================================
+# RELATÓRIOS
+# ============================================
+
+def totais_por_etapa():
+    """{etapa: métrica} somando todas as tabelas"""
+    totais = {}
+    with TRAVA_METRICAS:
+        for (_, etapa), metrica in METRICAS.items():
+            total = totais.setdefault(etapa, nova_metrica())
+            for campo, valor in metrica.items():
+                total[campo] += valor
+    return totais
+
+def linhas_por_segundo(metrica):
+    return metrica['linhas'] / metrica['segundos'] if metrica['segundos'] else 0.0
+
+def imprimir_metricas(segundos_totais):
+    """Tempo, vazão, bytes e idas ao banco de cada etapa (todas as tabelas)"""
+    totais = totais_por_etapa()
+    print(f"⏱️  Etapas da carga (tempo total: {segundos_totais:.2f}s)")
+    print(f"   {'ETAPA':12s} {'BLOCOS':>7s} {'LINHAS':>10s} {'TEMPO':>9s} {'UTILIZAÇÃO':>11s} "
+          f"{'LINHAS/S':>10s} {'MB':>9s} {'IDAS':>7s}")
+    for etapa in ETAPAS + sorted(set(totais) - set(ETAPAS)):
+        if etapa not in totais:
+            continue
+        metrica = totais[etapa]
+        utilizacao = metrica['segundos'] / segundos_totais * 100 if segundos_totais else 0
+        print(f"   {etapa:12s} {metrica['blocos']:7d} {metrica['linhas']:10d} {metrica['segundos']:8.2f}s "
+              f"{utilizacao:10.1f}% {linhas_por_segundo(metrica):10,.0f} "
+              f"{metrica['bytes'] / (1024 * 1024):9.2f} {metrica['idas_ao_banco']:7d}")
+
+def registros_de_metricas(id_execucao, segundos_totais, linhas_inseridas, extras=None):
+    """Uma linha por (tabela, etapa) e uma linha com o total da execução"""
+    momento = datetime.now().isoformat(timespec='seconds')
+    base = {'execucao': id_execucao, 'momento': momento, **(extras or {})}
+    registros = []
+    with TRAVA_METRICAS:
+        itens = sorted(METRICAS.items(), key=lambda item: (item[0][0] or '', item[0][1]))
+    for (tabela, etapa), metrica in itens:
+        registros.append({**base, 'tabela': tabela, 'etapa': etapa, **metrica,
+                          'segundos': round(metrica['segundos'], 6),
+                          'linhas_por_segundo': round(linhas_por_segundo(metrica), 1)})
+    # Etapas aninhadas já estão somadas na etapa de fora
+    idas = sum(metrica['idas_ao_banco'] for etapa, metrica in totais_por_etapa().items()
+               if etapa not in ETAPAS_ANINHADAS)
+    registros.append({**base, 'tabela': None, 'etapa': 'total', 'blocos': 0,
+                      'linhas': linhas_inseridas, 'segundos': round(segundos_totais, 6),
+                      'bytes': None, 'idas_ao_banco': idas,
+                      'linhas_por_segundo': round(linhas_inseridas / segundos_totais, 1)
+                                            if segundos_totais else 0.0})
+    return registros
+
+def gravar_jsonl(caminho, registros):
+    """Acrescenta os registros ao arquivo JSON-lines (histórico de execuções)"""
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    with open(caminho, 'a', encoding='utf-8') as f:
+        for registro in registros:
+            f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+def escapar_rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def gravar_prometheus(caminho, registros):
+    """Grava a última execução no formato do textfile collector do node_exporter
+
+    O arquivo é escrito em um temporário e renomeado, para o collector nunca
+    ler um arquivo pela metade.
+    """
+    series = {
+        'etl_etapa_segundos': ('gauge', "Tempo da etapa na última execução", 'segundos'),
+        'etl_etapa_linhas': ('gauge', "Linhas processadas pela etapa na última execução", 'linhas'),
+        'etl_etapa_bytes': ('gauge', "Bytes lidos ou enviados ao banco pela etapa na última execução", 'bytes'),
+        'etl_etapa_idas_ao_banco': ('gauge', "Comandos enviados ao banco pela etapa na última execução",
+                                    'idas_ao_banco'),
+    }
+    linhas = []
+    etapas = [r for r in registros if r['etapa'] != 'total']
+    for nome, (tipo, ajuda, campo) in series.items():
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+        for registro in etapas:
+            rotulos = f'tabela="{escapar_rotulo(registro["tabela"] or "")}",etapa="{escapar_rotulo(registro["etapa"])}"'
+            linhas.append(f"{nome}{{{rotulos}}} {registro[campo]}")
+
+    total = next(r for r in registros if r['etapa'] == 'total')
+    linhas += [
+        "# HELP etl_execucao_segundos Duração total da última execução",
+        "# TYPE etl_execucao_segundos gauge",
+        f"etl_execucao_segundos {total['segundos']}",
+        "# HELP etl_execucao_linhas_inseridas Registros inseridos na última execução",
+        "# TYPE etl_execucao_linhas_inseridas gauge",
+        f"etl_execucao_linhas_inseridas {total['linhas']}",
+        "# HELP etl_execucao_fim_timestamp_segundos Momento do fim da última execução (epoch)",
+        "# TYPE etl_execucao_fim_timestamp_segundos gauge",
+        f"etl_execucao_fim_timestamp_segundos {time.time():.0f}",
+    ]
+
+    diretorio = os.path.dirname(caminho) or '.'
+    os.makedirs(diretorio, exist_ok=True)
+    # Nome único por gravação: duas execuções podem exportar para o mesmo arquivo
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=diretorio, suffix='.tmp', delete=False) as f:
+        f.write('\n'.join(linhas) + '\n')
+    # NamedTemporaryFile cria com 0600; o coletor (node_exporter) costuma rodar com outro usuário
+    os.chmod(f.name, 0o644)
+    os.replace(f.name, caminho)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+PERFIL DAS ABAS DA PLANILHA
+Calcula, em uma passada vetorizada por aba, a proporção de nulos, a
+cardinalidade e o tipo inferido de cada coluna, e grava tudo em JSON
+
+Modos:
+  desligado  nada é calculado
+  amostra    perfil de uma amostra aleatória de até N linhas por aba (padrão)
+  completo   perfil de todas as linhas
+
+No modo amostra as contagens se referem às linhas amostradas
+('linhas_perfiladas'); a proporção de nulos é uma estimativa e a
+cardinalidade é um limite inferior.
+"""
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+MODOS_PERFIL = ['desligado', 'amostra', 'completo']
+MODO_PERFIL_PADRAO = 'amostra'
+TAMANHO_AMOSTRA_PADRAO = 10000
+DIRETORIO_PERFIS = 'perfis'
+
+def perfilar_aba(df, tamanho_amostra=None):
+    """Perfil de uma aba: nulos, cardinalidade, dtype e tipo inferido por coluna"""
+    perfilado = df
+    if tamanho_amostra is not None and len(df) > tamanho_amostra:
+        perfilado = df.sample(n=tamanho_amostra, random_state=0).sort_index()
+
+    # Uma operação por métrica para a aba inteira (sem percorrer célula a célula)
+    nulos = perfilado.isna().sum()
+    cardinalidade = perfilado.nunique(dropna=True)
+    total = len(perfilado)
+
+    colunas = []
+    for posicao, nome in enumerate(perfilado.columns):
+        serie = perfilado.iloc[:, posicao]
+        exemplos = serie.dropna().head(3)
+        # Coluna Categorical (categorizar_colunas): o tipo é o das categorias
+        valores = serie.cat.categories if isinstance(serie.dtype, pd.CategoricalDtype) else serie
+        colunas.append({
+            'nome': str(nome),
+            'dtype': str(serie.dtype),
+            'tipo_inferido': pd.api.types.infer_dtype(valores, skipna=True),
+            'nulos': int(nulos.iloc[posicao]),
+            'razao_nulos': round(float(nulos.iloc[posicao]) / total, 4) if total else 0.0,
+            'cardinalidade': int(cardinalidade.iloc[posicao]),
+            'exemplos': [str(valor)[:50] for valor in exemplos],
+        })
+
+    return {
+        'linhas': len(df),
+        'linhas_perfiladas': total,
+        'num_colunas': len(df.columns),
+        'colunas': colunas,
+    }
+
+def perfilar_planilha(abas_excel, modo=MODO_PERFIL_PADRAO, tamanho_amostra=TAMANHO_AMOSTRA_PADRAO):
+    """Perfil de todas as abas, ou None com modo 'desligado'"""
+    if modo == 'desligado':
+        return None
+    amostra = tamanho_amostra if modo == 'amostra' else None
+    return {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'modo': modo,
+        'tamanho_amostra': amostra,
+        'abas': {str(aba): perfilar_aba(df, amostra) for aba, df in abas_excel.items()},
+    }
+
+def salvar_perfil(perfil, arquivo_excel, diretorio=DIRETORIO_PERFIS):
+    """Grava o perfil em perfis/<planilha>_<data_hora>.json e retorna o caminho"""
+    os.makedirs(diretorio, exist_ok=True)
+    perfil = dict(perfil, arquivo=str(arquivo_excel))
+    carimbo = perfil['gerado_em'].replace(':', '').replace('-', '')
+    caminho = os.path.join(diretorio, f"{Path(arquivo_excel).stem}_{carimbo}.json")
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(perfil, f, ensure_ascii=False, indent=2)
+    return caminho
+
+def imprimir_resumo_perfil(perfil):
+    """Uma linha por aba: dimensões e colunas com mais nulos"""
+    for aba, dados in perfil['abas'].items():
+        com_nulos = sorted((c for c in dados['colunas'] if c['nulos']),
+                           key=lambda c: c['razao_nulos'], reverse=True)
+        destaque = ', '.join(f"{c['nome']} {c['razao_nulos']:.0%}" for c in com_nulos[:3])
+        print(f"   {aba:25s} {dados['linhas']:7d} linhas × {dados['num_colunas']:2d} colunas"
+              + (f" | nulos: {destaque}" if destaque else ""))
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+QUARENTENA DAS LINHAS REJEITADAS
+Toda linha da planilha que a carga deixa de gravar vai para
+rejeitados/<execução>/[<planilha>/]<tabela>.csv (ou .parquet), com a origem,
+o código do motivo e os valores já limpos de cada coluna da tabela
+
+Colunas de controle (as demais são as colunas da tabela no banco):
+  _planilha   planilha de origem
+  _aba        aba de origem
+  _linha      linha na aba (índice da linha + 1, como nos logs da carga)
+  _codigo     motivo (ver CODIGOS_QUARENTENA)
+  _restricao  restrição violada (ou coluna:<nome>)
+  _mensagem   mensagem do banco ou da validação
+
+Os valores são gravados como texto, do jeito que a limpeza da carga os
+devolve; reprocessar_quarentena.py os reenvia à carga depois que a planilha
+ou as tabelas pai forem corrigidas.
+
+O Parquet exige o pyarrow (opcional, como no cache_planilha). Em CSV as
+linhas são acrescentadas ao mesmo arquivo; em Parquet cada gravação vira uma
+parte <tabela>.<n>.parquet.
+"""
+import csv
+import glob
+import os
+import threading
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+FORMATOS_QUARENTENA = ['csv', 'parquet']
+FORMATO_QUARENTENA_PADRAO = 'csv'
+
+CODIGOS_QUARENTENA = {
+    'nulo_obrigatorio': "NULL em coluna NOT NULL (não enviada ao banco)",
+    'fk_inexistente': "FK para chave que não existe na tabela pai",
+    'duplicada': "PK ou UNIQUE já usada por outra linha",
+    'integridade': "outra restrição do banco (CHECK, exclusão)",
+    'valor_invalido': "valor incompatível com o tipo ou tamanho da coluna",
+    'erro_banco': "outro erro do banco",
+}
+
+COLUNAS_CONTROLE = ['_planilha', '_aba', '_linha', '_codigo', '_restricao', '_mensagem']
+
+# Partes Parquet já gravadas por arquivo de quarentena (nome da próxima parte)
+PARTES_PARQUET = {}
+TRAVA_QUARENTENA = threading.Lock()
+
+def parquet_disponivel():
+    return pa is not None
+
+def codigo_do_erro(erro):
+    """Código de quarentena de um erro do psycopg2 ou do asyncpg (pelo SQLSTATE)"""
+    sqlstate = getattr(erro, 'pgcode', None) or getattr(erro, 'sqlstate', None) or ''
+    if sqlstate == '23502':
+        return 'nulo_obrigatorio'
+    if sqlstate == '23503':
+        return 'fk_inexistente'
+    if sqlstate == '23505':
+        return 'duplicada'
+    if sqlstate.startswith('23'):
+        return 'integridade'
+    if sqlstate.startswith('22'):
+        return 'valor_invalido'
+    return 'erro_banco'
+
+def texto_quarentena(valor):
+    """Valor limpo como texto (None continua None)"""
+    if valor is None:
+        return None
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+def gravar_quarentena(diretorio, nome_tabela, colunas, rejeitados, planilha=None, aba=None,
+                      formato=FORMATO_QUARENTENA_PADRAO):
+    """Grava os rejeitados no arquivo de quarentena da tabela e retorna o caminho
+
+    rejeitados: lista de {'linha', 'codigo', 'restricao', 'mensagem', 'valores'},
+    com 'valores' na ordem de colunas.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    registros = [[planilha, aba, rejeitado['linha'], rejeitado['codigo'], rejeitado['restricao'],
+                  rejeitado['mensagem']] + [texto_quarentena(v) for v in rejeitado['valores']]
+                 for rejeitado in rejeitados]
+    cabecalho = COLUNAS_CONTROLE + list(colunas)
+
+    if formato == 'parquet' and parquet_disponivel():
+        with TRAVA_QUARENTENA:
+            base = os.path.join(diretorio, nome_tabela)
+            parte = PARTES_PARQUET.get(base, len(glob.glob(f"{glob.escape(base)}.*.parquet"))) + 1
+            PARTES_PARQUET[base] = parte
+        arquivo = f"{base}.{parte:04d}.parquet"
+        tabela = pa.table({nome: pa.array([r[i] for r in registros],
+                                          type=pa.int64() if nome == '_linha' else pa.string())
+                           for i, nome in enumerate(cabecalho)})
+        pq.write_table(tabela, arquivo)
+        return arquivo
+
+    arquivo = os.path.join(diretorio, f"{nome_tabela}.csv")
+    with TRAVA_QUARENTENA:
+        novo = not os.path.exists(arquivo)
+        with open(arquivo, 'a', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            if novo:
+                writer.writerow(cabecalho)
+            writer.writerows(registros)
+    return arquivo
+
+def ler_arquivo_quarentena(arquivo):
+    """DataFrame de um arquivo de quarentena (valores como texto, NULL como None)"""
+    if arquivo.endswith('.parquet'):
+        df = pq.read_table(arquivo).to_pandas()
+    else:
+        # Campo vazio = NULL (a limpeza da carga nunca devolve texto vazio)
+        df = pd.read_csv(arquivo, dtype=str, keep_default_na=False, na_values=[''], encoding='utf-8')
+        df['_linha'] = df['_linha'].astype('int64')
+    return df.astype(object).where(df.notna(), None)
+
+def ler_quarentena(diretorio_execucao):
+    """{tabela: DataFrame} com todos os rejeitados de uma execução (todas as planilhas)"""
+    arquivos = sorted(glob.glob(os.path.join(glob.escape(diretorio_execucao), '**', '*.csv'), recursive=True))
+    if parquet_disponivel():
+        arquivos += sorted(glob.glob(os.path.join(glob.escape(diretorio_execucao), '**', '*.parquet'),
+                                     recursive=True))
+    por_tabela = {}
+    for arquivo in arquivos:
+        nome_tabela = os.path.basename(arquivo).split('.')[0]
+        por_tabela.setdefault(nome_tabela, []).append(ler_arquivo_quarentena(arquivo))
+    return {tabela: pd.concat(partes, ignore_index=True) for tabela, partes in por_tabela.items()}
+
+def resumir_quarentena(quarentena):
+    """{tabela: {código: linhas}}"""
+    return {tabela: df['_codigo'].value_counts().to_dict() for tabela, df in quarentena.items()}
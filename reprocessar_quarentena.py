@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+REPROCESSAMENTO DA QUARENTENA
+Reenvia à carga só as linhas em quarentena de uma execução, depois que os
+dados de origem ou as tabelas pai foram corrigidos (os valores nos arquivos
+de quarentena também podem ser editados antes do reprocessamento)
+
+As tabelas são reprocessadas na ORDEM_INSERCAO: uma linha pai que passa
+libera, na mesma execução, as filhas que estavam órfãs. As linhas passam
+pela mesma limpeza e validação da carga; as que falharem de novo vão para
+a quarentena da nova execução, com a planilha, a aba e a linha originais.
+Os arquivos da execução reprocessada não são alterados.
+
+Uso:
+    python reprocessar_quarentena.py rejeitados/20250101_120000
+    python reprocessar_quarentena.py rejeitados/20250101_120000 --tabelas ator programa
+    python reprocessar_quarentena.py rejeitados/20250101_120000 --codigos fk_inexistente
+"""
+import argparse
+import os
+import sys
+
+from catalogo_banco import carregar_catalogo
+from conexao_banco import adicionar_argumentos_conexao, configurar_sessao, fechar_pool, obter_pool
+import inserir_dados_banco
+from inserir_dados_banco import (
+    MODO_CARGA_PADRAO,
+    MODOS_CARGA,
+    ORDEM_INSERCAO,
+    carregar_chaves_das_fks,
+    configurar_quarentena,
+    executar_insercao,
+    preparar_insercao,
+    semear_chaves_referenciadas,
+    zerar_deduplicacao,
+)
+from quarentena import (
+    CODIGOS_QUARENTENA,
+    COLUNAS_CONTROLE,
+    FORMATO_QUARENTENA_PADRAO,
+    FORMATOS_QUARENTENA,
+    ler_quarentena,
+    resumir_quarentena,
+)
+
+def reprocessar_tabela(conn, tabela, rejeitados, info_tabela, modo_carga, formato):
+    """Reenvia os rejeitados de uma tabela, um grupo por (planilha, aba)
+
+    Retorna (linhas reenviadas, linhas inseridas).
+    """
+    nomes_banco = {c['nome'] for c in info_tabela['colunas']}
+    colunas = [c for c in rejeitados.columns if c not in COLUNAS_CONTROLE and c in nomes_banco]
+    mapeamento = {coluna: coluna for coluna in colunas}
+    inseridas = 0
+    for (planilha, aba), grupo in rejeitados.groupby(['_planilha', '_aba'], sort=False, dropna=False):
+        planilha = planilha if isinstance(planilha, str) else None
+        aba = aba if isinstance(aba, str) else None
+        print(f"   📄 {planilha or '(sem planilha)'} / {aba or '(sem aba)'}: {len(grupo)} linhas")
+        # Linhas da planilha original: o índice volta a ser linha - 1, como na carga
+        df = grupo[colunas].copy()
+        df.index = [int(linha) - 1 for linha in grupo['_linha']]
+        configurar_quarentena(formato, planilha)
+        carregar_chaves_das_fks(conn, info_tabela)
+        lote = preparar_insercao(conn, tabela, df, dict(mapeamento), info_tabela, aba=aba)
+        if lote is not None:
+            inseridas += executar_insercao(conn, lote, modo_carga)
+    return len(rejeitados), inseridas
+
+def parse_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Reenvia à carga as linhas em quarentena de uma execução")
+    parser.add_argument('diretorio', help="diretório da execução (ex: rejeitados/20250101_120000)")
+    parser.add_argument('--tabelas', nargs='+', choices=ORDEM_INSERCAO, help="só estas tabelas")
+    parser.add_argument('--codigos', nargs='+', choices=list(CODIGOS_QUARENTENA), help="só estes motivos")
+    parser.add_argument('--modo-carga', choices=MODOS_CARGA, default=MODO_CARGA_PADRAO)
+    parser.add_argument('--formato-quarentena', choices=FORMATOS_QUARENTENA, default=FORMATO_QUARENTENA_PADRAO)
+    adicionar_argumentos_conexao(parser)
+    return parser.parse_args(argv)
+
+def main(opcoes=None):
+    if opcoes is None:
+        opcoes = parse_argumentos()
+
+    print("=" * 100)
+    print("REPROCESSAMENTO DA QUARENTENA")
+    print("=" * 100)
+
+    if not os.path.isdir(opcoes.diretorio):
+        print(f"❌ Diretório não encontrado: {opcoes.diretorio}")
+        sys.exit(1)
+    quarentena = ler_quarentena(opcoes.diretorio)
+    for tabela in list(quarentena):
+        rejeitados = quarentena[tabela]
+        if opcoes.codigos:
+            rejeitados = rejeitados[rejeitados['_codigo'].isin(opcoes.codigos)]
+        if (opcoes.tabelas and tabela not in opcoes.tabelas) or rejeitados.empty:
+            del quarentena[tabela]
+        else:
+            quarentena[tabela] = rejeitados
+    if not quarentena:
+        print(f"ℹ️  Nenhuma linha em quarentena em {opcoes.diretorio} (com os filtros informados)")
+        return
+
+    print(f"📂 Quarentena: {opcoes.diretorio}")
+    for tabela, codigos in resumir_quarentena(quarentena).items():
+        print(f"   {tabela:25s} " + ', '.join(f"{codigo}: {linhas}" for codigo, linhas in codigos.items()))
+    print()
+
+    configurar_sessao(opcoes)
+    pool = obter_pool()
+    conn = pool.getconn()
+    resultados = {}
+    try:
+        catalogo, _ = carregar_catalogo(conn, ORDEM_INSERCAO)
+        conn.commit()
+        semear_chaves_referenciadas(conn, catalogo)
+        zerar_deduplicacao()
+        for tabela in ORDEM_INSERCAO:
+            if tabela not in quarentena:
+                continue
+            if tabela not in catalogo:
+                print(f"⏭️  {tabela}: tabela não encontrada no banco (pulando)")
+                continue
+            print(f"📊 {tabela}")
+            resultados[tabela] = reprocessar_tabela(conn, tabela, quarentena[tabela], catalogo[tabela],
+                                                    opcoes.modo_carga, opcoes.formato_quarentena)
+            print()
+    finally:
+        pool.putconn(conn)
+        fechar_pool()
+
+    print("=" * 100)
+    print("RESUMO DO REPROCESSAMENTO")
+    print("=" * 100)
+    print(f"{'TABELA':25s} {'REENVIADAS':>11s} {'INSERIDAS':>10s}")
+    for tabela, (reenviadas, inseridas) in resultados.items():
+        print(f"{tabela:25s} {reenviadas:11d} {inseridas:10d}")
+    total_reenviadas = sum(r for r, _ in resultados.values())
+    total_inseridas = sum(i for _, i in resultados.values())
+    print(f"📊 {total_inseridas} de {total_reenviadas} linhas inseridas")
+    nova_quarentena = os.path.join(inserir_dados_banco.DIRETORIO_REJEITADOS, inserir_dados_banco.ID_EXECUCAO)
+    if os.path.isdir(nova_quarentena):
+        print(f"📝 Linhas que continuam em quarentena: {nova_quarentena}")
+
+if __name__ == "__main__":
+    main()
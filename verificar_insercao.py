@@ -1,27 +1,42 @@
 """
 Script para verificar se os dados foram inseridos corretamente no banco
+
+Modos:
+  estimativa     instantâneo: linhas estimadas pelo catálogo (pg_class.reltuples
+                 e pg_stat_user_tables.n_live_tup), sem ler as tabelas
+  exata          COUNT(*) de cada tabela, várias tabelas ao mesmo tempo (padrão)
+  reconciliacao  compara planilha × banco: quantidade de linhas e checksum do
+                 conteúdo por faixa de PK
+
+Na reconciliação a planilha passa pela mesma limpeza da carga
+(preparar_dados_tabela) e fica só o que a carga gravaria: linhas sem NULL em
+campo obrigatório, a primeira de cada PK. O checksum de uma faixa é a soma
+dos primeiros 64 bits do MD5 de cada linha, então não depende da ordem das
+linhas; o mesmo cálculo é feito em SQL, uma consulta por faixa de PK
+(WHERE pk >= início AND pk < fim, pelo índice da PK).
+
+Uso:
+    python verificar_insercao.py
+    python verificar_insercao.py --modo estimativa
+    python verificar_insercao.py --modo reconciliacao --planilha projeto_aplicado_final.xlsx
 """
-import psycopg2
+import argparse
+import hashlib
 import sys
-import os
-import importlib.util
-import importlib.machinery
-
-# Carregar configurações
-try:
-    config_path = os.path.join(os.path.dirname(__file__), 'config_banco.py')
-    if os.path.exists(config_path):
-        loader = importlib.machinery.SourceFileLoader("config_banco", config_path)
-        spec = importlib.util.spec_from_loader("config_banco", loader)
-        config_module = importlib.util.module_from_spec(spec)
-        loader.exec_module(config_module)
-        CONFIG_BANCO = config_module.CONFIG_BANCO
-    else:
-        print("❌ config_banco.py não encontrado!")
-        sys.exit(1)
-except Exception as e:
-    print(f"❌ Erro ao carregar config: {e}")
-    sys.exit(1)
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+from catalogo_banco import carregar_catalogo
+from conexao_banco import (
+    ERRO_CONFIG_BANCO,
+    adicionar_argumentos_conexao,
+    conexao_do_pool,
+    configurar_sessao,
+    fechar_pool,
+    obter_pool,
+)
 
 # Tabelas esperadas
 TABELAS = [
@@ -30,66 +45,371 @@ TABELAS = [
     'endereco_centro', 'ator', 'programa'
 ]
 
-print("=" * 80)
-print("VERIFICAÇÃO DE INSERÇÃO DE DADOS")
-print("=" * 80)
-print()
-
-try:
-    # Conectar ao banco
-    conn = psycopg2.connect(
-        host=CONFIG_BANCO['host'],
-        port=CONFIG_BANCO['port'],
-        database=CONFIG_BANCO['database'],
-        user=CONFIG_BANCO['user'],
-        password=CONFIG_BANCO['password']
-    )
-    
+MODOS_VERIFICACAO = ['estimativa', 'exata', 'reconciliacao']
+MODO_VERIFICACAO_PADRAO = 'exata'
+WORKERS_PADRAO = 4
+
+# Largura de cada faixa de PK na reconciliação (valores de PK, não linhas)
+TAMANHO_FAIXA_PADRAO = 50000
+# Faixas divergentes listadas por tabela
+LIMITE_FAIXAS_LISTADAS = 10
+
+# Separador de colunas e marcador de NULL no texto de cada linha (hash)
+SEPARADOR_HASH = '\x1f'
+NULO_HASH = '\x1e'
+
+# ============================================
+# ESTIMATIVA E CONTAGEM EXATA
+# ============================================
+
+def estimar_contagens(conn, tabelas):
+    """{tabela: (reltuples, n_live_tup)} lidos do catálogo, sem ler as tabelas
+
+    reltuples é None se a tabela nunca passou por VACUUM/ANALYZE.
+    """
     cursor = conn.cursor()
-    
+    cursor.execute("""
+        SELECT c.relname,
+               CASE WHEN c.reltuples < 0 THEN NULL ELSE c.reltuples::bigint END,
+               s.n_live_tup
+        FROM pg_class c
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE c.relkind IN ('r', 'p')
+        AND pg_table_is_visible(c.oid)
+        AND c.relname = ANY(%s)
+    """, (list(tabelas),))
+    estimativas = {nome: (reltuples, vivas) for nome, reltuples, vivas in cursor.fetchall()}
+    cursor.close()
+    conn.commit()
+    return estimativas
+
+def contar_tabela(pool, tabela):
+    """COUNT(*) exato em uma conexão do pool"""
+    with conexao_do_pool(pool) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT COUNT(*) FROM {tabela}')
+        count = cursor.fetchone()[0]
+        cursor.close()
+        conn.commit()
+    return count
+
+def contar_em_paralelo(pool, tabelas, workers):
+    """{tabela: contagem ou exceção}, até 'workers' tabelas ao mesmo tempo"""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futuros = {tabela: executor.submit(contar_tabela, pool, tabela) for tabela in tabelas}
+        contagens = {}
+        for tabela, futuro in futuros.items():
+            try:
+                contagens[tabela] = futuro.result()
+            except psycopg2.Error as e:
+                contagens[tabela] = e
+    return contagens
+
+# ============================================
+# RECONCILIAÇÃO (PLANILHA × BANCO)
+# ============================================
+
+def textos_da_coluna(valores, tipo):
+    """Texto de cada valor como o PostgreSQL o devolve em texto (ver expressao_coluna_sql)"""
+    import pandas as pd
+    serie = pd.Series(valores, dtype=object)
+    if 'DATE' in tipo.upper():
+        textos = serie.map(lambda valor: valor.isoformat(), na_action='ignore')
+    else:
+        textos = serie.astype(str)
+        if tipo.lower().startswith('character('):
+            # CHAR(n)::text descarta os espaços de preenchimento
+            textos = textos.str.rstrip(' ')
+    return textos.where(serie.notna(), NULO_HASH).astype(str)
+
+def hashes_das_linhas(textos):
+    """Primeiros 64 bits (com sinal) do MD5 de cada linha, iguais a hash_linha_sql"""
+    import numpy as np
+    resumos = b''.join(hashlib.md5(texto.encode('utf-8')).digest()[:8] for texto in textos)
+    return np.frombuffer(resumos, dtype='>i8').astype(np.int64)
+
+def expressao_coluna_sql(coluna, tipo):
+    if 'DATE' in tipo.upper():
+        return f"""to_char("{coluna}", 'YYYY-MM-DD')"""
+    return f'"{coluna}"::text'
+
+def hash_linha_sql(colunas, tipos):
+    """Expressão SQL com o mesmo valor de hashes_das_linhas para cada linha da tabela"""
+    partes = ', '.join(f"coalesce({expressao_coluna_sql(coluna, tipo)}, chr(30))"
+                       for coluna, tipo in zip(colunas, tipos))
+    return f"('x' || left(md5(concat_ws(chr(31), {partes})), 16))::bit(64)::bigint"
+
+def checksums_da_planilha(abas_excel, catalogo, tabelas, tamanho_faixa):
+    """Linhas e checksum por faixa de PK do que a carga gravaria de cada aba
+
+    Retorna {tabela: {'pk', 'colunas', 'tipos', 'linhas', 'faixas': {faixa: [linhas, soma]}}};
+    tabelas sem aba, sem PK mapeada ou sem colunas ficam de fora.
+    """
+    # Import tardio: só a reconciliação precisa da limpeza da carga (pandas)
+    import numpy as np
+    import pandas as pd
+    from inserir_dados_banco import encontrar_aba, mapear_colunas_planilha_para_banco, preparar_dados_tabela
+
+    origem = {}
+    nomes_abas = list(abas_excel.keys())
+    for tabela in tabelas:
+        info_tabela = catalogo.get(tabela)
+        aba = encontrar_aba(tabela, nomes_abas)
+        if info_tabela is None or aba is None or abas_excel[aba].empty:
+            continue
+        df = abas_excel[aba]
+        pk_coluna = info_tabela['pk']
+        mapeamento = mapear_colunas_planilha_para_banco(df, [c['nome'] for c in info_tabela['colunas']])
+        colunas = [c['nome'] for c in info_tabela['colunas'] if c['nome'] in mapeamento]
+        if not colunas or pk_coluna not in colunas:
+            continue
+        tipos_colunas = {c['nome']: c['tipo'] for c in info_tabela['colunas']}
+        colunas_not_null = [c['nome'] for c in info_tabela['colunas'] if c['not_null'] and c['nome'] in colunas]
+        colunas_limpas, mascara_ignorados = preparar_dados_tabela(df, colunas, dict(mapeamento),
+                                                                   tipos_colunas, colunas_not_null)
+
+        tipos = [tipos_colunas[coluna] for coluna in colunas]
+        pks = pd.Series(colunas_limpas[pk_coluna])
+        # Como na carga: NULL obrigatório é ignorado e em PK repetida vale a primeira
+        mantidas = ~np.asarray(mascara_ignorados, dtype=bool) & pks.notna().to_numpy()
+        mantidas[mantidas] = ~pks[mantidas].duplicated().to_numpy()
+        textos = [textos_da_coluna(colunas_limpas[coluna][mantidas], tipo) for coluna, tipo in zip(colunas, tipos)]
+        hashes = hashes_das_linhas(textos[0].str.cat(textos[1:], sep=SEPARADOR_HASH))
+        # Soma exata em int64: metades alta e baixa separadas não transbordam
+        somas = pd.DataFrame({'faixa': pks[mantidas].to_numpy(dtype=np.int64) // tamanho_faixa,
+                              'alta': hashes >> 32, 'baixa': hashes & 0xFFFFFFFF})
+        somas = somas.groupby('faixa').agg(linhas=('alta', 'size'), alta=('alta', 'sum'), baixa=('baixa', 'sum'))
+        faixas = {int(faixa): [int(linhas), (int(alta) << 32) + int(baixa)]
+                  for faixa, linhas, alta, baixa in somas.itertuples()}
+        origem[tabela] = {'pk': pk_coluna, 'colunas': colunas, 'tipos': tipos,
+                          'linhas': int(mantidas.sum()), 'faixas': faixas}
+    return origem
+
+def faixas_do_banco(conn, tabela, pk_coluna, tamanho_faixa):
+    """Faixas de PK que têm ao menos uma linha no banco"""
+    cursor = conn.cursor()
+    # Divisão inteira arredondada para baixo, como o // do Python (o / do SQL trunca para zero)
+    cursor.execute(f"""
+        SELECT DISTINCT "{pk_coluna}" / %(t)s - CASE WHEN "{pk_coluna}" %% %(t)s < 0 THEN 1 ELSE 0 END
+        FROM {tabela}
+    """, {'t': tamanho_faixa})
+    faixas = {faixa for faixa, in cursor.fetchall()}
+    cursor.close()
+    conn.commit()
+    return faixas
+
+def checksum_da_faixa(pool, tabela, pk_coluna, expressao_hash, faixa, tamanho_faixa):
+    """(linhas, soma dos hashes) de uma faixa de PK no banco"""
+    with conexao_do_pool(pool) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT COUNT(*), coalesce(sum({expressao_hash}), 0)
+            FROM {tabela}
+            WHERE "{pk_coluna}" >= %s AND "{pk_coluna}" < %s
+        """, (faixa * tamanho_faixa, (faixa + 1) * tamanho_faixa))
+        linhas, soma = cursor.fetchone()
+        cursor.close()
+        conn.commit()
+    return linhas, int(soma)
+
+def reconciliar(pool, origem, tamanho_faixa, workers):
+    """Compara planilha e banco faixa a faixa
+
+    Retorna {tabela: {'linhas_planilha', 'linhas_banco', 'faixas', 'divergentes': [...]}}.
+    """
+    with conexao_do_pool(pool) as conn:
+        faixas_por_tabela = {
+            tabela: sorted(set(dados['faixas']) | faixas_do_banco(conn, tabela, dados['pk'], tamanho_faixa))
+            for tabela, dados in origem.items()
+        }
+
+    # Todas as faixas de todas as tabelas na mesma fila de consultas
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futuros = {}
+        for tabela, faixas in faixas_por_tabela.items():
+            dados = origem[tabela]
+            expressao_hash = hash_linha_sql(dados['colunas'], dados['tipos'])
+            for faixa in faixas:
+                futuros[(tabela, faixa)] = executor.submit(checksum_da_faixa, pool, tabela, dados['pk'],
+                                                           expressao_hash, faixa, tamanho_faixa)
+        banco = {chave: futuro.result() for chave, futuro in futuros.items()}
+
+    resultado = {}
+    for tabela, faixas in faixas_por_tabela.items():
+        dados = origem[tabela]
+        divergentes = []
+        linhas_banco = 0
+        for faixa in faixas:
+            linhas_planilha, soma_planilha = dados['faixas'].get(faixa, (0, 0))
+            linhas_faixa, soma_banco = banco[(tabela, faixa)]
+            linhas_banco += linhas_faixa
+            if linhas_planilha != linhas_faixa or soma_planilha != soma_banco:
+                divergentes.append({'inicio': faixa * tamanho_faixa, 'fim': (faixa + 1) * tamanho_faixa - 1,
+                                    'linhas_planilha': linhas_planilha, 'linhas_banco': linhas_faixa})
+        resultado[tabela] = {'linhas_planilha': dados['linhas'], 'linhas_banco': linhas_banco,
+                             'faixas': len(faixas), 'divergentes': divergentes}
+    return resultado
+
+# ============================================
+# FUNÇÃO PRINCIPAL
+# ============================================
+
+def verificar_estimativa(pool):
+    with conexao_do_pool(pool) as conn:
+        estimativas = estimar_contagens(conn, TABELAS)
+    print("📊 Estimativa pelo catálogo (sem ler as tabelas):\n")
+    print(f"   {'TABELA':25s} {'RELTUPLES':>12s} {'N_LIVE_TUP':>12s}")
+    total = 0
+    for tabela in TABELAS:
+        if tabela not in estimativas:
+            print(f"   ❌ {tabela:22s} → tabela não encontrada")
+            continue
+        reltuples, vivas = estimativas[tabela]
+        total += vivas if vivas is not None else (reltuples or 0)
+        print(f"   {tabela:25s} {'-' if reltuples is None else f'{reltuples:,}':>12s} "
+              f"{'-' if vivas is None else f'{vivas:,}':>12s}")
+    print()
+    print(f"📊 Total estimado: ~{total:,} registros")
+    print("   ℹ️  reltuples vem do último VACUUM/ANALYZE; n_live_tup do coletor de estatísticas")
+    return True
+
+def verificar_contagem_exata(pool, workers):
+    print("📊 Verificando registros em cada tabela:\n")
+    contagens = contar_em_paralelo(pool, TABELAS, workers)
+
     total_registros = 0
     tabelas_com_dados = []
     tabelas_vazias = []
-    
-    print("📊 Verificando registros em cada tabela:\n")
-    
     for tabela in TABELAS:
-        try:
-            cursor.execute(f'SELECT COUNT(*) FROM {tabela}')
-            count = cursor.fetchone()[0]
-            total_registros += count
-            
-            if count > 0:
-                tabelas_com_dados.append((tabela, count))
-                print(f"   ✅ {tabela:25s} → {count:5d} registros")
-            else:
-                tabelas_vazias.append(tabela)
-                print(f"   ⚠️  {tabela:25s} → {count:5d} registros (VAZIA)")
-        except Exception as e:
-            print(f"   ❌ {tabela:25s} → ERRO: {e}")
-    
+        count = contagens[tabela]
+        if isinstance(count, Exception):
+            print(f"   ❌ {tabela:25s} → ERRO: {count}")
+            continue
+        total_registros += count
+        if count > 0:
+            tabelas_com_dados.append((tabela, count))
+            print(f"   ✅ {tabela:25s} → {count:5d} registros")
+        else:
+            tabelas_vazias.append(tabela)
+            print(f"   ⚠️  {tabela:25s} → {count:5d} registros (VAZIA)")
+
     print()
     print("=" * 80)
     print("RESUMO")
     print("=" * 80)
     print(f"📊 Total de registros no banco: {total_registros:,}")
     print(f"✅ Tabelas com dados: {len(tabelas_com_dados)}/{len(TABELAS)}")
-    
+
     if tabelas_vazias:
         print(f"⚠️  Tabelas vazias: {', '.join(tabelas_vazias)}")
-    
+
     print()
-    
+
     if total_registros > 0:
         print("🎉 SUCESSO! Dados foram inseridos no banco!")
     else:
         print("⚠️  ATENÇÃO: Nenhum dado encontrado no banco.")
         print("   Execute o script inserir_dados_banco.py primeiro.")
-    
-    cursor.close()
-    conn.close()
-    
-except psycopg2.Error as e:
-    print(f"❌ Erro ao conectar ao banco: {e}")
-    sys.exit(1)
+    return True
+
+def verificar_reconciliacao(pool, arquivo_excel, tamanho_faixa, workers):
+    from inserir_dados_banco import encontrar_planilha, ler_planilha
+
+    arquivo_excel = arquivo_excel or encontrar_planilha()
+    if not arquivo_excel:
+        print("❌ Arquivo Excel não encontrado (informe --planilha)")
+        return False
+    print(f"📂 Planilha: {arquivo_excel}")
+    abas_excel = ler_planilha(arquivo_excel)
+    with conexao_do_pool(pool) as conn:
+        catalogo, _ = carregar_catalogo(conn, TABELAS)
+        conn.commit()
+
+    inicio = time.perf_counter()
+    origem = checksums_da_planilha(abas_excel, catalogo, TABELAS, tamanho_faixa)
+    segundos_planilha = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    resultado = reconciliar(pool, origem, tamanho_faixa, workers)
+    segundos_banco = time.perf_counter() - inicio
+
+    print()
+    print(f"🔎 Reconciliação por faixas de {tamanho_faixa:,} valores de PK "
+          f"(planilha: {segundos_planilha:.2f}s, banco: {segundos_banco:.2f}s)\n")
+    print(f"   {'TABELA':25s} {'PLANILHA':>10s} {'BANCO':>10s} {'FAIXAS':>7s} {'DIVERGENTES':>12s}")
+    tabelas_divergentes = []
+    for tabela in TABELAS:
+        if tabela not in resultado:
+            print(f"   ⏭️  {tabela:22s} → sem aba ou sem PK mapeada na planilha (pulada)")
+            continue
+        dados = resultado[tabela]
+        situacao = "✅" if not dados['divergentes'] else "❌"
+        print(f"   {situacao} {tabela:22s} {dados['linhas_planilha']:10,} {dados['linhas_banco']:10,} "
+              f"{dados['faixas']:7d} {len(dados['divergentes']):12d}")
+        if dados['divergentes']:
+            tabelas_divergentes.append(tabela)
+
+    for tabela in tabelas_divergentes:
+        print(f"\n   ❌ {tabela}: faixas de PK divergentes")
+        for faixa in resultado[tabela]['divergentes'][:LIMITE_FAIXAS_LISTADAS]:
+            motivo = ("quantidade de linhas" if faixa['linhas_planilha'] != faixa['linhas_banco']
+                      else "conteúdo (checksum)")
+            print(f"      {faixa['inicio']:>10d} a {faixa['fim']:<10d} planilha {faixa['linhas_planilha']:,} × "
+                  f"banco {faixa['linhas_banco']:,} → {motivo}")
+
+    print()
+    if tabelas_divergentes:
+        print(f"⚠️  Planilha e banco divergem em: {', '.join(tabelas_divergentes)}")
+        print("   Linhas rejeitadas na carga aparecem aqui (ver rejeitados/)")
+        return False
+    print("🎉 SUCESSO! Banco idêntico à planilha em todas as tabelas reconciliadas")
+    return True
+
+def parse_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica os dados inseridos no banco")
+    parser.add_argument('--modo', choices=MODOS_VERIFICACAO, default=MODO_VERIFICACAO_PADRAO,
+                        help="estimativa (catálogo), exata (COUNT(*) em paralelo) ou reconciliacao "
+                             "(planilha × banco)")
+    parser.add_argument('--workers', type=int, default=WORKERS_PADRAO,
+                        help=f"consultas ao mesmo tempo (padrão: {WORKERS_PADRAO})")
+    parser.add_argument('--planilha', help="planilha da reconciliação (padrão: a mesma da carga)")
+    parser.add_argument('--tamanho-faixa', type=int, default=TAMANHO_FAIXA_PADRAO,
+                        help=f"valores de PK por consulta na reconciliação (padrão: {TAMANHO_FAIXA_PADRAO})")
+    adicionar_argumentos_conexao(parser)
+    return parser.parse_args(argv)
+
+def main(opcoes=None):
+    if opcoes is None:
+        opcoes = parse_argumentos()
+
+    print("=" * 80)
+    print("VERIFICAÇÃO DE INSERÇÃO DE DADOS")
+    print("=" * 80)
+    print()
+
+    # Verificar com os valores padrão daria um resultado de outro banco sem avisar
+    if ERRO_CONFIG_BANCO is not None:
+        print(f"❌ {ERRO_CONFIG_BANCO}")
+        print("   Crie ou corrija config_banco.py com os dados do seu banco (modelo: config_banco.py.example)")
+        sys.exit(1)
+
+    configurar_sessao(opcoes)
+    try:
+        # Conexões do pool compartilhado (conexao_banco)
+        pool = obter_pool(max(opcoes.workers, 1))
+        if opcoes.modo == 'estimativa':
+            sucesso = verificar_estimativa(pool)
+        elif opcoes.modo == 'exata':
+            sucesso = verificar_contagem_exata(pool, opcoes.workers)
+        else:
+            sucesso = verificar_reconciliacao(pool, opcoes.planilha, opcoes.tamanho_faixa, opcoes.workers)
+    except psycopg2.Error as e:
+        print(f"❌ Erro ao conectar ao banco: {e}")
+        sys.exit(1)
+    finally:
+        fechar_pool()
+
+    if not sucesso:
+        sys.exit(1)
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Verifica a paridade entre limpar_coluna (vetorizada) e limpar_valor (célula a célula)
+
+Compara valor e tipo Python de cada célula para:
+  1. casos de borda montados à mão (NULLs, números, datas, CHAR(n)...)
+  2. valores aleatórios em colunas de vários dtypes
+  3. colunas de datas com um formato dominante e valores fora dele, para
+     converter_coluna_datas × converter_data (duas vezes: a segunda vem do cache)
+  4. todas as abas da planilha real, se existir, em todos os tipos do banco
+
+Em 2 e 4, as colunas que categorizar_colunas converte em Categorical são
+comparadas também nessa forma (limpeza por categoria × célula original).
+
+Uso:
+    python verificar_limpeza_vetorizada.py
+"""
+import random
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from datas_planilha import CACHE_DATAS, FORMATOS_DATA, converter_coluna_datas, converter_data
+from inserir_dados_banco import categorizar_colunas, limpar_coluna, limpar_valor
+
+# Tipos no formato produzido por obter_colunas_tabela
+TIPOS = [
+    'integer',
+    'character varying(100)',
+    'character varying',
+    'character(2)',
+    'character(14)',
+    'date',
+    'text',
+]
+
+CASOS_DE_BORDA = [
+    None, np.nan, pd.NaT, pd.NA, '', '   ', 'nan', 'NaN', ' None ', 'null', 'NULL',
+    0, 1, -7, 42, 2 ** 53 + 1, 10 ** 20, 1.0, 2.5, -0.5, -2.7, 1e20, 1e300, float('inf'), float('-inf'),
+    True, False,
+    ' 12 ', '12.7', '-3.9', '1e3', '1_000', '0x1A', 'abc', '99999999999999999999', '+5', ' -0 ',
+    '47', 'SC', 'Florianópolis', '  texto com espaços  ', 'x' * 150, '12345678000199',
+    '2020-01-31', '31/01/2020', '2020/01/31', '31-01-2020', '2020-12-17 00:00:00',
+    '2020-1-5', '5/1/2020', ' 2020-01-31 ', '32/13/2020', 'janeiro', '2020',
+    datetime(2021, 5, 4, 13, 30), pd.Timestamp('2019-07-24'), date(2020, 1, 1),
+]
+
+def mesmo_valor(a, b):
+    """Igualdade estrita: mesmo tipo Python e mesmo valor"""
+    if a is None or b is None:
+        return a is None and b is None
+    return type(a) is type(b) and a == b
+
+def comparar(serie, tipo, descricao):
+    """Compara limpar_coluna com limpar_valor; devolve lista de divergências"""
+    vetorizado = limpar_coluna(serie, tipo)
+    divergencias = []
+    for posicao, valor in enumerate(serie.tolist() if serie.dtype == object else list(serie)):
+        esperado = limpar_valor(serie.iloc[posicao], tipo)
+        obtido = vetorizado[posicao]
+        if not mesmo_valor(esperado, obtido):
+            divergencias.append(f"{descricao} [{tipo}] {valor!r}: esperado {esperado!r}, obtido {obtido!r}")
+    return divergencias
+
+def comparar_categorizada(serie, tipo, descricao):
+    """Compara limpar_coluna da coluna em Categorical com limpar_valor da coluna original"""
+    categorizada = categorizar_colunas(serie.to_frame(), linhas_minimas=0).iloc[:, 0]
+    if not isinstance(categorizada.dtype, pd.CategoricalDtype):
+        return [], 0
+    vetorizado = limpar_coluna(categorizada, tipo)
+    divergencias = []
+    for posicao in range(len(serie)):
+        esperado = limpar_valor(serie.iloc[posicao], tipo)
+        if not mesmo_valor(esperado, vetorizado[posicao]):
+            divergencias.append(f"{descricao} (categorical) [{tipo}] {serie.iloc[posicao]!r}: "
+                                f"esperado {esperado!r}, obtido {vetorizado[posicao]!r}")
+    return divergencias, len(serie)
+
+def gerar_series_aleatorias(semente=42, linhas=2000):
+    """Gera colunas aleatórias de vários dtypes"""
+    rng = random.Random(semente)
+    pool = CASOS_DE_BORDA + [rng.uniform(-1e6, 1e6) for _ in range(50)]
+    inteiros = [rng.randint(-10 ** 6, 10 ** 6) for _ in range(linhas)]
+    floats = [rng.choice([rng.uniform(-1e9, 1e9), np.nan, round(rng.uniform(0, 100), 1)]) for _ in range(linhas)]
+    return {
+        'object misto': pd.Series([rng.choice(pool) for _ in range(linhas)], dtype=object),
+        'int64': pd.Series(inteiros, dtype='int64'),
+        'Int64 com NA': pd.Series([v if rng.random() > 0.1 else None for v in inteiros], dtype='Int64'),
+        'float64 com NaN': pd.Series(floats, dtype='float64'),
+        'bool': pd.Series([rng.random() > 0.5 for _ in range(linhas)]),
+        'datetime64': pd.Series(pd.to_datetime(['2020-01-01', None, '2021-06-30'] * (linhas // 3))),
+        'string': pd.Series([rng.choice(['a', ' b ', 'nan', '', '12', '31/12/2020', None]) for _ in range(linhas)],
+                            dtype='string'),
+        'texto repetido': pd.Series([rng.choice(['SC', 'PR ', ' rs', 'NULL', '', '2020-01-31', '7', None])
+                                     for _ in range(linhas)], dtype=object),
+        'inteiros object': pd.Series([rng.choice([1, 2, 30, -4, 2 ** 63, None]) for _ in range(linhas)],
+                                     dtype=object),
+    }
+
+# Datas que casam com mais de um formato ou que só o pandas entende
+DATAS_DE_BORDA = [
+    '10-11-12', '1-2-2020', '2020-1-5', '5/1/2020', '01/02/03', '2020-02-30', '31/02/2020', '2020-13-01',
+    '0001-01-01', '1500-03-01', '9999-12-31', '0000-01-01', '2262-04-12', '1677-09-21', '00/01/2020',
+    ' 2020-01-31 ', '2020-01-31T10:00', '2020-12-17 00:00:00', '20200131', 'Jan 5 2020', 'janeiro',
+    '2020', '12', '', 'NaT', 'nat', '31.01.2020', '２０２０-01-31',
+    datetime(2021, 5, 4, 13, 30), pd.Timestamp('2019-07-24'), date(2020, 1, 1), 7, 2.5, True,
+]
+
+def gerar_colunas_datas(semente=7, linhas=5000):
+    """Uma coluna por formato dominante, com valores de outros formatos e de borda no meio"""
+    rng = random.Random(semente)
+    colunas = {}
+    for formato in FORMATOS_DATA:
+        valores = []
+        for _ in range(linhas):
+            dia = date(rng.randint(1900, 2030), rng.randint(1, 12), rng.randint(1, 28))
+            sorteio = rng.random()
+            if sorteio < 0.9:
+                valores.append(dia.strftime(formato))
+            elif sorteio < 0.95:
+                valores.append(dia.strftime(rng.choice(FORMATOS_DATA)))
+            else:
+                valores.append(rng.choice(DATAS_DE_BORDA))
+        colunas[f"datas {formato}"] = pd.Series(valores, dtype=object)
+    colunas['datas de borda'] = pd.Series(DATAS_DE_BORDA * 3, dtype=object)
+    colunas['datetime64'] = pd.Series(pd.to_datetime(['2020-01-01', '1999-12-31', '2021-06-30'] * 100))
+    return colunas
+
+def comparar_datas(serie, descricao):
+    """Compara converter_coluna_datas com converter_data; devolve lista de divergências"""
+    vetorizado = converter_coluna_datas(serie)
+    divergencias = []
+    for posicao, valor in enumerate(serie.tolist()):
+        esperado = converter_data(valor)
+        if not mesmo_valor(esperado, vetorizado[posicao]):
+            divergencias.append(f"{descricao} {valor!r}: esperado {esperado!r}, obtido {vetorizado[posicao]!r}")
+    return divergencias
+
+def main():
+    print("=" * 80)
+    print("VERIFICAÇÃO DE PARIDADE: limpar_coluna × limpar_valor")
+    print("=" * 80)
+    print()
+
+    divergencias = []
+    total_celulas = 0
+
+    print("🔍 Casos de borda...")
+    serie = pd.Series(CASOS_DE_BORDA, dtype=object)
+    for tipo in TIPOS:
+        divergencias += comparar(serie, tipo, 'borda')
+        total_celulas += len(serie)
+
+    print("🔍 Colunas aleatórias...")
+    for descricao, serie in gerar_series_aleatorias().items():
+        for tipo in TIPOS:
+            divergencias += comparar(serie, tipo, descricao)
+            total_celulas += len(serie)
+            encontradas, celulas = comparar_categorizada(serie, tipo, descricao)
+            divergencias += encontradas
+            total_celulas += celulas
+
+    print("🔍 Colunas de datas (converter_coluna_datas)...")
+    CACHE_DATAS.clear()
+    for passada in ['sem cache', 'com cache']:
+        for descricao, serie in gerar_colunas_datas().items():
+            serie = serie[serie.notna() & (serie.astype(str) != '')]
+            divergencias += comparar_datas(serie, f"{descricao} ({passada})")
+            divergencias += comparar(serie, 'date', f"{descricao} ({passada})")
+            total_celulas += 2 * len(serie)
+
+    arquivo = Path(__file__).parent / 'projeto_aplicado_final.xlsx'
+    if arquivo.exists():
+        print(f"🔍 Planilha real: {arquivo.name}...")
+        for aba, df in pd.read_excel(arquivo, sheet_name=None, engine='openpyxl').items():
+            for col in df.columns:
+                for tipo in TIPOS:
+                    divergencias += comparar(df[col], tipo, f"{aba}.{col}")
+                    total_celulas += len(df)
+                    encontradas, celulas = comparar_categorizada(df[col], tipo, f"{aba}.{col}")
+                    divergencias += encontradas
+                    total_celulas += celulas
+
+    print()
+    print(f"📊 Células comparadas: {total_celulas:,}")
+    if divergencias:
+        print(f"❌ {len(divergencias)} divergências encontradas:")
+        for d in divergencias[:20]:
+            print(f"   {d}")
+        sys.exit(1)
+    print("✅ limpar_coluna produz exatamente o mesmo resultado que limpar_valor")
+
+if __name__ == "__main__":
+    main()